@@ -0,0 +1,5 @@
+from hero import ExtensionConfig
+
+
+class FactionsConfig(ExtensionConfig):
+    verbose_name = "Factions"
@@ -0,0 +1 @@
+from .factions import Factions
@@ -0,0 +1,59 @@
+import hero
+from hero import checks
+
+from ..controller import FactionsController
+from ..factions import Factions as FactionNames
+
+
+class Factions(hero.Cog):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        ssbu = self.core.get_controller('ssbu')
+        if ssbu is not None:
+            ssbu.final_ranking.add_hook(self.ctl.award_tournament_points)
+
+    core: hero.Core
+    ctl: FactionsController
+
+    @hero.command()
+    @checks.guild_only()
+    async def joinfaction(self, ctx: hero.Context, faction: FactionNames):
+        """Join a faction; you can't switch factions afterwards"""
+        member = await self.db.wrap_member(ctx.author)
+        await self.ctl.join_faction(member, faction)
+        await ctx.send(f"{ctx.author.mention}, welcome to the {faction.value.capitalize()} faction!")
+
+    @hero.command()
+    @checks.guild_only()
+    @checks.has_permissions(manage_guild=True)
+    async def startseason(self, ctx: hero.Context, *, name: str):
+        """End the current faction season and start a new one"""
+        guild = await self.db.wrap_guild(ctx.guild)
+        season = await self.ctl.start_season(guild, name)
+        await ctx.send(f"Season {season.number} ({season.name}) has started!")
+
+    @hero.command()
+    @checks.guild_only()
+    async def standings(self, ctx: hero.Context):
+        """Points of each faction in the current season"""
+        guild = await self.db.wrap_guild(ctx.guild)
+        season = await self.ctl.get_current_season(guild)
+        if season is None:
+            await ctx.send("There is no faction season running at the moment.")
+            return
+        standings = await self.ctl.get_standings(season)
+        lines = [f"**{standing.faction.value.capitalize()}**: {standing.points}" for standing in standings]
+        await ctx.send(f"Season {season.number} ({season.name}):\n" + '\n'.join(lines))
+
+    @hero.command()
+    @checks.guild_only()
+    async def pointshistory(self, ctx: hero.Context):
+        """Your most recent faction points"""
+        member = await self.db.wrap_member(ctx.author)
+        entries = await self.ctl.get_history(member)
+        if not entries:
+            await ctx.send("You haven't earned any faction points yet.")
+            return
+        lines = [f"{entry.created_at:%Y-%m-%d}: +{entry.points} {entry.faction.value.capitalize()} points "
+                 f"({entry.reason}, season {entry.season.number})" for entry in entries]
+        await ctx.send('\n'.join(lines))
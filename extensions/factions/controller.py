@@ -0,0 +1,159 @@
+import collections
+import math
+
+from discord.ext.commands import BadArgument
+
+from django.db import transaction
+from django.utils import timezone
+
+import hero
+from hero import async_using_db, models
+
+from .factions import Factions
+from .models import FactionMember, FactionStanding, MemberPoints, PointsEntry, Season
+
+
+class FactionsController(hero.Controller):
+    TOURNAMENT_REASON = 'tournament'
+
+    @async_using_db
+    def get_faction(self, member: models.Member):
+        faction_member = FactionMember.objects.filter(member=member).first()
+        return faction_member.faction if faction_member is not None else None
+
+    @async_using_db
+    def join_faction(self, member: models.Member, faction: Factions):
+        faction_member, created = FactionMember.objects.get_or_create(member=member, defaults={'faction': faction})
+        if not created:
+            raise BadArgument(f"You are already in the {faction_member.faction.value.capitalize()} faction.")
+        return faction_member
+
+    @async_using_db
+    def get_current_season(self, guild: models.Guild):
+        return Season.objects.filter(guild=guild, ended_at=None).first()
+
+    @async_using_db
+    def start_season(self, guild: models.Guild, name: str):
+        """End the running season (if any) and start a new one"""
+        with transaction.atomic():
+            Season.objects.filter(guild=guild, ended_at=None).update(ended_at=timezone.now())
+            last_season = Season.objects.filter(guild=guild).order_by('-number').first()
+            number = last_season.number + 1 if last_season is not None else 1
+            season = Season.objects.create(guild=guild, number=number, name=name)
+            FactionStanding.objects.bulk_create([FactionStanding(season=season, faction=faction)
+                                                 for faction in Factions])
+        return season
+
+    @async_using_db
+    def award_points(self, season: Season, awards, reason: str, tournament_id=None):
+        return self._award_points(season, awards, reason, tournament_id)
+
+    @staticmethod
+    def _award_points(season, awards, reason, tournament_id=None):
+        """Add (member ID, faction, points) awards to the ledger and the aggregates
+
+        Returns the members' new totals for the season by member ID.
+        """
+        faction_totals = collections.Counter()
+        faction_counts = collections.Counter()
+        member_totals = collections.Counter()
+        for member_id, faction, points in awards:
+            faction_totals[faction] += points
+            faction_counts[faction] += 1
+            member_totals[member_id, faction] += points
+        with transaction.atomic():
+            PointsEntry.objects.bulk_create([
+                PointsEntry(member_id=member_id, season=season, faction=faction, points=points, reason=reason,
+                            tournament_id=tournament_id)
+                for member_id, faction, points in awards
+            ], batch_size=500)
+
+            standings = list(FactionStanding.objects.select_for_update().filter(season=season,
+                                                                                 faction__in=faction_totals))
+            for standing in standings:
+                standing.points += faction_totals.pop(standing.faction)
+                standing.entry_count += faction_counts[standing.faction]
+            FactionStanding.objects.bulk_update(standings, ['points', 'entry_count'])
+            FactionStanding.objects.bulk_create([
+                FactionStanding(season=season, faction=faction, points=points, entry_count=faction_counts[faction])
+                for faction, points in faction_totals.items()
+            ])
+
+            member_points = list(MemberPoints.objects.select_for_update().filter(
+                season=season, member_id__in={member_id for member_id, _ in member_totals}
+            ))
+            totals = {}
+            for _member_points in member_points:
+                key = (_member_points.member_id, _member_points.faction)
+                if key in member_totals:
+                    _member_points.points += member_totals.pop(key)
+                    totals[_member_points.member_id] = _member_points.points
+            MemberPoints.objects.bulk_update(member_points, ['points'], batch_size=500)
+            new_member_points = [MemberPoints(season=season, member_id=member_id, faction=faction, points=points)
+                                 for (member_id, faction), points in member_totals.items()]
+            MemberPoints.objects.bulk_create(new_member_points, batch_size=500)
+            totals.update((_member_points.member_id, _member_points.points) for _member_points in new_member_points)
+        return totals
+
+    @async_using_db
+    def get_standings(self, season: Season):
+        return list(FactionStanding.objects.filter(season=season).order_by('-points'))
+
+    @async_using_db
+    def get_leaderboard(self, season: Season, faction: Factions, limit=10):
+        return list(MemberPoints.objects.filter(season=season, faction=faction).select_related('member__user')
+                    .order_by('-points')[:limit])
+
+    @async_using_db
+    def get_history(self, member: models.Member, limit=10):
+        return list(PointsEntry.objects.filter(member=member).select_related('season')
+                    .order_by('-created_at')[:limit])
+
+    async def award_tournament_points(self, tournament, results):
+        """Final ranking hook of the ssbu extension
+
+        Awards faction points for a singles tournament in a guild with
+        a running season; returns the points per faction.
+        """
+        if tournament.doubles:
+            return None
+        return await self._award_tournament_points(tournament, results)
+
+    @async_using_db
+    def _award_tournament_points(self, tournament, results):
+        season = Season.objects.filter(guild_id=tournament.guild_id, ended_at=None).first()
+        if season is None or not results:
+            return None
+        # the points of a tournament are only awarded once, even if its final ranking is processed again
+        if PointsEntry.objects.filter(reason=self.TOURNAMENT_REASON, tournament_id=tournament.id).exists():
+            return None
+        factions = dict(FactionMember.objects.filter(member_id__in=[result.pk for result in results])
+                        .values_list('member_id', 'faction'))
+        if not factions:
+            return None
+        faction_numbers = collections.Counter(factions.values())
+        max_faction_number = max(faction_numbers.values())
+        ranks = sorted({result.rank for result in results})
+        rank_indices = {rank: index for index, rank in enumerate(ranks)}
+        participant_bonus = round(len(results) / 20)
+
+        awards = []
+        awarded_results = []
+        for result in results:
+            faction = factions.get(result.pk)
+            if faction is None:
+                continue
+            # smaller factions get more points for the same rank
+            points = round(
+                math.sqrt((len(ranks) - rank_indices[result.rank]) * len(ranks))
+                * (max_faction_number / faction_numbers[faction]) * 2
+            ) + participant_bonus
+            awards.append((result.pk, faction, points))
+            awarded_results.append(result)
+        totals = self._award_points(season, awards, self.TOURNAMENT_REASON, tournament_id=tournament.id)
+
+        summary = dict.fromkeys((faction.value for faction in Factions), 0)
+        for result, (member_id, faction, points) in zip(awarded_results, awards):
+            summary[faction.value] += points
+            result.lines.append(f"{faction.value.capitalize()} Points: +{points} -> {totals[member_id]}")
+        return summary
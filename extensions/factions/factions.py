@@ -0,0 +1,35 @@
+from enum import Enum
+
+from hero import fields
+
+
+class Factions(Enum):
+    light = 'light'
+    darkness = 'darkness'
+    subspace = 'subspace'
+
+    @classmethod
+    async def convert(cls, ctx, argument):
+        return Factions(argument.lower())
+
+
+class FactionField(fields.CharField):
+    def __init__(self, **kwargs):
+        kwargs['max_length'] = 16
+        super().__init__(**kwargs)
+
+    def get_prep_value(self, value: Factions) -> str:
+        return value.value
+
+    def from_db_value(self, value, expression, connection):
+        return Factions(value)
+
+    def to_python(self, value: str) -> Factions:
+        if isinstance(value, Factions):
+            return value
+        try:
+            return Factions(value)
+        except ValueError:
+            raise ValueError(
+                "{faction_value} is not a valid faction".format(faction_value=value)
+            )
@@ -0,0 +1,128 @@
+# Generated by Django 3.1.4 on 2021-01-10 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import extensions.factions.factions
+import hero.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('hero', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Season',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.SmallIntegerField()),
+                ('name', models.CharField(max_length=64)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('guild', hero.fields.GuildField(on_delete=django.db.models.deletion.CASCADE, to='hero.guild')),
+            ],
+            options={
+                'get_latest_by': 'number',
+                'unique_together': {('guild', 'number')},
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FactionMember',
+            fields=[
+                ('member', hero.fields.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='hero.member')),
+                ('faction', extensions.factions.factions.FactionField(db_index=True, max_length=16)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faction', extensions.factions.factions.FactionField(max_length=16)),
+                ('points', models.IntegerField()),
+                ('reason', models.CharField(max_length=64)),
+                ('tournament_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', hero.fields.MemberField(on_delete=django.db.models.deletion.CASCADE, to='hero.member')),
+                ('season', hero.fields.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='factions.season')),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MemberPoints',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faction', extensions.factions.factions.FactionField(max_length=16)),
+                ('points', models.IntegerField(default=0)),
+                ('member', hero.fields.MemberField(on_delete=django.db.models.deletion.CASCADE, to='hero.member')),
+                ('season', hero.fields.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='factions.season')),
+            ],
+            options={
+                'unique_together': {('season', 'member', 'faction')},
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FactionStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faction', extensions.factions.factions.FactionField(max_length=16)),
+                ('points', models.IntegerField(default=0)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('season', hero.fields.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='factions.season')),
+            ],
+            options={
+                'unique_together': {('season', 'faction')},
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pointsentry',
+            index=models.Index(fields=['member', '-created_at'], name='factions_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memberpoints',
+            index=models.Index(fields=['season', 'faction', '-points'], name='factions_leaderboard_idx'),
+        ),
+    ]
@@ -0,0 +1,13 @@
+from hero import start_all, end_all
+
+start_all(globals())
+
+
+from .faction_member import FactionMember
+from .faction_standing import FactionStanding
+from .member_points import MemberPoints
+from .points_entry import PointsEntry
+from .season import Season
+
+
+end_all(globals())
@@ -0,0 +1,9 @@
+from hero import fields, models
+
+from ..factions import FactionField
+
+
+class FactionMember(models.Model):
+    member = fields.OneToOneField(models.Member, primary_key=True, on_delete=fields.CASCADE)
+    faction = FactionField(db_index=True)
+    joined_at = fields.DateTimeField(auto_now_add=True)
@@ -0,0 +1,15 @@
+from hero import fields, models
+
+from ..factions import FactionField
+from .season import Season
+
+
+# total points of a faction in a season, maintained together with the PointsEntry ledger
+class FactionStanding(models.Model):
+    class Meta:
+        unique_together = (('season', 'faction'),)
+
+    season = fields.ForeignKey(Season, on_delete=fields.CASCADE)
+    faction = FactionField()
+    points = fields.IntegerField(default=0)
+    entry_count = fields.IntegerField(default=0)
@@ -0,0 +1,18 @@
+from hero import fields, models
+
+from ..factions import FactionField
+from .season import Season
+
+
+# total points a member earned for a faction in a season, maintained together with the PointsEntry ledger
+class MemberPoints(models.Model):
+    class Meta:
+        unique_together = (('season', 'member', 'faction'),)
+        indexes = [
+            models.Index(fields=['season', 'faction', '-points'], name='factions_leaderboard_idx'),
+        ]
+
+    season = fields.ForeignKey(Season, on_delete=fields.CASCADE)
+    member = fields.MemberField(on_delete=fields.CASCADE)
+    faction = FactionField()
+    points = fields.IntegerField(default=0)
@@ -0,0 +1,22 @@
+from hero import fields, models
+
+from ..factions import FactionField
+from .season import Season
+
+
+# append-only ledger of faction points; FactionStanding and MemberPoints are
+# kept up to date with it, so the entries only have to be read for a member's history
+class PointsEntry(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['member', '-created_at'], name='factions_history_idx'),
+        ]
+
+    member = fields.MemberField(on_delete=fields.CASCADE)
+    season = fields.ForeignKey(Season, on_delete=fields.CASCADE)
+    # the faction the points went to, even if the member switches later
+    faction = FactionField()
+    points = fields.IntegerField()
+    reason = fields.CharField(max_length=64)
+    tournament_id = fields.BigIntegerField(null=True, blank=True, db_index=True)  # Challonge ID
+    created_at = fields.DateTimeField(auto_now_add=True)
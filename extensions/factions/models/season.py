@@ -0,0 +1,14 @@
+from hero import fields, models
+
+
+class Season(models.Model):
+    class Meta:
+        unique_together = (('guild', 'number'),)
+        get_latest_by = 'number'
+
+    guild = fields.GuildField(on_delete=fields.CASCADE)
+    number = fields.SmallIntegerField()
+    name = fields.CharField(max_length=64)
+    started_at = fields.DateTimeField(auto_now_add=True)
+    # None while the season is running
+    ended_at = fields.DateTimeField(null=True, blank=True)
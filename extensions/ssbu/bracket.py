@@ -0,0 +1,478 @@
+import asyncio
+import logging
+import math
+
+import challonge
+
+from django.db import transaction
+
+from .db import async_using_db
+from .formats import Formats
+from .models import BracketMatch, DoublesMatch, Match, Participant, ParticipantTeam, Tournament
+
+
+log = logging.getLogger(__name__)
+
+BYE = BracketMatch.BYE
+
+
+class _Node:
+    """A bracket match before it's saved"""
+
+    def __init__(self, round_number, entrants=(None, None)):
+        self.round = round_number
+        self.entrants = list(entrants)
+        self.winner = None
+        self.state = BracketMatch.PENDING
+        self.winner_to = None  # (node, slot)
+        self.loser_to = None
+        self.grand_final = False
+        self.reset = None  # grand finals reset node
+
+    @property
+    def loser(self):
+        return self.entrants[1] if self.winner == self.entrants[0] else self.entrants[0]
+
+
+def seed_order(size):
+    """Seeds in bracket order, so that the top seeds meet as late as possible"""
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top_seed in order for seed in (top_seed, total - top_seed)]
+    return order
+
+
+def _elimination_bracket(entrants, double):
+    size = 1 << max(1, (len(entrants) - 1).bit_length())
+    rounds = size.bit_length() - 1
+
+    def entrant(seed):
+        return entrants[seed - 1] if seed <= len(entrants) else BYE
+
+    order = seed_order(size)
+    winners = [[_Node(1, (entrant(order[i]), entrant(order[i + 1]))) for i in range(0, size, 2)]]
+    for round_number in range(2, rounds + 1):
+        previous = winners[-1]
+        current = [_Node(round_number) for _ in range(len(previous) // 2)]
+        for i, node in enumerate(previous):
+            node.winner_to = (current[i // 2], i % 2)
+        winners.append(current)
+    # (sort key, node) so the nodes can be numbered in a sensible order of play
+    keyed = [((2 * (r - 1), 0, i), node) for r, nodes in enumerate(winners, 1) for i, node in enumerate(nodes)]
+    if not double:
+        return keyed
+
+    final = winners[-1][0]
+    previous = None
+    losers_round = 0
+    if rounds >= 2:
+        losers_round = 1
+        previous = [_Node(-1) for _ in range(size // 4)]
+        for i, node in enumerate(winners[0]):
+            node.loser_to = (previous[i // 2], i % 2)
+        keyed += [((1, 1, i), node) for i, node in enumerate(previous)]
+        for j in range(1, rounds):
+            # winners of the last losers round against those who drop down from the winners bracket;
+            # every other round is flipped to avoid early rematches
+            dropping = winners[j] if j % 2 == 0 else winners[j][::-1]
+            losers_round += 1
+            current = [_Node(-losers_round) for _ in range(len(previous))]
+            for i, node in enumerate(previous):
+                node.winner_to = (current[i], 0)
+            for i, node in enumerate(dropping):
+                node.loser_to = (current[i], 1)
+            keyed += [((losers_round, 1, i), node) for i, node in enumerate(current)]
+            previous = current
+            if j < rounds - 1:
+                losers_round += 1
+                current = [_Node(-losers_round) for _ in range(len(previous) // 2)]
+                for i, node in enumerate(previous):
+                    node.winner_to = (current[i // 2], i % 2)
+                keyed += [((losers_round, 1, i), node) for i, node in enumerate(current)]
+                previous = current
+
+    grand_final = _Node(rounds + 1)
+    grand_final.grand_final = True
+    reset = _Node(rounds + 1)
+    grand_final.reset = reset
+    final.winner_to = (grand_final, 0)
+    if previous is None:
+        # two entrants, there's no losers bracket
+        final.loser_to = (grand_final, 1)
+    else:
+        previous[0].winner_to = (grand_final, 1)
+    keyed += [((2 * rounds, 0, 0), grand_final), ((2 * rounds, 0, 1), reset)]
+    return keyed
+
+
+def _round_robin(entrants):
+    # circle method: one entrant stays in place, the others rotate
+    circle = list(entrants) + ([BYE] if len(entrants) % 2 else [])
+    keyed = []
+    half = len(circle) // 2
+    for round_number in range(1, len(circle)):
+        for i in range(half):
+            pair = (circle[i], circle[-1 - i])
+            if BYE not in pair:
+                node = _Node(round_number, pair)
+                keyed.append(((round_number, 0, i), node))
+        circle = [circle[0], circle[-1]] + circle[1:-1]
+    return keyed
+
+
+def _swiss_round(round_number, standings, played):
+    """Pair entrants with the same (or the closest) number of wins who haven't played each other yet
+
+    ``standings`` are the entrants ordered by wins and then by seed.
+    """
+    standings = list(standings)
+    nodes = []
+    if len(standings) % 2:
+        # the lowest ranked entrant who hasn't had a bye yet gets one
+        for entrant in reversed(standings):
+            if (entrant, BYE) not in played:
+                break
+        standings.remove(entrant)
+        nodes.append(_Node(round_number, (entrant, BYE)))
+    pairs = []
+    while standings:
+        entrant = standings.pop(0)
+        opponent = next((other for other in standings if (entrant, other) not in played), standings[0])
+        standings.remove(opponent)
+        pairs.append(_Node(round_number, (entrant, opponent)))
+    return [((round_number, 0, i), node) for i, node in enumerate(pairs + nodes)]
+
+
+def build_bracket(tournament_format: Formats, entrants):
+    """Nodes of a new bracket, ordered by when they should be played
+
+    ``entrants`` are ordered by seed. Byes are resolved right away.
+    """
+    if tournament_format == Formats.single_elimination:
+        keyed = _elimination_bracket(entrants, double=False)
+    elif tournament_format == Formats.double_elimination:
+        keyed = _elimination_bracket(entrants, double=True)
+    elif tournament_format == Formats.round_robin:
+        keyed = _round_robin(entrants)
+    else:
+        keyed = _swiss_round(1, entrants, set())
+    nodes = [node for _, node in sorted(keyed, key=lambda item: item[0])]
+    # the order of play is also a topological order, so one pass resolves all byes
+    for node in nodes:
+        if node.state == BracketMatch.PENDING and None not in node.entrants:
+            if BYE in node.entrants:
+                node.winner = node.entrants[0] if node.entrants[1] == BYE else node.entrants[1]
+                node.state = BracketMatch.COMPLETE
+                for target, entrant in ((node.winner_to, node.winner), (node.loser_to, node.loser)):
+                    if target is not None:
+                        target[0].entrants[target[1]] = entrant
+            else:
+                node.state = BracketMatch.OPEN
+    return nodes
+
+
+class BracketEngine:
+    """Runs tournaments on a bracket that's kept in our database
+
+    Every match knows where its winner and loser go next, so reporting
+    a result only touches the match and the (at most two) matches it
+    feeds into, and immediately returns the matches that opened up.
+    Nothing has to be fetched from Challonge for that; results are
+    mirrored to it in the background by :class:`ChallongeMirror`.
+    """
+
+    @async_using_db
+    def create(self, tournament, entrants):
+        """Create the bracket for entrants ordered by seed and return the open matches
+
+        If the tournament already has a bracket, its open matches are
+        returned instead.
+        """
+        with transaction.atomic():
+            Tournament.objects.select_for_update().get(pk=tournament.pk)
+            if BracketMatch.objects.filter(tournament=tournament).exists():
+                return self._get_open_matches(tournament)
+            nodes = build_bracket(tournament.format, entrants)
+            return self._save_nodes(tournament, nodes, first_number=1)
+
+    @staticmethod
+    def _save_nodes(tournament, nodes, first_number):
+        matches = {}
+        with transaction.atomic():
+            for number, node in enumerate(nodes, first_number):
+                matches[node] = BracketMatch(tournament=tournament, number=number, round=node.round,
+                                             entrant_1=node.entrants[0], entrant_2=node.entrants[1],
+                                             state=node.state, winner=node.winner, grand_final=node.grand_final,
+                                             # results against byes don't exist on Challonge
+                                             mirrored=node.state == BracketMatch.COMPLETE)
+            BracketMatch.objects.bulk_create(matches.values())
+            linked = []
+            for node, match in matches.items():
+                if node.reset is not None:
+                    match.winner_to = matches[node.reset]
+                    match.winner_to_slot = 1
+                    match.loser_to = matches[node.reset]
+                    match.loser_to_slot = 2
+                for target, field in ((node.winner_to, 'winner_to'), (node.loser_to, 'loser_to')):
+                    if target is not None:
+                        setattr(match, field, matches[target[0]])
+                        setattr(match, f'{field}_slot', target[1] + 1)
+                if match.winner_to is not None or match.loser_to is not None:
+                    linked.append(match)
+            BracketMatch.objects.bulk_update(linked, ['winner_to', 'winner_to_slot', 'loser_to', 'loser_to_slot'])
+        return [match for match in matches.values() if match.state == BracketMatch.OPEN]
+
+    @async_using_db
+    def exists(self, tournament):
+        return BracketMatch.objects.filter(tournament=tournament).exists()
+
+    @async_using_db
+    def get_matches(self, tournament):
+        return list(BracketMatch.objects.filter(tournament=tournament).order_by('number'))
+
+    @async_using_db
+    def get_open_matches(self, tournament):
+        return self._get_open_matches(tournament)
+
+    @staticmethod
+    def _get_open_matches(tournament):
+        return list(BracketMatch.objects.filter(tournament=tournament, state=BracketMatch.OPEN).order_by('number'))
+
+    @async_using_db
+    def report(self, tournament, number, winner, scores_csv=''):
+        """Report the winner of a match and return the matches that opened because of it"""
+        with transaction.atomic():
+            match = BracketMatch.objects.select_for_update().get(tournament=tournament, number=number)
+            if match.state != BracketMatch.OPEN:
+                raise ValueError(f"Match {number} of {tournament.name} is not open.")
+            if winner not in (match.entrant_1, match.entrant_2):
+                raise ValueError(f"{winner} is not playing in match {number} of {tournament.name}.")
+            opened = self._complete(match, winner, scores_csv)
+            if tournament.format == Formats.swiss:
+                opened += self._next_swiss_round(tournament, match.round)
+        return opened
+
+    @async_using_db
+    def reopen(self, tournament, challonge_id):
+        """Reopen the match that an organizer reopened on Challonge
+
+        Only works as long as the matches it fed into haven't been
+        played or started yet; returns the reopened match, or None if
+        it's too late (or the match isn't complete locally).
+        """
+        with transaction.atomic():
+            Tournament.objects.select_for_update().get(pk=tournament.pk)
+            try:
+                match = BracketMatch.objects.select_for_update().get(tournament=tournament,
+                                                                     challonge_id=challonge_id)
+            except BracketMatch.DoesNotExist:
+                return None
+            if match.state != BracketMatch.COMPLETE:
+                return None
+            targets = list(BracketMatch.objects.select_for_update()
+                           .filter(pk__in={match.winner_to_id, match.loser_to_id} - {None})
+                           .filter(match=None, doublesmatch=None))
+            expected = len({match.winner_to_id, match.loser_to_id} - {None})
+            if len(targets) < expected or any(target.state == BracketMatch.COMPLETE for target in targets):
+                return None
+            if tournament.format == Formats.swiss and BracketMatch.objects.filter(
+                    tournament=tournament, round__gt=match.round).exists():
+                return None
+            for target in targets:
+                if match.grand_final:
+                    target.entrant_1 = target.entrant_2 = None
+                else:
+                    for field, slot in (('winner_to_id', match.winner_to_slot), ('loser_to_id', match.loser_to_slot)):
+                        if getattr(match, field) == target.pk:
+                            setattr(target, f'entrant_{slot}', None)
+                target.state = BracketMatch.PENDING
+                target.mirrored = False
+                target.save(update_fields=['entrant_1', 'entrant_2', 'state', 'mirrored'])
+            # the ended match is kept, but a new one has to be played
+            for model in (Match, DoublesMatch):
+                model.objects.filter(bracket_match=match).update(bracket_match=None)
+            match.winner = None
+            match.scores_csv = ''
+            match.state = BracketMatch.OPEN
+            match.mirrored = False
+            match.save(update_fields=['winner', 'scores_csv', 'state', 'mirrored'])
+        return match
+
+    @async_using_db
+    def remirror(self, tournament, challonge_id):
+        """Have the result of a match reported to Challonge again"""
+        BracketMatch.objects.filter(tournament=tournament, challonge_id=challonge_id,
+                                    state=BracketMatch.COMPLETE).update(mirrored=False)
+
+    def _complete(self, match, winner, scores_csv=''):
+        match.winner = winner
+        match.scores_csv = scores_csv
+        match.state = BracketMatch.COMPLETE
+        # results against byes don't exist on Challonge
+        match.mirrored = BYE in (match.entrant_1, match.entrant_2)
+        match.save(update_fields=['winner', 'scores_csv', 'state', 'mirrored'])
+        if match.grand_final:
+            reset = BracketMatch.objects.select_for_update().get(pk=match.winner_to_id)
+            if winner == match.entrant_1:
+                # the winners bracket winner won, so there's no reset
+                reset.state = BracketMatch.SKIPPED
+                reset.mirrored = True
+                reset.save(update_fields=['state', 'mirrored'])
+                return []
+            reset.entrant_1, reset.entrant_2 = match.entrant_1, match.entrant_2
+            reset.state = BracketMatch.OPEN
+            reset.save(update_fields=['entrant_1', 'entrant_2', 'state'])
+            return [reset]
+        opened = []
+        for target_id, slot, entrant in ((match.winner_to_id, match.winner_to_slot, winner),
+                                         (match.loser_to_id, match.loser_to_slot, match.loser)):
+            if target_id is not None:
+                opened += self._place(target_id, slot, entrant)
+        return opened
+
+    def _place(self, match_id, slot, entrant):
+        match = BracketMatch.objects.select_for_update().get(pk=match_id)
+        setattr(match, f'entrant_{slot}', entrant)
+        if match.entrant_1 is None or match.entrant_2 is None:
+            match.save(update_fields=[f'entrant_{slot}'])
+            return []
+        if BYE in (match.entrant_1, match.entrant_2):
+            match.save(update_fields=[f'entrant_{slot}'])
+            return self._complete(match, match.entrant_1 if match.entrant_2 == BYE else match.entrant_2)
+        match.state = BracketMatch.OPEN
+        match.save(update_fields=[f'entrant_{slot}', 'state'])
+        return [match]
+
+    @staticmethod
+    def _next_swiss_round(tournament, round_number):
+        # the last two results of a round can come in at the same time; without the lock, neither
+        # would see the other's result and the next round would never be paired
+        Tournament.objects.select_for_update().get(pk=tournament.pk)
+        matches = BracketMatch.objects.filter(tournament=tournament)
+        if matches.filter(round=round_number).exclude(state=BracketMatch.COMPLETE).exists():
+            return []
+        matches = list(matches.order_by('number'))
+        first_round = [match for match in matches if match.round == 1]
+        entrant_count = len(first_round) * 2 - sum(BYE in (match.entrant_1, match.entrant_2) for match in first_round)
+        if round_number >= math.ceil(math.log2(max(entrant_count, 2))):
+            return []
+        # seeds follow from the first round, in which seed 2i played seed 2i + 1 (and the bye comes last)
+        seeds = {}
+        for i, match in enumerate(first_round):
+            seeds[match.entrant_1] = 2 * i
+            seeds[match.entrant_2] = 2 * i + 1
+        seeds.pop(BYE, None)
+        wins = dict.fromkeys(seeds, 0)
+        played = set()
+        for match in matches:
+            if match.winner is not None:
+                wins[match.winner] = wins.get(match.winner, 0) + 1
+            played.add((match.entrant_1, match.entrant_2))
+            played.add((match.entrant_2, match.entrant_1))
+        standings = sorted(seeds, key=lambda entrant: (-wins[entrant], seeds[entrant]))
+        nodes = [node for _, node in _swiss_round(round_number + 1, standings, played)]
+        for node in nodes:
+            if BYE in node.entrants:
+                node.winner = node.entrants[0]
+                node.state = BracketMatch.COMPLETE
+            else:
+                node.state = BracketMatch.OPEN
+        return BracketEngine._save_nodes(tournament, nodes, first_number=matches[-1].number + 1)
+
+
+class ChallongeMirror:
+    """Reports results from the local bracket to Challonge in the background
+
+    Challonge is only a mirror, so a failed report doesn't hold up the
+    tournament; it's retried the next time a result is mirrored. Local
+    matches are linked to Challonge's by round and entrants, or only by
+    entrants where Challonge paired a round differently (swiss, round
+    robin).
+    """
+
+    def __init__(self, ctl):
+        self.ctl = ctl
+        self._pending = set()
+        self._tasks = {}
+
+    def request_mirror(self, tournament_id):
+        self._pending.add(tournament_id)
+        task = self._tasks.get(tournament_id)
+        if task is None or task.done():
+            self._tasks[tournament_id] = self.ctl.core.loop.create_task(self._run(tournament_id))
+
+    async def _run(self, tournament_id):
+        while tournament_id in self._pending:
+            self._pending.discard(tournament_id)
+            try:
+                await self.mirror(tournament_id)
+            except (challonge.APIException, asyncio.TimeoutError, OSError):
+                log.warning("Mirroring results of tournament %s to Challonge failed, will retry with the next "
+                            "result", tournament_id, exc_info=True)
+                return
+
+    async def mirror(self, tournament_id):
+        challonge_tournament = await self.ctl.get_challonge_tournament(tournament_id)
+        results = await self._get_unmirrored(tournament_id)
+        if any(match.challonge_id is None for match, _ in results):
+            await self._link(tournament_id, await challonge_tournament.get_matches(force_update=True))
+            results = await self._get_unmirrored(tournament_id)
+        for match, challonge_winner_id in results:
+            if match.challonge_id is None or challonge_winner_id is None:
+                continue
+            await challonge_tournament.connection(
+                'PUT', f'tournaments/{tournament_id}/matches/{match.challonge_id}',
+                **{'match[winner_id]': challonge_winner_id, 'match[scores_csv]': match.scores_csv or '0-0'}
+            )
+            await self._mark_mirrored(match)
+
+    @staticmethod
+    def _get_challonge_ids(tournament, entrants):
+        model = ParticipantTeam if tournament.doubles else Participant
+        return dict(model.objects.filter(pk__in=entrants).values_list('pk', 'challonge_id'))
+
+    @async_using_db
+    def _get_unmirrored(self, tournament_id):
+        matches = list(BracketMatch.objects.filter(tournament_id=tournament_id, state=BracketMatch.COMPLETE,
+                                                   mirrored=False).select_related('tournament').order_by('number'))
+        if not matches:
+            return []
+        challonge_ids = self._get_challonge_ids(matches[0].tournament, [match.winner for match in matches])
+        return [(match, challonge_ids.get(match.winner)) for match in matches]
+
+    @async_using_db
+    def _link(self, tournament_id, challonge_matches):
+        matches = list(BracketMatch.objects.filter(tournament_id=tournament_id, challonge_id=None)
+                       .exclude(entrant_1=None).exclude(entrant_2=None)
+                       .exclude(entrant_1=BYE).exclude(entrant_2=BYE)
+                       .select_related('tournament').order_by('number'))
+        if not matches:
+            return
+        entrants = {entrant for match in matches for entrant in (match.entrant_1, match.entrant_2)}
+        challonge_ids = self._get_challonge_ids(matches[0].tournament, entrants)
+        linked_ids = set(BracketMatch.objects.filter(tournament_id=tournament_id)
+                         .exclude(challonge_id=None).values_list('challonge_id', flat=True))
+        # the same two entrants can meet twice in a round (grand finals reset), so keep them in order
+        candidates = {}
+        for challonge_match in sorted(challonge_matches, key=lambda m: m.id):
+            if challonge_match.id not in linked_ids:
+                pair = frozenset((challonge_match.player1_id, challonge_match.player2_id))
+                candidates.setdefault((challonge_match.round, pair), []).append(challonge_match)
+                candidates.setdefault(pair, []).append(challonge_match)
+        linked = []
+        taken = set()
+        for match in matches:
+            pair = frozenset((challonge_ids.get(match.entrant_1), challonge_ids.get(match.entrant_2)))
+            for key in ((match.round, pair), pair):
+                challonge_match = next((m for m in candidates.get(key, ()) if m.id not in taken), None)
+                if challonge_match is not None:
+                    taken.add(challonge_match.id)
+                    match.challonge_id = challonge_match.id
+                    linked.append(match)
+                    break
+        BracketMatch.objects.bulk_update(linked, ['challonge_id'])
+
+    @async_using_db
+    def _mark_mirrored(self, match):
+        BracketMatch.objects.filter(pk=match.pk).update(mirrored=True)
@@ -0,0 +1,129 @@
+import asyncio
+
+import discord
+
+from hero import models
+
+from .db import async_using_db
+from .models import MatchCategory
+
+
+class _Reservation:
+    """Placeholder for a channel that is about to be created in a category"""
+
+    __slots__ = ()
+
+
+class MatchCategoryTracker:
+    """Keeps track of how many channels each match category holds
+
+    Occupancy is read from the channel cache once per guild and then
+    kept up to date from channel create, delete and update events, so
+    picking a category for a new channel needs neither a database
+    query nor any REST calls. A new category is created lazily once
+    all existing ones are full.
+
+    Picking a category reserves room for the channels that are going
+    to be created in it, so concurrent match starts can't overfill it;
+    the reservations are replaced by the channels once they exist, or
+    released if creating them failed.
+    """
+
+    # Discord allows 50 channels per category
+    CHANNEL_LIMIT = 49
+
+    def __init__(self, ctl):
+        self.ctl = ctl
+        # guild ID -> {category ID: number}
+        self.numbers = {}
+        # category ID -> IDs of the channels in it and reservations for the ones about to be created
+        self.channel_ids = {}
+        self._locks = {}
+
+    def _get_lock(self, guild_id):
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+    @async_using_db
+    def _load_numbers(self, guild: models.Guild):
+        return dict(MatchCategory.objects.filter(category__guild=guild).values_list('category_id', 'number'))
+
+    @async_using_db
+    def _forget_categories(self, category_ids):
+        models.CategoryChannel.objects.filter(pk__in=category_ids).delete()
+
+    async def _load(self, guild: models.Guild):
+        discord_guild = guild.discord
+        numbers = {}
+        missing = []
+        for category_id, number in (await self._load_numbers(guild)).items():
+            discord_category = discord_guild.get_channel(category_id)
+            if discord_category is None:
+                missing.append(category_id)
+                continue
+            numbers[category_id] = number
+            self.channel_ids[category_id] = {channel.id for channel in discord_category.channels}
+        if missing:
+            await self._forget_categories(missing)
+        self.numbers[guild.id] = numbers
+        return numbers
+
+    async def get_category(self, guild: models.Guild, slots=1):
+        """Return a match category with room for ``slots`` more channels, reserving it"""
+        async with self._get_lock(guild.id):
+            numbers = self.numbers.get(guild.id)
+            if numbers is None:
+                numbers = await self._load(guild)
+            for category_id in sorted(numbers, key=numbers.get):
+                if len(self.channel_ids[category_id]) + slots <= self.CHANNEL_LIMIT:
+                    category = guild.discord.get_channel(category_id)
+                    break
+            else:
+                number = 1
+                while number in numbers.values():
+                    number += 1
+                match_category = await self.ctl.create_matches_category(guild, number)
+                category = await match_category.category
+                category = await category.fetch()
+            self.channel_ids.setdefault(category.id, set()).update(_Reservation() for _ in range(slots))
+            return category
+
+    def release(self, category: discord.CategoryChannel, slots=1):
+        """Give back reservations of channels that weren't created after all"""
+        self._take_reservations(category.id, slots)
+
+    def _take_reservations(self, category_id, slots):
+        channel_ids = self.channel_ids.get(category_id)
+        if channel_ids is None:
+            return
+        reservations = [item for item in channel_ids if isinstance(item, _Reservation)][:slots]
+        channel_ids.difference_update(reservations)
+
+    def category_created(self, category: discord.CategoryChannel, number):
+        numbers = self.numbers.get(category.guild.id)
+        if numbers is not None:
+            numbers[category.id] = number
+            self.channel_ids.setdefault(category.id, set())
+
+    def channel_created(self, channel: discord.abc.GuildChannel):
+        channel_ids = self.channel_ids.get(channel.category_id)
+        if channel_ids is not None and channel.id not in channel_ids:
+            # the channel takes the place of its reservation, if there is one
+            self._take_reservations(channel.category_id, 1)
+            channel_ids.add(channel.id)
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel):
+        if isinstance(channel, discord.CategoryChannel):
+            self.channel_ids.pop(channel.id, None)
+            self.numbers.get(channel.guild.id, {}).pop(channel.id, None)
+            return
+        channel_ids = self.channel_ids.get(channel.category_id)
+        if channel_ids is not None:
+            channel_ids.discard(channel.id)
+
+    def channel_updated(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if before.category_id != after.category_id:
+            self.channel_deleted(before)
+            self.channel_created(after)
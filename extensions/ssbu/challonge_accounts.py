@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import logging
+import re
+
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .db import async_using_db
+from .models import ChallongeAccount, Player
+
+
+log = logging.getLogger(__name__)
+
+_USER_ID = re.compile(r'\?to=(\d+)')
+
+
+class ChallongeUserResolver:
+    """Resolves Challonge usernames to user IDs, remembering the results
+
+    User IDs can only be found by scraping a user's profile page, so
+    results are kept in memory and in the ChallongeAccount table, and
+    usernames that are already linked to a Player are used as well.
+    Usernames that don't exist are remembered for ``negative_ttl``.
+    Known IDs older than ``ttl`` are still returned right away, and
+    refreshed in the background (accounts can be renamed).
+    """
+
+    def __init__(self, ctl, ttl=datetime.timedelta(days=30), negative_ttl=datetime.timedelta(days=1),
+                 concurrency=4):
+        self.ctl = ctl
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+        # lowercase username -> (user ID or None, resolved at)
+        self._cache = {}
+        self._refreshing = set()
+
+    async def resolve(self, username):
+        """User ID of a Challonge user, or None if there's no such user"""
+        user_ids = await self.resolve_many([username])
+        return user_ids[username.lower()]
+
+    async def resolve_many(self, usernames):
+        """Resolve many usernames at once; returns user IDs (or None) by lowercase username
+
+        Everything that is known already is looked up with one query,
+        the rest is scraped ``concurrency`` pages at a time and saved
+        together.
+        """
+        usernames = {username.lower() for username in usernames}
+        now = timezone.now()
+        missing = {username for username in usernames if not self._is_usable(self._cache.get(username), now)}
+        if missing:
+            self._cache.update(await self._load(missing))
+        user_ids = {}
+        to_scrape = []
+        for username in usernames:
+            entry = self._cache.get(username)
+            if not self._is_usable(entry, now):
+                to_scrape.append(username)
+                continue
+            user_id, resolved_at = entry
+            user_ids[username] = user_id
+            if user_id is not None and now - resolved_at > self.ttl:
+                self._refresh_in_background(username)
+        if to_scrape:
+            user_ids.update(await self._scrape_and_save(to_scrape))
+        return user_ids
+
+    def _is_usable(self, entry, now):
+        if entry is None:
+            return False
+        user_id, resolved_at = entry
+        # stale IDs are still used while they're refreshed, unknown usernames have to be checked again
+        return user_id is not None or now - resolved_at <= self.negative_ttl
+
+    @async_using_db
+    def _load(self, usernames):
+        entries = {username: (user_id, resolved_at) for username, user_id, resolved_at
+                   in ChallongeAccount.objects.filter(username__in=usernames)
+                   .values_list('username', 'user_id', 'resolved_at')}
+        # players who linked their account before the cache existed
+        unknown = usernames - entries.keys()
+        if unknown:
+            now = timezone.now()
+            # usernames are saved as they were typed
+            players = (Player.objects.annotate(challonge_username_lower=Lower('challonge_username'))
+                       .filter(challonge_username_lower__in=unknown).exclude(challonge_user_id=None))
+            for username, user_id in players.values_list('challonge_username', 'challonge_user_id'):
+                entries[username.lower()] = (user_id, now)
+        return entries
+
+    async def _scrape_and_save(self, usernames):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def scrape(username):
+            async with semaphore:
+                return await self.scrape(username)
+
+        results = await asyncio.gather(*[scrape(username) for username in usernames])
+        user_ids = dict(zip(usernames, results))
+        await self._save(user_ids)
+        now = timezone.now()
+        self._cache.update((username, (user_id, now)) for username, user_id in user_ids.items())
+        return user_ids
+
+    async def scrape(self, username):
+        """Find a user's ID on their profile page; None if there's no such user"""
+        status, text = await self.ctl.challonge_http.get_page(f"users/{username}", endpoint='web/users/:username')
+        if status == 404:
+            return None
+        if status != 200:
+            raise RuntimeError(f"Challonge responded with {status} to the profile page of {username}")
+        match = _USER_ID.search(text)
+        return int(match.group(1)) if match is not None else None
+
+    @async_using_db
+    def _save(self, user_ids):
+        now = timezone.now()
+        accounts = [ChallongeAccount(username=username, user_id=user_id, resolved_at=now)
+                    for username, user_id in user_ids.items()]
+        existing = set(ChallongeAccount.objects.filter(username__in=user_ids).values_list('username', flat=True))
+        ChallongeAccount.objects.bulk_update([account for account in accounts if account.username in existing],
+                                             ['user_id', 'resolved_at'])
+        ChallongeAccount.objects.bulk_create([account for account in accounts if account.username not in existing],
+                                             ignore_conflicts=True)
+
+    def _refresh_in_background(self, username):
+        if username in self._refreshing:
+            return
+        self._refreshing.add(username)
+
+        async def refresh():
+            try:
+                await self._scrape_and_save([username])
+            except Exception:
+                log.warning("Refreshing the Challonge user ID of %s failed", username, exc_info=True)
+            finally:
+                self._refreshing.discard(username)
+
+        self.ctl.core.loop.create_task(refresh())
@@ -0,0 +1,228 @@
+import asyncio
+import datetime
+import logging
+import random
+import re
+import time
+
+import aiohttp
+import challonge
+
+
+log = logging.getLogger(__name__)
+
+API_URL = 'https://api.challonge.com/v1/'
+WEB_URL = 'https://challonge.com/'
+
+# statuses worth retrying; everything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# a rate limited request wasn't processed, so it's safe to retry whatever the method
+SAFE_RETRY_STATUSES = {429}
+
+_ID_SEGMENT = re.compile(r'(?<=/)\d+(?=/|$)')
+
+
+class RequestBudget:
+    """Token bucket for the requests one Challonge account may make
+
+    ``acquire`` waits until a request can be made, so every user of a
+    budget together stays below ``requests_per_minute``.
+    """
+
+    def __init__(self, requests_per_minute=30, burst=5):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.waiting = 0
+        self._updated_at = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if self._updated_at is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        loop = asyncio.get_event_loop()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                self._refill(loop.time())
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill(loop.time())
+                self.tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def pause(self, seconds):
+        """Spend the tokens of the next ``seconds``, e.g. after a 429"""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    @property
+    def saturated(self):
+        return self.waiting > 0 or self.tokens < 1
+
+
+def endpoint_name(path):
+    """Path with the IDs taken out, so requests can be grouped by endpoint"""
+    return _ID_SEGMENT.sub(':id', path.split('?', 1)[0])
+
+
+def prepare_params(params, prefix=None):
+    """Flatten parameters the way achallonge's connection does"""
+    prepared = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        name = f'{prefix}[{key}]' if prefix else key
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if isinstance(value, (list, tuple)) and not (prefix and prefix.endswith('[]')):
+            name += '[]'
+        for _value in values:
+            if isinstance(_value, bool):
+                _value = str(_value).lower()
+            elif isinstance(_value, (datetime.date, datetime.datetime)):
+                _value = _value.isoformat()
+            prepared.append((name, str(_value)))
+    return prepared
+
+
+class ChallongeValidationError(challonge.APIException):
+    """Challonge refused a request because of what was sent (422); sending it again won't help"""
+
+
+class ChallongeConnection:
+    """Drop-in replacement for achallonge's connection that uses a :class:`ChallongeClient`"""
+
+    def __init__(self, client, username, api_key):
+        self.client = client
+        self.username = username
+        self.auth = aiohttp.BasicAuth(username, api_key)
+
+    async def __call__(self, method, uri, params_prefix=None, **params):
+        status, data = await self.client.request(method, f'{API_URL}{uri}.json', endpoint=uri,
+                                                 params=prepare_params(params, params_prefix), auth=self.auth,
+                                                 account=self.username, json=True)
+        if status == 422:
+            raise ChallongeValidationError(uri, params, data)
+        if status >= 400:
+            raise challonge.APIException(uri, params, data)
+        return data
+
+
+class ChallongeClient:
+    """Single HTTP layer for all traffic to Challonge, API and website alike
+
+    - one pooled aiohttp session with keep-alive
+    - identical GET requests that are in flight at the same time are
+      sent only once and share the response
+    - a token bucket per account (the website counts as one account)
+    - 429 and 5xx responses and connection errors are retried with
+      exponential backoff and full jitter, respecting Retry-After;
+      other requests than GET may have been applied already, so they
+      are only retried on 429
+    - request durations per endpoint are recorded in ``registry``
+    """
+
+    def __init__(self, registry, requests_per_minute=120, burst=10, max_retries=3, base_delay=0.5, max_delay=30.0,
+                 connection_limit=20, timeout=30.0):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self.budgets = {}
+        self._session = None
+        self._in_flight = {}
+        self.request_duration = registry.histogram('purah_challonge_request_duration_seconds',
+                                                   "Duration of requests to Challonge", ('endpoint', 'status'))
+        self.retries = registry.counter('purah_challonge_retries_total', "Retried requests to Challonge",
+                                        ('endpoint', 'reason'))
+        self.coalesced = registry.counter('purah_challonge_coalesced_total',
+                                          "Requests to Challonge that were answered by an identical one in flight",
+                                          ('endpoint',))
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def get_budget(self, account):
+        budget = self.budgets.get(account)
+        if budget is None:
+            budget = self.budgets[account] = RequestBudget(self.requests_per_minute, self.burst)
+        return budget
+
+    def connection(self, username, api_key):
+        return ChallongeConnection(self, username, api_key)
+
+    async def request(self, method, url, endpoint, params=(), auth=None, account='web', json=False):
+        """Make a request and return its status and body (decoded JSON if ``json``)"""
+        if method != 'GET':
+            return await self._request(method, url, endpoint, params, auth, account, json)
+        key = (url, tuple(params), account, json)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced.labels(endpoint=endpoint_name(endpoint)).inc()
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._request(method, url, endpoint, params, auth, account, json))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _request(self, method, url, endpoint, params, auth, account, json):
+        endpoint = endpoint_name(endpoint)
+        budget = self.get_budget(account)
+        idempotent = method == 'GET'
+        retry_statuses = RETRY_STATUSES if idempotent else SAFE_RETRY_STATUSES
+        attempt = 0
+        while True:
+            await budget.acquire()
+            started_at = time.monotonic()
+            retry_after = None
+            try:
+                async with self.session.request(method, url, params=list(params), auth=auth) as response:
+                    status = response.status
+                    if json and status < 400:
+                        data = await response.json(content_type=None)
+                    else:
+                        data = await response.text()
+                    if status in retry_statuses:
+                        retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                self.request_duration.labels(endpoint=endpoint, status='error').observe(time.monotonic() - started_at)
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                reason = type(ex).__name__
+            else:
+                self.request_duration.labels(endpoint=endpoint, status=status).observe(time.monotonic() - started_at)
+                if status not in retry_statuses or attempt >= self.max_retries:
+                    return status, data
+                reason = str(status)
+            self.retries.labels(endpoint=endpoint, reason=reason).inc()
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            try:
+                delay = max(delay, float(retry_after)) if retry_after is not None else delay
+            except ValueError:
+                pass
+            log.info("Retrying %s %s in %.1fs (%s)", method, endpoint, delay, reason)
+            attempt += 1
+            if retry_after is not None:
+                # the whole account is limited, not just this request, so the wait happens in acquire
+                budget.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def get_page(self, path, endpoint):
+        """Status and text of a page on the Challonge website"""
+        return await self.request('GET', f'{WEB_URL}{path}', endpoint=endpoint)
@@ -0,0 +1,162 @@
+import asyncio
+import collections
+import logging
+
+import challonge
+
+from .metrics import Counter, format_sample
+
+
+log = logging.getLogger(__name__)
+
+MATCH_OPENED = 'match_opened'
+MATCH_COMPLETED = 'match_completed'
+MATCH_REOPENED = 'match_reopened'
+PARTICIPANT_ADDED = 'participant_added'
+PARTICIPANT_REMOVED = 'participant_removed'
+
+# kind is one of the constants above, item the Challonge match or participant (or the ID of a removed participant)
+ChallongeEvent = collections.namedtuple('ChallongeEvent', ('kind', 'item'))
+
+
+class _Snapshot:
+    def __init__(self):
+        self.polled = False
+        # Challonge ID -> (updated_at, state)
+        self.matches = {}
+        # Challonge ID -> updated_at
+        self.participants = {}
+
+
+class TournamentWatcher:
+    """Polls the Challonge tournaments that are in progress and reports what changed
+
+    Each poll is a single request that includes the tournament's
+    matches and participants. They are compared with the previous
+    poll by ``updated_at``, and only the matches and participants that
+    changed are passed on to ``ctl.on_challonge_events`` as
+    :class:`ChallongeEvent` objects.
+
+    A tournament is polled every ``min_interval`` seconds while things
+    are happening; each poll without changes backs off by ``backoff``,
+    up to ``max_interval``. Polls go through ``ctl.challonge_http`` and
+    so take from the same :class:`RequestBudget` as every other request
+    of the account; they back off further while it is exhausted.
+    """
+
+    def __init__(self, ctl, min_interval=10.0, max_interval=120.0, backoff=1.5):
+        self.ctl = ctl
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.polls = Counter()
+        self.failed_polls = Counter()
+        self.events = collections.defaultdict(Counter)
+        self._snapshots = {}
+        self._tasks = {}
+
+    def watch(self, tournament_id):
+        task = self._tasks.get(tournament_id)
+        if task is None or task.done():
+            self._tasks[tournament_id] = self.ctl.core.loop.create_task(self._run(tournament_id))
+
+    def unwatch(self, tournament_id):
+        task = self._tasks.pop(tournament_id, None)
+        if task is not None:
+            task.cancel()
+        self._snapshots.pop(tournament_id, None)
+
+    async def _run(self, tournament_id):
+        interval = self.min_interval
+        while True:
+            # the client acquires from the budget for each request itself
+            budget = self.ctl.challonge_http.get_budget(self.ctl.settings.challonge_username)
+            try:
+                challonge_tournament, events = await self.poll(tournament_id)
+            except asyncio.CancelledError:
+                raise
+            except (challonge.APIException, asyncio.TimeoutError, OSError):
+                self.failed_polls.inc()
+                log.warning("Polling Challonge tournament %s failed", tournament_id, exc_info=True)
+                events = []
+            except Exception:
+                # anything else must not end the task either, or the tournament would silently stop being watched
+                self.failed_polls.inc()
+                log.exception("Polling Challonge tournament %s failed", tournament_id)
+                events = []
+            else:
+                if events:
+                    try:
+                        await self.ctl.on_challonge_events(tournament_id, challonge_tournament, events)
+                    except Exception:
+                        log.exception("Handling changes of Challonge tournament %s failed", tournament_id)
+                if challonge_tournament.state == challonge.TournamentState.complete.value:
+                    self._tasks.pop(tournament_id, None)
+                    self._snapshots.pop(tournament_id, None)
+                    return
+            if events:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            await asyncio.sleep(interval * 2 if budget.saturated else interval)
+
+    async def poll(self, tournament_id):
+        """Fetch a tournament and return it with the events since the last poll"""
+        challonge_tournament = await self.ctl.get_challonge_tournament(tournament_id, force_update=True)
+        self.polls.inc()
+        snapshot = self._snapshots.setdefault(tournament_id, _Snapshot())
+        events = self._diff_matches(snapshot, challonge_tournament.matches or [])
+        events += self._diff_participants(snapshot, challonge_tournament.participants or [])
+        for event in events:
+            self.events[event.kind].inc()
+        return challonge_tournament, events
+
+    @staticmethod
+    def _diff_matches(snapshot, challonge_matches):
+        events = []
+        matches = {}
+        for challonge_match in challonge_matches:
+            matches[challonge_match.id] = (challonge_match.updated_at, challonge_match.state)
+            previous = snapshot.matches.get(challonge_match.id)
+            if previous is not None and previous[0] == challonge_match.updated_at:
+                continue
+            previous_state = previous[1] if previous is not None else None
+            if previous_state == challonge_match.state:
+                continue
+            if challonge_match.state == challonge.MatchState.open_.value:
+                kind = MATCH_REOPENED if previous_state == challonge.MatchState.complete.value else MATCH_OPENED
+                events.append(ChallongeEvent(kind, challonge_match))
+            elif challonge_match.state == challonge.MatchState.complete.value and previous is not None:
+                events.append(ChallongeEvent(MATCH_COMPLETED, challonge_match))
+        snapshot.matches = matches
+        return events
+
+    @staticmethod
+    def _diff_participants(snapshot, challonge_participants):
+        events = []
+        participants = {}
+        for challonge_participant in challonge_participants:
+            if not challonge_participant.active:
+                continue
+            participants[challonge_participant.id] = challonge_participant.updated_at
+            if snapshot.polled and challonge_participant.id not in snapshot.participants:
+                events.append(ChallongeEvent(PARTICIPANT_ADDED, challonge_participant))
+        for challonge_id in snapshot.participants.keys() - participants.keys():
+            events.append(ChallongeEvent(PARTICIPANT_REMOVED, challonge_id))
+        snapshot.participants = participants
+        snapshot.polled = True
+        return events
+
+    def collect_metrics(self):
+        lines = [
+            "# TYPE purah_challonge_watched_tournaments gauge",
+            format_sample('purah_challonge_watched_tournaments', {}, len(self._tasks)),
+            "# TYPE purah_challonge_polls_total counter",
+            format_sample('purah_challonge_polls_total', {}, self.polls.value),
+            "# TYPE purah_challonge_failed_polls_total counter",
+            format_sample('purah_challonge_failed_polls_total', {}, self.failed_polls.value),
+            "# TYPE purah_challonge_events_total counter",
+        ]
+        for kind, counter in self.events.items():
+            lines.append(format_sample('purah_challonge_events_total', {'kind': kind}, counter.value))
+        return lines
@@ -0,0 +1,186 @@
+import logging
+
+import discord
+
+from hero import models
+
+from .db import async_using_db
+from .models import Match, PooledMatchChannel
+
+
+log = logging.getLogger(__name__)
+
+
+class MatchChannelPool:
+    """Warm pool of parked text/voice channel pairs for matches
+
+    Instead of creating two channels for every match and deleting them
+    again afterwards, a match leases a parked pair and only needs one
+    edit per channel to get its name and overwrites. When the match is
+    closed, the pair is reset and returned to the pool. Whenever a
+    lease leaves a guild with fewer than ``size`` parked pairs, the
+    pool is refilled in the background.
+    """
+
+    TEXT_NAME = 'parked-match'
+    VOICE_NAME = 'Parked Match'
+
+    def __init__(self, ctl, size=3):
+        self.ctl = ctl
+        self.size = size
+        self._refilling = set()
+
+    @staticmethod
+    def get_parked_overwrites(guild):
+        text_overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True, manage_messages=True,
+                                                  manage_channels=True)
+        }
+        voice_overwrites = {
+            guild.default_role: discord.PermissionOverwrite(connect=False),
+            guild.me: discord.PermissionOverwrite(connect=True, manage_channels=True)
+        }
+        return text_overwrites, voice_overwrites
+
+    @async_using_db
+    def _claim(self, guild: models.Guild):
+        available = PooledMatchChannel.objects.filter(guild=guild, leased=False)
+        for channel_id, voice_channel_id in available.values_list('channel_id', 'voice_channel_id')[:5]:
+            # only one lease can win a pair, even if two matches are created at once
+            if PooledMatchChannel.objects.filter(pk=channel_id, leased=False).update(leased=True):
+                return channel_id, voice_channel_id
+        return None
+
+    @async_using_db
+    def _count_available(self, guild: models.Guild):
+        return PooledMatchChannel.objects.filter(guild=guild, leased=False).count()
+
+    @async_using_db
+    def _get_voice_channel_id(self, channel_id):
+        """Return the voice channel ID of a pooled pair, or False if the channel is not pooled"""
+        try:
+            return PooledMatchChannel.objects.values_list('voice_channel_id', flat=True).get(pk=channel_id)
+        except PooledMatchChannel.DoesNotExist:
+            return False
+
+    @async_using_db
+    def _return(self, channel_id, match: Match = None):
+        if match is not None:
+            # Match.channel is unique, so the match has to let go of the pair first
+            Match.objects.filter(pk=match.pk).update(channel=None, voice_channel=None)
+        PooledMatchChannel.objects.filter(pk=channel_id).update(leased=False)
+
+    @async_using_db
+    def _forget(self, channel_id, voice_channel_id):
+        # deleting the text channel cascades to the pooled pair
+        models.TextChannel.objects.filter(pk=channel_id).delete()
+        if voice_channel_id is not None:
+            models.VoiceChannel.objects.filter(pk=voice_channel_id).delete()
+
+    async def _discard(self, text_channel, voice_channel, channel_id, voice_channel_id):
+        for _channel in (text_channel, voice_channel):
+            if _channel is not None:
+                try:
+                    await _channel.delete(reason="Removing match channel from the pool")
+                except (discord.Forbidden, discord.NotFound):
+                    pass
+        await self._forget(channel_id, voice_channel_id)
+
+    async def lease(self, guild: models.Guild):
+        """Lease a parked pair of channels
+
+        Returns a ``(discord.TextChannel, discord.VoiceChannel)``
+        tuple, or ``None`` if there is no parked pair in the guild.
+        """
+        discord_guild = guild.discord
+        try:
+            while True:
+                claimed = await self._claim(guild)
+                if claimed is None:
+                    return None
+                channel_id, voice_channel_id = claimed
+                # parked channels are in the guild's channel cache, no need to fetch them
+                text_channel = discord_guild.get_channel(channel_id)
+                voice_channel = discord_guild.get_channel(voice_channel_id) if voice_channel_id else None
+                if text_channel is None or voice_channel is None:
+                    # someone deleted (part of) the pair while it was parked
+                    await self._discard(text_channel, voice_channel, channel_id, voice_channel_id)
+                    continue
+                return text_channel, voice_channel
+        finally:
+            self.request_refill(guild)
+
+    async def release(self, match: Match, channel: models.TextChannel, guild: models.Guild):
+        """Reset a match's channels and return them to the pool
+
+        Pooled channels that can't be reset, or that aren't needed
+        because the pool is already full, are deleted. Returns False
+        if the channel isn't pooled, in which case the caller has to
+        take care of it. ``match`` is None for channels whose match was
+        never saved.
+        """
+        voice_channel_id = await self._get_voice_channel_id(channel.id)
+        if voice_channel_id is False:
+            return False
+        discord_guild = guild.discord
+        text_channel = discord_guild.get_channel(channel.id)
+        voice_channel = discord_guild.get_channel(voice_channel_id) if voice_channel_id else None
+        if text_channel is None or voice_channel is None or await self._count_available(guild) >= self.size:
+            await self._discard(text_channel, voice_channel, channel.id, voice_channel_id)
+            return True
+
+        text_overwrites, voice_overwrites = self.get_parked_overwrites(guild)
+        try:
+            for member in voice_channel.members:
+                await member.move_to(None, reason="Match is over")
+            await text_channel.purge(limit=None)
+            await text_channel.edit(name=self.TEXT_NAME, overwrites=text_overwrites,
+                                    reason="Returning match channel to the pool")
+            await voice_channel.edit(name=self.VOICE_NAME, overwrites=voice_overwrites,
+                                     reason="Returning match channel to the pool")
+        except (discord.Forbidden, discord.HTTPException):
+            log.exception("Could not reset match channel %s, removing it from the pool", channel.id)
+            await self._discard(text_channel, voice_channel, channel.id, voice_channel_id)
+            return True
+        await self._return(channel.id, match)
+        return True
+
+    def request_refill(self, guild: models.Guild):
+        if guild.id in self._refilling:
+            return
+        self._refilling.add(guild.id)
+        self.ctl.core.loop.create_task(self._refill(guild))
+
+    async def _refill(self, guild: models.Guild):
+        try:
+            missing = self.size - await self._count_available(guild)
+            for _ in range(missing):
+                await self._create_pair(guild)
+        except (discord.Forbidden, discord.HTTPException):
+            log.exception("Could not refill the match channel pool of guild %s", guild.id)
+        finally:
+            self._refilling.discard(guild.id)
+
+    async def _create_pair(self, guild: models.Guild):
+        category = await self.ctl.get_match_category(guild, slots=2)
+        text_overwrites, voice_overwrites = self.get_parked_overwrites(guild)
+        slots = 2
+        try:
+            text_channel = await guild.create_text_channel(self.TEXT_NAME, overwrites=text_overwrites,
+                                                           category=category,
+                                                           reason="Parking a channel for future matches")
+            self.ctl.match_categories.channel_created(text_channel)
+            slots -= 1
+            voice_channel = await guild.create_voice_channel(self.VOICE_NAME, overwrites=voice_overwrites,
+                                                             category=category,
+                                                             reason="Parking a voice channel for future matches")
+            self.ctl.match_categories.channel_created(voice_channel)
+            slots -= 1
+        finally:
+            if slots:
+                self.ctl.match_categories.release(category, slots)
+        text_channel = await self.ctl.db.wrap_text_channel(text_channel)
+        voice_channel = await self.ctl.db.wrap_voice_channel(voice_channel)
+        await PooledMatchChannel.objects.async_create(channel=text_channel, voice_channel=voice_channel,
+                                                      guild=guild)
@@ -6,19 +6,44 @@ from hero.models import TextChannel
 from .models import DoublesMatch, GuildSetup, Match
 
 
+async def _is_match_participant(ctx: Context):
+    if ctx.guild is None:
+        return False
+    match = Match.objects.filter(channel=await ctx.bot.db.wrap_text_channel(ctx.channel))
+    match_exists = await match.async_exists()
+    if not match_exists:
+        return False
+    match = await match.async_first()
+    await match.async_load()
+    player_1 = await match.player_1
+    player_2 = await match.player_2
+    return ctx.author.id in (player_1.id, player_2.id)
+
+
+async def _is_doubles_match_participant(ctx: Context):
+    if ctx.guild is None:
+        return False
+    match = DoublesMatch.objects.filter(channel=await ctx.bot.db.wrap_text_channel(ctx.channel))
+    match_exists = await match.async_exists()
+    if not match_exists:
+        return False
+    match = await match.async_first()
+    for team in (await match.team_1, await match.team_2):
+        member_1 = await team.member_1
+        member_2 = await team.member_2
+        if ctx.author.id in (member_1.user_id, member_2.user_id):
+            return True
+    return False
+
+
 def match_participant_only():
+    return check(_is_match_participant)
+
+
+def any_match_participant_only():
+    """Participants of the singles or doubles match of the channel"""
     async def predicate(ctx: Context):
-        if ctx.guild is None:
-            return False
-        match = Match.objects.filter(channel=await ctx.bot.db.wrap_text_channel(ctx.channel))
-        match_exists = await match.async_exists()
-        if not match_exists:
-            return False
-        match = await match.async_first()
-        await match.async_load()
-        player_1 = await match.player_1
-        player_2 = await match.player_2
-        return ctx.author.id in (player_1.id, player_2.id)
+        return await _is_match_participant(ctx) or await _is_doubles_match_participant(ctx)
 
     return check(predicate)
 
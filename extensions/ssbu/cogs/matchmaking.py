@@ -7,11 +7,11 @@ import hero
 from hero import checks, models, ObjectDoesNotExist
 from hero.utils import MockMember
 
-from ..checks import match_only, match_participant_only
+from ..checks import any_match_participant_only, match_only, match_participant_only
 from ..controller import SsbuController
 from ..fighters import Fighter
-from ..models import (Game, GuildPlayer, GuildSetup, Match, MatchCategory, MatchOffer, MatchSearch, MatchmakingSetup,
-                      Player, Ruleset, SsbuSettings)
+from ..models import (DoublesMatch, Game, GuildPlayer, GuildSetup, Match, MatchCategory, MatchOffer, MatchSearch,
+                      MatchmakingSetup, Player, Ruleset, SsbuSettings)
 from ..stages import Stage
 
 
@@ -37,7 +37,10 @@ class Matchmaking(hero.Cog):
         "I'm sorry, but your princess is in another castle.",
         "I'd destroy you, but my controller is broken right now, sorry."
     ]
-    next_easter_egg_line = 0
+    # guild ID -> index of the next easter egg line
+    next_easter_egg_lines = {}
+
+    SEED_CHUNK_SIZE = 1000
 
     @hero.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
@@ -59,6 +62,12 @@ class Matchmaking(hero.Cog):
         if emoji.is_custom_emoji():
             return
 
+        # Is the reaction the answer to a confirmation prompt?
+        if str(emoji) in (self.ACCEPT_REACTION, self.DECLINE_REACTION):
+            confirmed = str(emoji) == self.ACCEPT_REACTION
+            if await self.ctl.resolve_confirmation(message_id, user_id, confirmed):
+                return
+
         guild = self.core.get_guild(guild_id)
         channel = guild.get_channel(channel_id)
         if channel is None:
@@ -94,7 +103,7 @@ class Matchmaking(hero.Cog):
 
                 management_message = await match.management_message
                 if management_message.id == message_id:
-                    await message.remove_reaction(emoji, member)
+                    self.ctl.rest.remove_reaction(message, emoji, member)
 
                     if str(emoji) == self.PRIVATE_REACTION:
                         # make the match private
@@ -113,7 +122,7 @@ class Matchmaking(hero.Cog):
         else:
             # Is the reaction relevant for the main matchmaking?
             if message_id == (matchmaking_message := await matchmaking_setup.matchmaking_message).id:
-                await message.remove_reaction(emoji, member)
+                self.ctl.rest.remove_reaction(message, emoji, member)
 
                 if str(emoji) == self.LOOKING_REACTION:
                     # looking for opponent
@@ -147,7 +156,7 @@ class Matchmaking(hero.Cog):
                         await MatchOffer.async_get(message__channel__id=channel_id,
                                                    offering=offering, offered_to=offered_to)
                     except MatchOffer.DoesNotExist:
-                        await message.remove_reaction(emoji, offering)
+                        self.ctl.rest.remove_reaction(message, emoji, member)
                         ranked = matchmaking_setup.ranked
                         await self.ctl.offer_match(channel, offered_to, offering, allow_decline=False, ranked=ranked)
                 elif str(emoji) == self.DECLINE_REACTION:
@@ -192,12 +201,28 @@ class Matchmaking(hero.Cog):
                 player_2 = await match.player_2
                 player_2_user = await player_2.user
                 if member.id not in (player_1_user.id, player_2_user.id):
-                    await message.remove_reaction(emoji, member)
+                    self.ctl.rest.remove_reaction(message, emoji, member)
                     member = await self.db.wrap_member(member)
                     await self.ctl.spectate_match(match, member)
 
+    @hero.listener()
+    async def on_guild_channel_create(self, channel):
+        self.ctl.match_categories.channel_created(channel)
+
+    @hero.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.ctl.match_categories.channel_deleted(channel)
+
+    @hero.listener()
+    async def on_guild_channel_update(self, before, after):
+        self.ctl.match_categories.channel_updated(before, after)
+
     @hero.listener()
     async def on_message(self, message):
+        # Keep track of the last message per channel, including own messages,
+        # so striking messages can be edited without fetching the channel history
+        self.ctl.note_channel_message(message)
+
         # Ignore own messages
         if message.author == self.core.user:
             return
@@ -321,16 +346,13 @@ class Matchmaking(hero.Cog):
             await ctx.send("You can't challenge yourself.")
             return
         if _user.id == self.core.user.id:
-            line = self.EASTER_EGG_LINES[self.next_easter_egg_line]
+            line_number = self.next_easter_egg_lines.get(ctx.guild.id, 0)
+            line = self.EASTER_EGG_LINES[line_number]
             try:
                 line = line.format(member=ctx.author)
             except TypeError:
                 pass
-            num_lines = len(self.EASTER_EGG_LINES)
-            if self.next_easter_egg_line == num_lines:
-                self.next_easter_egg_line = 0
-            else:
-                self.next_easter_egg_line += 1
+            self.next_easter_egg_lines[ctx.guild.id] = (line_number + 1) % len(self.EASTER_EGG_LINES)
             await ctx.send(line)
             return
 
@@ -349,14 +371,25 @@ class Matchmaking(hero.Cog):
         await self.ctl.offer_match(channel, member, offering, ranked=ranked)
 
     @hero.command()
-    async def charpick(self, ctx, *, fighter: Fighter):
+    async def charpick(self, ctx, *, fighter: str):
         try:
             await ctx.message.delete()
         except discord.Forbidden:
             pass
+        # an optional match ID can follow the fighter, e.g. `/charpick Pikachu 1234`
+        match_id = None
+        _fighter, _, _match_id = fighter.rpartition(' ')
+        if _fighter and _match_id.lstrip('#').isdigit():
+            fighter = _fighter
+            match_id = int(_match_id.lstrip('#'))
+        try:
+            fighter = Fighter.parse(fighter)
+        except ValueError as ex:
+            await ctx.send(str(ex))
+            return
         picking = await self.db.wrap_user(ctx.author)
         try:
-            await self.ctl.pick_character(ctx.channel, picking, fighter)
+            await self.ctl.pick_character(ctx.channel, picking, fighter, match_id=match_id)
         except CheckFailure as cf:
             await ctx.send(str(cf))
 
@@ -386,21 +419,29 @@ class Matchmaking(hero.Cog):
             await ctx.send("It is not your turn to pick a stage.", delete_after=30)
 
     @hero.command(aliases=['win', 'victory'])
-    @match_participant_only()
+    @any_match_participant_only()
     async def won(self, ctx):
         await ctx.message.delete()
         channel = await self.db.wrap_text_channel(ctx.channel)
-        match = await Match.objects.async_get(channel=channel)
         player = await self.db.wrap_user(ctx.author)
+        doubles_match = DoublesMatch.objects.filter(channel=channel)
+        if await doubles_match.async_exists():
+            await self.ctl.process_doubles_victory(await doubles_match.async_first(), player)
+            return
+        match = await Match.objects.async_get(channel=channel)
         await self.ctl.process_victory(match, player)
 
     @hero.command(aliases=['lose', 'loss'])
-    @match_participant_only()
+    @any_match_participant_only()
     async def lost(self, ctx):
         await ctx.message.delete()
         channel = await self.db.wrap_text_channel(ctx.channel)
-        match = await Match.objects.async_get(channel=channel)
         player = await self.db.wrap_user(ctx.author)
+        doubles_match = DoublesMatch.objects.filter(channel=channel)
+        if await doubles_match.async_exists():
+            await self.ctl.process_doubles_loss(await doubles_match.async_first(), player)
+            return
+        match = await Match.objects.async_get(channel=channel)
         await self.ctl.process_loss(match, player)
 
     @hero.command()
@@ -537,25 +578,51 @@ class Matchmaking(hero.Cog):
     async def test_stage(self, ctx, *, stage: Stage):
         await ctx.send(f"That's {stage}!")
 
+    @hero.command()
+    @checks.is_owner()
+    async def dbstats(self, ctx):
+        executor = self.ctl.db_executor
+        if executor is None:
+            await ctx.send("The database executor is not set up.")
+            return
+        paginator = Paginator()
+        paginator.add_line(f"Workers: {executor.running}/{executor.max_workers} busy, "
+                           f"queue: {executor.queue_depth}/{executor.queue_limit}, "
+                           f"rejected: {executor.rejected}, timed out: {executor.timed_out}")
+        paginator.add_line('')
+        paginator.add_line("call site: calls, total, mean, p95 (query) / p95 (wait)")
+        for call_site, stats in executor.top_call_sites(15):
+            latency, wait = stats.latency, stats.wait
+            paginator.add_line(f"{call_site}: {latency.count}, {latency.sum:.2f}s, {latency.mean * 1000:.0f}ms, "
+                               f"{latency.quantile(0.95) * 1000:.0f}ms / {wait.quantile(0.95) * 1000:.0f}ms")
+        if executor.slow_queries:
+            paginator.add_line('')
+            paginator.add_line("Slow queries:")
+            for timestamp, call_site, duration, waited in reversed(executor.slow_queries):
+                when = datetime.datetime.utcfromtimestamp(timestamp).strftime('%H:%M:%S')
+                paginator.add_line(f"{when} {call_site}: {duration * 1000:.0f}ms (waited {waited * 1000:.0f}ms)")
+        for page in paginator.pages:
+            await ctx.send(page)
+
     @hero.command()
     @checks.is_owner()
     async def reset_allratings(self, ctx):
-        from hero import async_using_db
-
-        @async_using_db
-        def _clear_ratings():
-            # delete all Matches
-            for match in list(Match.objects.all()):
-                match.delete()
-            # delete all GuildPlayers
-            for guild_player in list(GuildPlayer.objects.all()):
-                guild_player.delete()
-            # delete all Players
-            for player in list(Player.objects.all()):
-                player.delete()
-        await _clear_ratings()
+        async with ctx.typing():
+            num_matches, num_guild_players, num_players = await self.ctl.clear_all_ratings()
 
-        await ctx.send("Done!")
+        await ctx.send(f"Done! Deleted {num_matches} matches, {num_guild_players} local "
+                       f"and {num_players} global ratings.")
+
+    @staticmethod
+    def _get_euas_seed(member: discord.Member, divx_role, div1_role, div1_trial_role, div2_role):
+        if divx_role in member.roles:
+            return 2800, 100
+        elif div1_role in member.roles or div1_trial_role in member.roles:
+            return 2500, 150
+        elif div2_role in member.roles:
+            return 2000, 250
+        else:
+            return 1500, 350
 
     @hero.command()
     @has_any_role(784115581837770763, 415354084846206976)
@@ -567,22 +634,10 @@ class Matchmaking(hero.Cog):
         div1_role = guild.get_role(783857557529165854)
         div1_trial_role = guild.get_role(784497087915622470)
         div2_role = guild.get_role(783858759226359900)
-        div3_role = guild.get_role(783858963967901698)
         guild = await self.db.wrap_guild(guild)
         mention = member.mention
 
-        if divx_role in member.roles:
-            rating = 2800
-            deviation = 100
-        elif div1_role in member.roles or div1_trial_role in member.roles:
-            rating = 2500
-            deviation = 150
-        elif div2_role in member.roles:
-            rating = 2000
-            deviation = 250
-        else:
-            rating = 1500
-            deviation = 350
+        rating, deviation = self._get_euas_seed(member, divx_role, div1_role, div1_trial_role, div2_role)
 
         user, _ = await models.User.objects.async_get_or_create(id=member._user.id)
         member, _ = await models.Member.objects.async_get_or_create(user=user, guild=guild)
@@ -598,113 +653,71 @@ class Matchmaking(hero.Cog):
         div1_role = guild.get_role(783857557529165854)
         div1_trial_role = guild.get_role(784497087915622470)
         div2_role = guild.get_role(783858759226359900)
-        div3_role = guild.get_role(783858963967901698)
-        members = guild.members
+        seeds = [
+            (member.id, *self._get_euas_seed(member, divx_role, div1_role, div1_trial_role, div2_role))
+            for member in guild.members if not member._user.bot
+        ]
         guild = await self.db.wrap_guild(guild)
-        for member in members:
-            if member._user.bot:
-                continue
-            if divx_role in member.roles:
-                rating = 2800
-                deviation = 100
-            elif div1_role in member.roles or div1_trial_role in member.roles:
-                rating = 2500
-                deviation = 150
-            elif div2_role in member.roles:
-                rating = 2000
-                deviation = 250
-            else:
-                rating = 1500
-                deviation = 350
-            user, _ = await models.User.objects.async_get_or_create(id=member._user.id)
-            member, _ = await models.Member.objects.async_get_or_create(user=user, guild=guild)
-            guild_player = GuildPlayer(member=member, rating=rating, deviation=deviation, volatility=0.06)
-            await guild_player.async_save()
-        await ctx.send("Done!")
+
+        total = len(seeds)
+        progress_message = await ctx.send(f"Resetting ratings... 0/{total}")
+        created = updated = 0
+        for start in range(0, total, self.SEED_CHUNK_SIZE):
+            chunk = seeds[start:start + self.SEED_CHUNK_SIZE]
+            num_created, num_updated = await self.ctl.seed_guild_ratings(guild, chunk)
+            created += num_created
+            updated += num_updated
+            await progress_message.edit(content=f"Resetting ratings... {start + len(chunk)}/{total}")
+        await ctx.send(f"Done! Created {created} and reset {updated} ratings.")
 
     @hero.command()
-    @hero.cooldown(1, 600.0, hero.BucketType.guild)
     @checks.guild_only()
     async def stats(self, ctx, month: int = None, year: int = None):
-        Count, Q = models.Count, models.Q
-        async with ctx.typing():
-            guild = await self.db.wrap_guild(ctx.guild)
-            now = datetime.datetime.utcnow()
-            if month is None:
-                month = now.month
-            if year is None:
-                year = now.year
-            month_start = datetime.datetime(year=year, month=month, day=1, tzinfo=now.tzinfo)
-            next_month_start = datetime.datetime(year=year, month=month + 1, day=1, tzinfo=now.tzinfo)
-            # most active users this month
-            members_qs = models.Member.objects.filter(guild=guild, user__is_active=True)
-            members_qs = members_qs.annotate(
-                num_total_matches=Count(
-                    'user__match', filter=Q(
-                        user__match__guild=guild, user__match__started_at__gte=month_start,
-                        user__match__started_at__lt=next_month_start
-                    )
-                )
-            ).filter()
-            members_qs = members_qs.annotate(
-                num_ranked_matches=Count(
-                    'user__match', filter=Q(
-                        user__match__guild=guild, user__match__ranked=True,
-                        user__match__started_at__gte=month_start, user__match__started_at__lt=next_month_start
-                    )
-                )
-            )
-
-            @hero.async_using_db
-            def get_users_with_most_matches(_members_qs, limit=10):
-                return list(_members_qs.order_by('-num_total_matches')[:limit])
-
-            @hero.async_using_db
-            def get_users_with_least_matches(_members_qs):
-                return list(_members_qs.filter(num_total_matches=0))
-
-            @hero.async_using_db
-            def get_highest_rated_users(_guild, limit=10):
-                return list(GuildPlayer.objects.filter(member__guild=_guild).order_by('-rating')[:limit])
-
-            most_active_users = await get_users_with_most_matches(members_qs)
-            least_active_users = await get_users_with_least_matches(members_qs)
-            highest_rated_users = await get_highest_rated_users(guild)
-
-            paginator = Paginator(prefix='', suffix='')
-
-            paginator.add_line("**__Most active users:__**", empty=True)
-            for i, member in enumerate(most_active_users, 1):
-                _user = await member.user
-                user = await _user.fetch()
-                paginator.add_line(
-                    f"**{i}.** {user.mention}: **{member.num_total_matches}**"
-                )
+        guild = await self.db.wrap_guild(ctx.guild)
+        today = datetime.datetime.utcnow().date()
+        if month is None:
+            month = today.month
+        if year is None:
+            year = today.year
+        month_start = datetime.date(year=year, month=month, day=1)
+        if month == 12:
+            next_month_start = datetime.date(year=year + 1, month=1, day=1)
+        else:
+            next_month_start = datetime.date(year=year, month=month + 1, day=1)
 
-            paginator.add_line('')
-            paginator.add_line("**__Least active users:__**", empty=True)
-            for i, member in enumerate(least_active_users, 1):
-                _user = await member.user
-                try:
-                    user = await _user.fetch()
-                except discord.HTTPException:
-                    continue
-                paginator.add_line(
-                    f"**{i}.** {user.mention}: **{member.num_total_matches}**"
-                )
+        most_active_users, least_active_users, num_least_active, highest_rated_users = (
+            await self.ctl.get_activity_stats(guild, month_start, next_month_start)
+        )
 
-            paginator.add_line('')
-            paginator.add_line("**__Highest rated users:__**", empty=True)
-            for i, guild_player in enumerate(highest_rated_users, 1):
-                _member = await guild_player.member
-                _user = await _member.user
-                user = await _user.fetch()
-                paginator.add_line(
-                    f"**{i}.** {user.mention}: **{guild_player.rating}**±**{guild_player.deviation}**"
-                )
-
-            for page in paginator.pages:
-                await ctx.send(page)
+        paginator = Paginator(prefix='', suffix='')
+
+        paginator.add_line("**__Most active users:__**", empty=True)
+        for i, (user_id, num_total_matches, _) in enumerate(most_active_users, 1):
+            paginator.add_line(f"**{i}.** <@{user_id}>: **{num_total_matches}**")
+
+        paginator.add_line('')
+        paginator.add_line("**__Least active users:__**", empty=True)
+        for i, user_id in enumerate(least_active_users, 1):
+            paginator.add_line(f"**{i}.** <@{user_id}>: **0**")
+        if num_least_active > len(least_active_users):
+            paginator.add_line(f"... and {num_least_active - len(least_active_users)} more without any matches")
+
+        paginator.add_line('')
+        paginator.add_line("**__Highest rated users:__**", empty=True)
+        for i, (user_id, rating, deviation) in enumerate(highest_rated_users, 1):
+            paginator.add_line(f"**{i}.** <@{user_id}>: **{rating}**±**{deviation}**")
+
+        for page in paginator.pages:
+            await ctx.send(page, allowed_mentions=discord.AllowedMentions.none())
+
+    @hero.command()
+    @checks.guild_only()
+    @checks.is_owner()
+    async def backfill_activity(self, ctx):
+        async with ctx.typing():
+            guild = await self.db.wrap_guild(ctx.guild)
+            num_rollups = await self.ctl.backfill_member_activity(guild)
+        await ctx.send(f"Done! Rebuilt {num_rollups} daily activity records.")
 
     @hero.command()
     @checks.has_guild_permissions(manage_roles=True)
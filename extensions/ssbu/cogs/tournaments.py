@@ -41,7 +41,60 @@ class Tournaments(hero.Cog):
         if guild_id is None:
             return
 
-        # TODO
+        tournament, message_kind = await self.ctl.get_tournament_by_message(message_id)
+        if tournament is None or tournament.doubles:
+            return
+        # tournaments can be created with their own signup emoji
+        if str(emoji) != await self.ctl.get_reaction_emoji(tournament, message_kind):
+            return
+
+        guild = self.core.get_guild(guild_id)
+        member = payload.member or guild.get_member(user_id)
+        if member is None:
+            return
+        _member = await self.db.wrap_member(member)
+        if message_kind == 'signup':
+            try:
+                await self.ctl.signup(tournament, _member)
+            except BadArgument as ex:
+                try:
+                    await member.send(str(ex))
+                except discord.Forbidden:
+                    pass
+        elif not await self.ctl.checkin(tournament, _member):
+            try:
+                await member.send(f"You have to be signed up for **{tournament.name}** to check in.")
+            except discord.Forbidden:
+                pass
+
+    @hero.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        emoji: discord.PartialEmoji = payload.emoji
+        user_id = payload.user_id
+        guild_id = payload.guild_id
+
+        if user_id == self.core.user.id or guild_id is None:
+            return
+        tournament, message_kind = await self.ctl.get_tournament_by_message(payload.message_id)
+        if tournament is None or tournament.doubles:
+            return
+        if str(emoji) != await self.ctl.get_reaction_emoji(tournament, message_kind):
+            return
+
+        member = self.core.get_guild(guild_id).get_member(user_id)
+        if member is None:
+            return
+        _member = await self.db.wrap_member(member)
+        if message_kind == 'signup':
+            try:
+                await self.ctl.sign_out(tournament, _member)
+            except BadArgument as ex:
+                try:
+                    await member.send(str(ex))
+                except discord.Forbidden:
+                    pass
+        else:
+            await self.ctl.checkin(tournament, _member, checked_in=False)
 
     @hero.command(hidden=True)
     @checks.is_owner()
@@ -480,9 +533,9 @@ class Tournaments(hero.Cog):
 
     @hero.command()
     @ssbu_checks.main_to_only()
-    async def to_checkreactions(self, ctx: hero.Context):
-        # TODO
-        pass
+    async def to_checkreactions(self, ctx: hero.Context, tournament: ssbu_models.Tournament):
+        async with ctx.typing():
+            await self.ctl.check_reactions(ctx, tournament)
 
     @hero.command()
     @ssbu_checks.main_to_only()
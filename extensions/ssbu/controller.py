@@ -1,10 +1,10 @@
 import asyncio
 import datetime
+import json
+import logging
 import math
 import random
-import re
 
-import aiohttp
 import challonge
 
 import discord
@@ -12,19 +12,41 @@ from discord.utils import find, get
 from discord.ext import commands
 from discord.ext.commands import BadArgument
 
+from django.db import transaction
+from django.utils import timezone
+
 import hero
-from hero import async_using_db, models, ObjectDoesNotExist
+from hero import models, ObjectDoesNotExist
 from hero.utils import MockMember
 
+from .bracket import BracketEngine, ChallongeMirror
+from .category_tracker import MatchCategoryTracker
+from .challonge_watcher import MATCH_COMPLETED, MATCH_REOPENED, PARTICIPANT_REMOVED, TournamentWatcher
+from .challonge_accounts import ChallongeUserResolver
+from .challonge_client import ChallongeClient
+from .channel_pool import MatchChannelPool
+from .db import async_using_db, DatabaseExecutor, DatabaseRoutingExecutor, install_executor
 from .dsr import DSR
 from .fighters import Fighter
-from .models import (Game, GuildPlayer, GuildSetup, Match, MatchCategory, MatchmakingSetup, MatchOffer, MatchSearch,
-                     Player, Ruleset, SsbuSettings)
+from .final_ranking import FinalRankingPipeline, group_by_rank
+from .models import (BracketMatch, DoublesGame, DoublesMatch, Game, GuildPlayer, GuildSetup, GuildTeam, Match,
+                     MatchCategory, MatchmakingSetup, MatchOffer, MatchSearch, MemberActivity, Participant,
+                     ParticipantTeam, PendingConfirmation, Player, Ruleset, ShardTask, SsbuSettings, Team)
 from .stages import Stage
 from . import models as ssbu_models, strings
 from ..scheduler import schedulable
 from .formats import Formats
 from .glicko import Glicko2
+from .locks import doubles_match_key, KeyedLocks, locked, match_key, member_key
+from .metrics import format_histogram, format_sample, Registry, serve_metrics
+from .participant_sync import ParticipantSync
+from .render_queue import RenderQueue
+from .rest_dispatcher import CRITICAL, RestDispatcher
+from .tracing import (create_match_attributes, match_attributes, offer_attributes, rating_attributes,
+                      search_attributes, set_attributes, tournament_attributes, traced, Tracer)
+
+
+log = logging.getLogger(__name__)
 
 
 class SsbuController(hero.Controller):
@@ -44,6 +66,16 @@ class SsbuController(hero.Controller):
     LEAVE_REACTION = DECLINE_REACTION
     SPECTATE_REACTION = '\U0001F441'
 
+    CONFIRMATION_TIMEOUT = datetime.timedelta(minutes=5)
+    # seconds between checks for tasks other processes handed over
+    SHARD_TASK_INTERVAL = 5
+    # handed over tasks that aren't done after this long are claimed again
+    SHARD_TASK_LEASE = datetime.timedelta(minutes=5)
+    SHARD_TASK_MAX_ATTEMPTS = 5
+    # how many tournament matches of a round are set up at the same time
+    ROUND_START_CONCURRENCY = 5
+    TOURNAMENT_WINS_REQUIRED = 2
+
     NUMBER_EMOJIS = (  # 0 - 10
         '\U00000030\U000020e3',
         '\U00000031\U000020e3',
@@ -61,19 +93,203 @@ class SsbuController(hero.Controller):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.challonge_user = None
+        self.db_executor = None
+        self.metrics = Registry()
+        self.challonge_http = ChallongeClient(self.metrics)
+        self.challonge_users = ChallongeUserResolver(self)
+        self.metrics.add_collector(self._collect_db_metrics)
+        self.tracer = Tracer(self.metrics)
+        self.metrics_runner = None
         self.cached_tournaments = {}
         self.cached_participants = {}
         self.cached_matches = {}
+        # signup/check-in message ID -> the emoji the bot reacted with
+        self.reaction_emojis = {}
+        # channel ID -> ID of the last message seen in that channel
+        self.last_message_ids = {}
+        # (ruleset ID, first game) -> rendered stage list lines
+        self.cached_stage_lines = {}
+        self.striking_message_queue = RenderQueue(self._update_striking_message)
+        self.participant_sync = ParticipantSync(self)
+        # tournament brackets are run locally and only mirrored to Challonge
+        self.brackets = BracketEngine()
+        self.bracket_mirror = ChallongeMirror(self)
+        self.challonge_watcher = TournamentWatcher(self)
+        self.metrics.add_collector(self.challonge_watcher.collect_metrics)
+        self.final_ranking = FinalRankingPipeline(self)
+        # outgoing Discord requests that can wait for more important ones
+        self.rest = RestDispatcher()
+        self.metrics.add_collector(self.rest.collect_metrics)
+        # per match and per member locks for all state changes
+        self.locks = KeyedLocks()
+        self.channel_pool = MatchChannelPool(self)
+        self.match_categories = MatchCategoryTracker(self)
+        # PendingConfirmation.action -> handler(pending confirmation, confirmed)
+        self.confirmation_handlers = {
+            'stage_suggestion': self._on_stage_suggestion_confirmation,
+            'close_active_match': self._on_close_active_match_confirmation,
+            'switch_fighter': self._on_switch_fighter_confirmation,
+            'forfeit': self._on_forfeit_confirmation,
+        }
+        self.setup_db_executor()
+        self.setup_instrumentation()
+        self.core.loop.create_task(self.start_metrics_server())
+        self.core.loop.create_task(self._run_shard_tasks())
+        self.core.loop.create_task(self.resume_tournament_watchers())
+
+    def get_own_shard_ids(self):
+        """IDs of the shards this process runs, or None if it runs all of them"""
+        shard_count = self.core.shard_count
+        if not shard_count or shard_count <= 1:
+            return None
+        shard_ids = getattr(self.core, 'shard_ids', None)
+        if shard_ids is None:
+            shard_id = getattr(self.core, 'shard_id', None)
+            if shard_id is None:
+                return None
+            shard_ids = (shard_id,)
+        return tuple(shard_ids)
+
+    def get_shard_id(self, guild_id):
+        return (guild_id >> 22) % (self.core.shard_count or 1)
+
+    def owns_guild(self, guild_id):
+        """Whether this process is responsible for a guild
+
+        When the bot is split into several processes, each one runs a
+        subset of the shards and only handles the guilds on them. Work
+        that isn't triggered by a Discord event (e.g. scheduled tasks)
+        has to check this, since every process could pick it up; see
+        hand_off for what to do with work for other processes.
+        """
+        shard_ids = self.get_own_shard_ids()
+        return shard_ids is None or self.get_shard_id(guild_id) in shard_ids
+
+    async def hand_off(self, guild_id, name, **kwargs):
+        """Leave a scheduled task for the process that owns the guild
+
+        ``name`` is the schedulable method to call with ``kwargs``
+        (which have to be JSON serializable) once that process claimed
+        the task.
+        """
+        await ShardTask.objects.async_create(shard_id=self.get_shard_id(guild_id), name=name,
+                                             arguments=json.dumps(kwargs))
+
+    @async_using_db
+    def _claim_shard_tasks(self, shard_ids, limit=50):
+        """Lease up to ``limit`` tasks; they're only deleted once they ran, see _finish_shard_task"""
+        now = timezone.now()
+        with transaction.atomic():
+            tasks = (ShardTask.objects.select_for_update(skip_locked=True)
+                     .filter(models.Q(claimed_at=None) | models.Q(claimed_at__lt=now - self.SHARD_TASK_LEASE))
+                     .order_by('pk'))
+            if shard_ids is not None:
+                tasks = tasks.filter(shard_id__in=shard_ids)
+            tasks = list(tasks[:limit])
+            ShardTask.objects.filter(pk__in=[task.pk for task in tasks]).update(claimed_at=now,
+                                                                                attempts=models.F('attempts') + 1)
+        for task in tasks:
+            task.attempts += 1
+        return tasks
+
+    @async_using_db
+    def _finish_shard_task(self, task):
+        ShardTask.objects.filter(pk=task.pk).delete()
+
+    async def _run_shard_tasks(self):
+        """Claim and run the tasks that other processes handed over to this one"""
+        await self.core.wait_until_ready()
+        while not self.core.is_closed():
+            try:
+                # without sharding across processes this picks up what's left from when there were several
+                tasks = await self._claim_shard_tasks(self.get_own_shard_ids())
+            except Exception:
+                log.exception("Could not claim handed over tasks")
+                tasks = []
+            for task in tasks:
+                try:
+                    await getattr(self, task.name)(**json.loads(task.arguments))
+                except Exception:
+                    if task.attempts < self.SHARD_TASK_MAX_ATTEMPTS:
+                        # stays leased, so it's retried once the lease expired
+                        log.exception("Handed over task %s(%s) failed, will retry", task.name, task.arguments)
+                        continue
+                    log.exception("Handed over task %s(%s) failed %s times, giving up", task.name,
+                                  task.arguments, task.attempts)
+                try:
+                    await self._finish_shard_task(task)
+                except Exception:
+                    log.exception("Could not delete handed over task %s(%s)", task.name, task.arguments)
+            if not tasks:
+                await asyncio.sleep(self.SHARD_TASK_INTERVAL)
 
     async def initialize_challonge_user(self):
         challonge_username = self.settings.challonge_username
         challonge_api_key = self.settings.challonge_api_key
         if challonge_username and challonge_api_key:
-            self.challonge_user = await challonge.get_user(challonge_username, challonge_api_key)
+            challonge_user = await challonge.get_user(challonge_username, challonge_api_key)
+            # all further API requests go through the shared client
+            connection = self.challonge_http.connection(challonge_username, challonge_api_key)
+            challonge_user.connection = connection
+            for challonge_tournament in getattr(challonge_user, 'tournaments', None) or []:
+                challonge_tournament.connection = connection
+            self.challonge_user = challonge_user
+            self.cached_tournaments.clear()
         return self.challonge_user
 
+    def setup_db_executor(self):
+        """Run all database calls on a bounded, instrumented executor
+
+        async_using_db from .db uses it directly. hero's async model
+        helpers go through the event loop's default executor, which
+        hands their calls over to it and runs everything else itself.
+        """
+        settings = self.settings
+        executor = DatabaseExecutor(max_workers=settings.db_pool_size, queue_limit=settings.db_queue_limit,
+                                    timeout=settings.db_timeout,
+                                    slow_query_threshold=settings.slow_query_threshold)
+        old_executor = install_executor(executor)
+        self.db_executor = executor
+        self.core.loop.set_default_executor(DatabaseRoutingExecutor(executor))
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+        return executor
+
+    def setup_instrumentation(self):
+        self.tracer.instrument_http(self.core.http)
+
+    async def start_metrics_server(self):
+        """Serve Prometheus metrics on the configured local port, if any"""
+        port = self.settings.metrics_port
+        if not port or self.metrics_runner is not None:
+            return
+        self.metrics_runner = await serve_metrics(self.metrics, port)
+
+    def _collect_db_metrics(self):
+        executor = self.db_executor
+        if executor is None:
+            return []
+        lines = [
+            "# TYPE purah_db_queue_depth gauge",
+            format_sample('purah_db_queue_depth', {}, executor.queue_depth),
+            "# TYPE purah_db_running gauge",
+            format_sample('purah_db_running', {}, executor.running),
+            "# TYPE purah_db_rejected_total counter",
+            format_sample('purah_db_rejected_total', {}, executor.rejected),
+            "# TYPE purah_db_timed_out_total counter",
+            format_sample('purah_db_timed_out_total', {}, executor.timed_out),
+            "# TYPE purah_db_call_duration_seconds histogram",
+        ]
+        call_sites = list(executor.stats.items())
+        for call_site, stats in call_sites:
+            lines += format_histogram('purah_db_call_duration_seconds', {'call_site': call_site}, stats.latency)
+        lines.append("# TYPE purah_db_wait_seconds histogram")
+        for call_site, stats in call_sites:
+            lines += format_histogram('purah_db_wait_seconds', {'call_site': call_site}, stats.wait)
+        return lines
+
     async def save_challonge_username(self, user: models.User, challonge_username):
-        player = ssbu_models.Player.async_get(user=user)
+        player = await ssbu_models.Player.async_get(user=user)
         player.challonge_user_id = await self.get_challonge_user_id(challonge_username)
         player.challonge_username = challonge_username
         await player.async_save()
@@ -93,27 +309,24 @@ class SsbuController(hero.Controller):
         new_rating_2 = round(rating_2 + k_factor_2 * odd_difference_2)
         return new_rating_1, new_rating_2
 
-    @staticmethod
-    async def get_challonge_user_id(username: str):
-        username = username.lower()
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://challonge.com/users/{username}") as response:
-                if response.status != 200:
-                    raise commands.BadArgument("Invalid Challonge username.")
-                text = await response.text()
-
-        # scrape page to find user ID
-        match = re.search(r'\?to=(\d+)', text)
-        return int(match.group(1))
-
-    @staticmethod
-    async def is_key_available(key: str):
+    async def get_challonge_user_id(self, username: str):
+        try:
+            user_id = await self.challonge_users.resolve(username)
+        except RuntimeError:
+            # Challonge didn't give us the profile page
+            raise commands.BadArgument("Invalid Challonge username.")
+        if user_id is None:
+            raise commands.BadArgument("Invalid Challonge username.")
+        return user_id
+
+    async def resolve_challonge_user_ids(self, usernames):
+        """Challonge user IDs (None for unknown users) by lowercase username, e.g. to import a participant list"""
+        return await self.challonge_users.resolve_many(usernames)
+
+    async def is_key_available(self, key: str):
         key = key.lower()
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://challonge.com/{key}") as response:
-                return response.status == 404
+        status, _ = await self.challonge_http.get_page(key, endpoint='web/:key')
+        return status == 404
 
     @async_using_db
     def create_tournament_series(self, key: str, guild: models.Guild, doubles: bool, name: str,
@@ -298,7 +511,7 @@ class SsbuController(hero.Controller):
         timestamp_embed = discord.Embed(timestamp=start_at, color=discord.Colour.blurple())
         timestamp_embed.set_footer(text="Start time in your local time")
         message = await channel.send(text, embed=timestamp_embed)
-        await message.add_reaction(signup_emoji)
+        self.rest.add_reactions(message, signup_emoji)
         return message
 
     @async_using_db
@@ -340,9 +553,12 @@ class SsbuController(hero.Controller):
         tournament.save()
         return tournament
 
-    async def get_challonge_tournament(self, *args, **kwargs):
-        # TODO
-        pass
+    async def get_challonge_tournament(self, tournament_id, force_update=False):
+        challonge_tournament = self.cached_tournaments.get(tournament_id)
+        if challonge_tournament is None or force_update:
+            challonge_tournament = await self.challonge_user.get_tournament(tournament_id)
+            self.cache_tournament(challonge_tournament)
+        return challonge_tournament
 
     async def get_challonge_participant(self, *args, **kwargs):
         # TODO
@@ -361,18 +577,165 @@ class SsbuController(hero.Controller):
     def cache_match(self, challonge_match):
         self.cached_matches[challonge_match.id] = challonge_match
 
-    async def signup(self, *args, **kwargs):
-        # TODO
-        pass
+    async def _are_signups_open(self, tournament):
+        if tournament.ended:
+            return False
+        challonge_tournament = self.cached_tournaments.get(tournament.id)
+        if challonge_tournament is None:
+            challonge_tournament = await self.get_challonge_tournament(tournament.id)
+        return challonge_tournament.state == challonge.TournamentState.pending.value
+
+    async def signup(self, tournament: ssbu_models.Tournament, member: models.Member):
+        """Sign up a member right away; Challonge is updated in the background"""
+        if not await self._are_signups_open(tournament):
+            raise BadArgument(f"Signups are not currently open for **{tournament.name}**.")
+        added, busy = await self._sign_up_members(tournament, [member])
+        if busy:
+            raise BadArgument(f"You can't sign up for **{tournament.name}** while you're taking part "
+                              f"in another tournament.")
+        if not added:
+            # already signed up
+            return
+        participant_role = await tournament.participant_role
+        await self.rest.add_roles(member, participant_role)
+        self.participant_sync.request_flush(tournament.id)
+
+    async def sign_out(self, tournament: ssbu_models.Tournament, member: models.Member):
+        """Sign out a member; only possible as long as signups are open"""
+        if not await self._are_signups_open(tournament):
+            raise BadArgument(f"**{tournament.name}** has already started, so you can't sign out anymore. "
+                              f"Please ask an organizer if you can't take part after all.")
+        if not await self._sign_out_members(tournament, [member.user_id]):
+            return False
+        participant_role = await tournament.participant_role
+        await self.rest.remove_roles(member, participant_role)
+        self.participant_sync.request_flush(tournament.id)
+        return True
 
     async def signup_team_member(self, *args, **kwargs):
         # TODO
         pass
 
+    @async_using_db
+    def get_tournament_by_message(self, message_id):
+        """The tournament a signup or check-in message belongs to, and which of them it is"""
+        Q = models.Q
+        tournament = (ssbu_models.Tournament.objects
+                      .filter(Q(signup_message_id=message_id) | Q(checkin_message_id=message_id), ended=False)
+                      .first())
+        if tournament is None:
+            return None, None
+        return tournament, 'signup' if tournament.signup_message_id == message_id else 'checkin'
+
+    async def get_reaction_emoji(self, tournament: ssbu_models.Tournament, message_kind: str):
+        """The emoji (as a string) that members react with to a tournament's signup or check-in message
+
+        Like in check_reactions, it's the reaction the bot added itself.
+        """
+        message_id = tournament.signup_message_id if message_kind == 'signup' else tournament.checkin_message_id
+        emoji = self.reaction_emojis.get(message_id)
+        if emoji is not None:
+            return emoji
+        message = await (tournament.signup_message if message_kind == 'signup' else tournament.checkin_message)
+        await message.fetch()
+        reaction = find(lambda _reaction: _reaction.me, message.discord.reactions)
+        if reaction is None:
+            # the bot's reaction may still be queued
+            return self.ACCEPT_REACTION
+        emoji = self.reaction_emojis[message_id] = str(reaction.emoji)
+        return emoji
+
+    @async_using_db
+    def _sign_up_members(self, tournament, members):
+        """Create (or revive) the members' Participant rows
+
+        Returns the members who weren't signed up yet, and the members
+        who were skipped because they're taking part in another
+        tournament.
+        """
+        # a member takes part in one tournament at a time, so rows left from ended tournaments are cleared
+        Participant.objects.filter(member__in=members, tournament__ended=True).delete()
+        existing = {participant.pk: participant for participant in Participant.objects.filter(member__in=members)}
+        revived = [member for member in members
+                   if (participant := existing.get(member.pk)) is not None
+                   and participant.tournament_id == tournament.id and participant.signed_out]
+        new = [member for member in members if member.pk not in existing]
+        busy = [member for member in members
+                if (participant := existing.get(member.pk)) is not None and participant.tournament_id != tournament.id]
+        # a revived participant might still be on Challonge with an old check-in
+        Participant.objects.filter(pk__in=[member.pk for member in revived], signed_out=True).update(
+            signed_out=False, checked_in=False, checkin_synced=False
+        )
+
+        user_ids = [member.user_id for member in new]
+        ratings = dict(Player.objects.filter(user_id__in=user_ids).values_list('user_id', 'rating'))
+        guild_ratings = dict(GuildPlayer.objects.filter(member__in=new).values_list('member_id', 'rating'))
+        default_rating = Player._meta.get_field('rating').default
+        Participant.objects.bulk_create([
+            Participant(member=member, tournament=tournament,
+                        starting_elo=ratings.get(member.user_id, default_rating),
+                        starting_guild_elo=guild_ratings.get(member.pk, default_rating))
+            for member in new
+        ], ignore_conflicts=True)
+        return revived + new, busy
+
+    @async_using_db
+    def _sign_out_members(self, tournament, user_ids):
+        """Mark participants as signed out and return their member IDs"""
+        participants = Participant.objects.filter(tournament=tournament, member__user_id__in=user_ids,
+                                                  signed_out=False)
+        member_ids = list(participants.values_list('pk', flat=True))
+        Participant.objects.filter(pk__in=member_ids).update(signed_out=True)
+        return member_ids
+
     @schedulable
     async def check_reactions(self, ctx: hero.Context, tournament: ssbu_models.Tournament):
-        # TODO
-        pass
+        """Make the participants match the reactions on the signup message
+
+        Catches reactions that were missed while the bot was offline.
+        The reactions are streamed page by page and compared with the
+        local participants as sets, so only the difference is applied,
+        and pushed to Challonge in one flush afterwards.
+        """
+        if not isinstance(tournament, ssbu_models.Tournament):
+            tournament = await ssbu_models.Tournament.async_get(pk=tournament)
+        if tournament.doubles:
+            # teams sign up together, see signup_team_member
+            return None
+        signup_message = await tournament.signup_message
+        await signup_message.fetch()
+        guild = await tournament.guild
+        await guild.fetch()
+
+        # the signup reaction is the one the bot added itself
+        reaction = find(lambda _reaction: _reaction.me, signup_message.discord.reactions)
+        signed_up = set()
+        if reaction is not None:
+            async for user in reaction.users():
+                if not user.bot:
+                    signed_up.add(user.id)
+
+        participants = await self._get_participant_user_ids(tournament)
+        to_add = [guild.get_member(user_id) for user_id in signed_up - participants]
+        to_add = await asyncio.gather(*[self.db.wrap_member(member) for member in to_add if member is not None])
+        added, _ = await self._sign_up_members(tournament, to_add) if to_add else ([], [])
+        removed = await self._sign_out_members(tournament, participants - signed_up)
+
+        participant_role = await tournament.participant_role
+        role_edits = [self.rest.add_roles(guild.get_member(member.user_id), participant_role) for member in added]
+        role_edits += [self.rest.remove_roles(member, participant_role)
+                       for user_id in participants - signed_up if (member := guild.get_member(user_id)) is not None]
+        await asyncio.gather(*role_edits, return_exceptions=True)
+        await self.participant_sync.flush(tournament.id)
+        if ctx is not None:
+            await ctx.send(f"Checked reactions for {tournament.name}: {len(added)} signed up, "
+                           f"{len(removed)} signed out.")
+        return added, removed
+
+    @async_using_db
+    def _get_participant_user_ids(self, tournament):
+        return set(Participant.objects.filter(tournament=tournament, signed_out=False)
+                   .values_list('member__user_id', flat=True))
 
     @schedulable
     async def start_checkin(self, ctx: hero.Context, tournament: ssbu_models.Tournament):
@@ -381,16 +744,105 @@ class SsbuController(hero.Controller):
 
     @schedulable
     async def start_tournament(self, ctx: hero.Context, tournament: ssbu_models.Tournament):
-        # TODO
-        pass
+        """Drop the participants who didn't check in, snapshot ratings and start the first round
+
+        Everything is decided on the local participants with set
+        operations; Challonge only gets the flush of pending check-ins,
+        process_check_ins and start. Participant roles are removed
+        concurrently through the REST dispatcher.
+        """
+        if not isinstance(tournament, ssbu_models.Tournament):
+            tournament = await ssbu_models.Tournament.async_get(pk=tournament)
+        # Challonge has to know about every check-in before it removes those who didn't
+        await self.participant_sync.flush(tournament.id)
+        dropped = await self._get_unchecked_participants(tournament)
+        challonge_tournament = await self.get_challonge_tournament(tournament.id)
+        await challonge_tournament.process_check_ins()
+        await challonge_tournament.start()
+        # only now that Challonge has dropped them too, so a failed start leaves everyone signed up
+        await self._delete_participants(tournament, dropped)
+        for challonge_id in dropped.values():
+            self.cached_participants.pop(challonge_id, None)
+        await self._snapshot_starting_ratings(tournament)
+        await self.create_bracket(tournament, challonge_tournament)
+
+        if dropped:
+            guild = await tournament.guild
+            await guild.fetch()
+            participant_role = await tournament.participant_role
+            await asyncio.gather(*[self.rest.remove_roles(member, participant_role) for user_id in dropped
+                                   if (member := guild.get_member(user_id)) is not None], return_exceptions=True)
+        if tournament.announcements_channel_id is not None:
+            channel = await tournament.announcements_channel
+            await channel.fetch()
+            self.rest.send(CRITICAL, lambda: channel.discord.send(strings.tournament_start))
+        await self.start_tournament_round(tournament)
+        if ctx is not None:
+            await ctx.send(f"{tournament.name} has started; {len(dropped)} participants didn't check in.")
+        return dropped
+
+    @async_using_db
+    def _get_unchecked_participants(self, tournament):
+        """Challonge IDs of the participants who didn't check in, by user ID"""
+        if tournament.doubles:
+            # teams check in on Challonge, which removes those who didn't in process_check_ins
+            return {}
+        if tournament.checkin_message_id is None:
+            # there was no check-in, so nobody could check in
+            return {}
+        participants = {user_id: (checked_in, challonge_id) for user_id, checked_in, challonge_id
+                        in Participant.objects.filter(tournament=tournament)
+                        .values_list('member__user_id', 'checked_in', 'challonge_id')}
+        checked_in = {user_id for user_id, (_checked_in, _) in participants.items() if _checked_in}
+        return {user_id: participants[user_id][1] for user_id in participants.keys() - checked_in}
+
+    @async_using_db
+    def _delete_participants(self, tournament, user_ids):
+        Participant.objects.filter(tournament=tournament, member__user_id__in=user_ids).delete()
+
+    @async_using_db
+    def _snapshot_starting_ratings(self, tournament):
+        """Save every participant's current ratings as their starting ratings"""
+        if tournament.doubles:
+            # also links every Team to its participant team, which matches and the final ranking rely on
+            participant_teams = list(ParticipantTeam.objects.filter(tournament=tournament)
+                                     .select_related('member_1', 'member_2'))
+            teams = self._get_teams(tournament, participant_teams)
+            ParticipantTeam.objects.bulk_update([
+                ParticipantTeam(pk=pk, starting_elo=team.rating, starting_guild_elo=guild_team.rating)
+                for pk, (team, guild_team) in teams.items()
+            ], ['starting_elo', 'starting_guild_elo'], batch_size=500)
+            return
+        default_rating = Player._meta.get_field('rating').default
+        participants = (Participant.objects.filter(tournament=tournament)
+                        .values_list('pk', 'member__user__player__rating', 'member__guildplayer__rating'))
+        Participant.objects.bulk_update([
+            Participant(pk=pk, starting_elo=rating if rating is not None else default_rating,
+                        starting_guild_elo=guild_rating if guild_rating is not None else default_rating)
+            for pk, rating, guild_rating in participants
+        ], ['starting_elo', 'starting_guild_elo'], batch_size=500)
 
     async def send_checkin_message(self, *args, **kwargs):
         # TODO
         pass
 
-    async def checkin(self, *args, **kwargs):
-        # TODO
-        pass
+    async def checkin(self, tournament: ssbu_models.Tournament, member: models.Member, checked_in=True):
+        """Check a participant in (or out again) right away; Challonge is updated in the background
+
+        Returns False if the member isn't signed up for the tournament.
+        """
+        if not await self._set_checked_in(tournament, member, checked_in):
+            return False
+        self.participant_sync.request_flush(tournament.id)
+        return True
+
+    @async_using_db
+    def _set_checked_in(self, tournament, member, checked_in):
+        participants = Participant.objects.filter(pk=member.pk, tournament=tournament, signed_out=False)
+        if not participants.exists():
+            return False
+        participants.exclude(checked_in=checked_in).update(checked_in=checked_in, checkin_synced=False)
+        return True
 
     async def checkin_team_member(self, *args, **kwargs):
         # TODO
@@ -418,6 +870,8 @@ class SsbuController(hero.Controller):
         channel = channel or ctx.channel
         # TODO
 
+    @traced('strike', match_attributes)
+    @locked(match_key)
     async def strike_stage(self, match: Match, stage: Stage, striked_by: models.User):
         # check if the stage can be striked by the person attempting to do so
         # return True if so (and striking succeeded), otherwise return False
@@ -496,7 +950,7 @@ class SsbuController(hero.Controller):
             guild = await match.guild
             await guild.fetch()
             next_to_strike = await guild.fetch_member(next_to_strike)
-            await self._update_striking_message(match, next_to_strike)
+            self.request_striking_message_update(match, channel, next_to_strike)
         return True
 
     @async_using_db
@@ -504,8 +958,19 @@ class SsbuController(hero.Controller):
         striked_stages = game.striked_stages
         striked_stages.append(stage)
         game.striked_stages = striked_stages
-        game.save()
+        game.save(update_fields=['striked_stages'])
 
+    @async_using_db
+    def _update_game_if(self, game, condition: dict, **values):
+        """UPDATE the (doubles) game only WHERE ``condition`` still holds; returns whether it did"""
+        updated = type(game).objects.filter(pk=game.pk, **condition).update(**values) == 1
+        if updated:
+            for field, value in values.items():
+                setattr(game, field, value)
+        return updated
+
+    @traced('pick', match_attributes)
+    @locked(match_key)
     async def pick_stage(self, match, stage, picked_by):
         # check if the stage can be picked by the person attempting to do so
         # return True if so (and striking succeeded), otherwise
@@ -540,23 +1005,87 @@ class SsbuController(hero.Controller):
             else:
                 return await self.suggest_stage(match, stage, picked_by)
         elif len(game.striked_stages) != ruleset.counterpick_bans:
-            print("not enough bans")
             return await self.suggest_stage(match, stage, picked_by)
         elif first_to_strike.id == picked_by.id:
-            print("you were the first to strike")
             return await self.suggest_stage(match, stage, picked_by)
         else:
             # if stage disallowed due to DSR, stage cannot be picked but can be gentlemen'd on
             dsr_stages = await ruleset.dsr.get_dsr_stages(match)
             if stage in dsr_stages:
-                print(f"stage {stage} in dsr_stages: {dsr_stages}")
                 return await self.suggest_stage(match, stage, picked_by, dsr_banned=True)
 
-        game.picked_stage = stage.id
-        await game.async_save()
+        if not await self._update_game_if(game, {'picked_stage': None}, picked_stage=stage.id):
+            return False
         await self.game_ready(match, game)
         return True
 
+    async def request_confirmation(self, msg: discord.Message, user: models.User, action: str, timeout=None,
+                                   **kwargs):
+        """Ask a user to confirm something by reacting to a message
+
+        Nothing waits for the reaction; the prompt is stored and
+        resolved by :meth:`resolve_confirmation` when the user reacts,
+        or as declined by :meth:`expire_confirmation` when it times out.
+        Either way, the action's handler in ``confirmation_handlers`` is
+        called with the prompt and whether it was confirmed. Additional
+        keyword arguments are stored with the prompt for the handler.
+        """
+        message = await self.db.wrap_message(msg)
+        expires_at = datetime.datetime.now() + (timeout or self.CONFIRMATION_TIMEOUT)
+        await PendingConfirmation.objects.async_create(message=message, user=user, action=action,
+                                                       expires_at=expires_at, **kwargs)
+        self.rest.add_reactions(msg, self.ACCEPT_REACTION, self.DECLINE_REACTION, priority=CRITICAL)
+        scheduler = self.core.get_controller('scheduler')
+        await scheduler.schedule(self.expire_confirmation, expires_at, message_id=msg.id)
+
+    @async_using_db
+    def _claim_confirmation(self, message_id, user_id=None):
+        """Remove a pending confirmation so only one reaction (or the expiry) resolves it
+
+        Returns the pending confirmation, or None if it was already
+        resolved or belongs to another user, and whether the message is
+        a confirmation prompt at all.
+        """
+        try:
+            pending = PendingConfirmation.objects.get(pk=message_id)
+        except PendingConfirmation.DoesNotExist:
+            return None, False
+        if user_id is not None and pending.user_id != user_id:
+            return None, True
+        deleted, _ = PendingConfirmation.objects.filter(pk=message_id).delete()
+        return (pending if deleted else None), True
+
+    async def resolve_confirmation(self, message_id, user_id, confirmed: bool):
+        """Resolve a pending confirmation; returns whether the message is a confirmation prompt"""
+        pending, is_prompt = await self._claim_confirmation(message_id, user_id)
+        if pending is not None:
+            await self.confirmation_handlers[pending.action](pending, confirmed)
+        return is_prompt
+
+    @schedulable
+    async def expire_confirmation(self, message_id: int):
+        try:
+            pending = await PendingConfirmation.objects.async_get(pk=message_id)
+        except PendingConfirmation.DoesNotExist:
+            return
+        if pending.match_id is not None:
+            match = await pending.match
+            if not self.owns_guild(match.guild_id):
+                await self.hand_off(match.guild_id, 'expire_confirmation', message_id=message_id)
+                return
+        pending, _ = await self._claim_confirmation(message_id)
+        if pending is not None:
+            await self.confirmation_handlers[pending.action](pending, False)
+
+    async def _delete_confirmation_message(self, pending):
+        message = await pending.message
+        try:
+            _message = await message.fetch()
+            await _message.delete()
+        except (discord.Forbidden, discord.NotFound):
+            pass
+
+    @locked(match_key)
     async def suggest_stage(self, match, stage, suggested_by, dsr_banned=False):
         # stage is guaranteed to be a valid choice
         game = await Game.objects.async_get(match=match, number=match.current_game)
@@ -588,22 +1117,30 @@ class SsbuController(hero.Controller):
         msg = await channel.send(f"{_dsr_banned}{suggested_by.mention} is suggesting {stage}.\n\n"
                                  f"{other_player.mention}, do you want to accept {suggested_by.mention}'s "
                                  f"suggestion, skip stage striking and play this game on {stage}?")
-        accept_suggestion = await self.core.wait_for_confirmation(msg, other_player, force_response=False)
-        await msg.delete()
-        if accept_suggestion:
-            await self.accept_stage_suggestion(match, game, stage, suggested_by)
+        await self.request_confirmation(msg, other_player, 'stage_suggestion', match=match, game=game,
+                                        argument=stage.id)
         return True
 
-    async def accept_stage_suggestion(self, match, game, stage, suggested_by):
-        await game.async_load()
-        if game.picked_stage is not None:  # prevent "race condition"
+    async def _on_stage_suggestion_confirmation(self, pending, confirmed):
+        await self._delete_confirmation_message(pending)
+        if not confirmed:
+            return
+        match = await pending.match
+        if match.ended_at is not None:
             return
+        game = await pending.game
+        player_1 = await match.player_1
+        player_2 = await match.player_2
+        suggested_by = player_2 if player_1.id == pending.user_id else player_1
+        await self.accept_stage_suggestion(match, game, Stage(pending.argument), suggested_by)
 
-        game.suggested_stage = stage.id
-        game.suggested_by = suggested_by
-        game.suggestion_accepted = True
-        game.picked_stage = stage.id
-        await game.async_save()
+    @locked(match_key)
+    async def accept_stage_suggestion(self, match, game, stage, suggested_by):
+        # the stage might have been picked in the meantime
+        if not await self._update_game_if(game, {'picked_stage': None}, suggested_stage=stage.id,
+                                          suggested_by_id=suggested_by.id, suggestion_accepted=True,
+                                          picked_stage=stage.id):
+            return
         await self.game_ready(match, game)
 
     async def game_ready(self, match, game):
@@ -634,26 +1171,61 @@ class SsbuController(hero.Controller):
         else:
             return ruleset.starter_stages + ruleset.counterpick_stages
 
-    async def get_formatted_stage_list(self, game):
-        match = await game.match
-        _stages = await self.get_stages(match)
-        ruleset = await match.ruleset
+    def get_stage_lines(self, ruleset, first_game):
+        """(stage, line, striked line) for every stage of the ruleset
+
+        Rulesets are never edited in place (a new version is created
+        instead), so the lines can be cached for the ruleset's lifetime.
+        """
+        key = (ruleset.id, first_game)
+        if key in self.cached_stage_lines:
+            return self.cached_stage_lines[key]
+        if first_game:
+            stages = ruleset.starter_stages
+        else:
+            stages = ruleset.starter_stages + ruleset.counterpick_stages
+        lines = tuple(
+            (stage, f"**{self.NUMBER_EMOJIS[number]} {stage}**", f"~~{self.NUMBER_EMOJIS[number]} {stage}~~")
+            for number, stage in enumerate(stages, 1)
+        )
+        if ruleset.id is not None:
+            self.cached_stage_lines[key] = lines
+        return lines
+
+    async def get_formatted_stage_list(self, game, match=None, ruleset=None):
+        if match is None:
+            match = await game.match
+        if ruleset is None:
+            ruleset = await match.ruleset
         dsr_stages = await ruleset.dsr.get_dsr_stages(match)
-        stages = []
-        for number, stage in enumerate(_stages, 1):
-            stages.append(f"**{self.NUMBER_EMOJIS[number]} {stage}**"
-                          if not game.is_striked(stage) and stage not in dsr_stages
-                          else f"~~{self.NUMBER_EMOJIS[number]} {stage}~~")
-        return '\n'.join(stages)
+        return '\n'.join(
+            striked_line if game.is_striked(stage) or stage in dsr_stages else line
+            for stage, line, striked_line in self.get_stage_lines(ruleset, match.current_game == 1)
+        )
+
+    def note_channel_message(self, message: discord.Message):
+        self.last_message_ids[message.channel.id] = message.id
+
+    def request_striking_message_update(self, match, channel, next_to_strike: discord.Member):
+        """Queue an update of the striking message
+
+        Strikes that come in within a short time of each other are
+        merged into a single edit of the striking message.
+        """
+        self.striking_message_queue.request(channel.id, match, next_to_strike)
 
     async def _update_striking_message(self, match, next_to_strike: discord.Member):
         """resend or edit the updated striking message"""
+        await match.async_load()
         game = await Game.objects.async_get(match=match, number=match.current_game)
+        if game.picked_stage is not None:
+            # a stage got picked while this update was queued
+            return
         ruleset = await match.ruleset
         channel = await match.channel
         await channel.fetch()
 
-        stages = await self.get_formatted_stage_list(game)
+        stages = await self.get_formatted_stage_list(game, match=match, ruleset=ruleset)
         if (
             (game.number == 1 and len(game.striked_stages) == 3)
             or (game.number > 1 and len(game.striked_stages) == ruleset.counterpick_bans)
@@ -679,40 +1251,807 @@ class SsbuController(hero.Controller):
 
         striking_message = await game.striking_message
         if striking_message is not None:
+            last_message_id = self.last_message_ids.get(channel.id)
+            if last_message_id is None:
+                # no message seen in this channel since startup
+                async for last_message in channel.history(limit=1):
+                    last_message_id = last_message.id
             await striking_message.fetch()
-            async for last_message in channel.history(limit=1):
-                if striking_message.id == last_message.id:
-                    await striking_message.edit(content=new_content)
-                    return striking_message
-                else:
-                    await striking_message.discord.delete()
-                    await striking_message.async_delete()
+            if striking_message.id == last_message_id:
+                await self.rest.edit(striking_message, content=new_content)
+                return striking_message
+            else:
+                await striking_message.discord.delete()
+                await striking_message.async_delete()
 
         new_msg = await channel.send(new_content)
+        self.note_channel_message(new_msg)
         new_msg = await self.db.wrap_message(new_msg)
         game.striking_message = new_msg
-        await game.async_save()
+        # strikes may have been saved since the game was read, so only the message is written
+        await self._save_striking_message(game)
         return
 
-    async def send_tournament_match_intro(self, *args, **kwargs):
-        # TODO
-        pass
+    @async_using_db
+    def _save_striking_message(self, game):
+        game.save(update_fields=['striking_message'])
 
-    async def start_tournament_match(self, *args, **kwargs):
-        # TODO
-        pass
+    @staticmethod
+    def get_match_title(tournament_type, challonge_matches, challonge_match):
+        if tournament_type not in (
+            challonge.TournamentType.double_elimination.value,
+            challonge.TournamentType.single_elimination.value
+        ):
+            return "Match"
+        max_round = max(challonge_matches, key=lambda m: m.round).round
+        min_round = min(challonge_matches, key=lambda m: m.round).round
+        if tournament_type == challonge.TournamentType.double_elimination.value:
+            if 0 < max_round - 3 == challonge_match.round:
+                return "Winners Quarterfinals"
+            if 0 < max_round - 2 == challonge_match.round:
+                return "Winners Semifinals"
+            if 0 < max_round - 1 == challonge_match.round:
+                return "Winners Finals"
+            if 0 > min_round + 2 == challonge_match.round:
+                return "Losers Quarterfinals"
+            if 0 > min_round + 1 == challonge_match.round:
+                return "Losers Semifinals"
+            if 0 > min_round == challonge_match.round:
+                return "Losers Finals"
+            if 0 < max_round == challonge_match.round:
+                return "Grand Finals"
+            if challonge_match.round < 0:
+                return f"Losers Round {abs(challonge_match.round)}"
+        else:
+            if 0 < max_round - 2 == challonge_match.round:
+                return "Quarterfinals"
+            if 0 < max_round - 1 == challonge_match.round:
+                return "Semifinals"
+            if 0 < max_round == challonge_match.round:
+                return "Finals"
+        return f"Round {challonge_match.round}"
+
+    @traced('round_start', tournament_attributes)
+    async def start_tournament_round(self, tournament: ssbu_models.Tournament):
+        """Start all open matches of the tournament's bracket that haven't been started yet
+
+        The bracket is kept locally, so nothing has to be fetched from
+        Challonge. Matches are saved in bulk; channels are set up and
+        intros are sent for up to ``ROUND_START_CONCURRENCY`` matches at
+        once, so a whole round opens together instead of one match
+        after the other.
+        """
+        if not await self.brackets.exists(tournament):
+            challonge_tournament = await self.get_challonge_tournament(tournament.id)
+            await self.create_bracket(tournament, challonge_tournament)
+        # from now on, the watcher notices changes that organizers make on Challonge
+        self.challonge_watcher.watch(tournament.id)
+        return await self._start_open_matches(tournament)
+
+    async def _start_open_matches(self, tournament):
+        # a round start and results that come in at the same time must not start the same match twice
+        async with self.locks.hold(('tournament_round', tournament.id)):
+            open_matches = await self._get_unstarted_matches(tournament)
+            if not open_matches:
+                return []
+            bracket_matches = await self.brackets.get_matches(tournament)
+            if tournament.doubles:
+                return await self._start_doubles_matches(tournament, bracket_matches, open_matches)
+            return await self._start_matches(tournament, bracket_matches, open_matches)
+
+    async def on_challonge_events(self, tournament_id, challonge_tournament: challonge.Tournament, events):
+        """Act on what the Challonge watcher saw change in a tournament
+
+        Matches are opened by the local bracket, so opened matches
+        don't need to be acted on here. Matches that an organizer
+        reopened are played again if the bracket hasn't moved on yet;
+        otherwise our result is mirrored to Challonge again.
+        """
+        removed = []
+        reopened = []
+        for event in events:
+            if event.kind == MATCH_COMPLETED:
+                self.cache_match(event.item)
+            elif event.kind == MATCH_REOPENED:
+                self.cache_match(event.item)
+                reopened.append(event.item)
+            elif event.kind == PARTICIPANT_REMOVED:
+                self.cached_participants.pop(event.item, None)
+                removed.append(event.item)
+        if removed:
+            await self._delete_removed_participants(tournament_id, removed)
+        if reopened:
+            tournament = await ssbu_models.Tournament.async_get(pk=tournament_id)
+            for challonge_match in reopened:
+                if await self.brackets.reopen(tournament, challonge_match.id) is None:
+                    log.warning("Match %s of tournament %s was reopened on Challonge, but the bracket has moved on",
+                                challonge_match.id, tournament_id)
+                    await self.brackets.remirror(tournament, challonge_match.id)
+            self.bracket_mirror.request_mirror(tournament_id)
+            await self._start_open_matches(tournament)
+
+    async def resume_tournament_watchers(self):
+        """Watch the tournaments in progress again after a restart"""
+        await self.core.wait_until_ready()
+        for tournament_id, guild_id in await self._get_started_tournaments():
+            if self.owns_guild(guild_id):
+                self.challonge_watcher.watch(tournament_id)
 
-    async def start_tournament_doubles_match(self, *args, **kwargs):
-        # TODO
-        pass
+    @async_using_db
+    def _get_started_tournaments(self):
+        # a tournament has a bracket from the moment it starts
+        return list(ssbu_models.Tournament.objects.filter(ended=False, bracketmatch__isnull=False).distinct()
+                    .values_list('pk', 'guild_id'))
 
-    async def end_tournament_match(self, *args, **kwargs):
-        # TODO
-        pass
+    @async_using_db
+    def _delete_removed_participants(self, tournament_id, challonge_ids):
+        # removed by an organizer on Challonge
+        model = ParticipantTeam if ssbu_models.Tournament.objects.get(pk=tournament_id).doubles else Participant
+        model.objects.filter(tournament_id=tournament_id, challonge_id__in=challonge_ids).delete()
 
-    async def end_tournament(self, *args, **kwargs):
-        # TODO
-        pass
+    @async_using_db
+    def _get_unstarted_matches(self, tournament):
+        open_matches = BracketMatch.objects.filter(tournament=tournament, state=BracketMatch.OPEN)
+        if tournament.doubles:
+            open_matches = open_matches.filter(doublesmatch=None)
+        else:
+            open_matches = open_matches.filter(match=None)
+        return list(open_matches.order_by('number'))
+
+    async def _gather_limited(self, coros, return_exceptions=False):
+        semaphore = asyncio.Semaphore(self.ROUND_START_CONCURRENCY)
+
+        async def run(coro):
+            async with semaphore:
+                return await coro
+
+        return await asyncio.gather(*[run(coro) for coro in coros], return_exceptions=return_exceptions)
+
+    async def _open_round_channels(self, guild, pairings, open_channel, get_members):
+        """Open the channels of a round's matches; if any fails, the others are released again"""
+        channels = await self._gather_limited([open_channel(pairing) for pairing in pairings],
+                                              return_exceptions=True)
+        errors = [channel for channel in channels if isinstance(channel, BaseException)]
+        if errors:
+            await self._release_match_setup(guild, [
+                (channel, get_members(pairing)) for pairing, channel in zip(pairings, channels)
+                if not isinstance(channel, BaseException)
+            ])
+            raise errors[0]
+        return channels
+
+    async def _release_match_setup(self, guild, opened):
+        """Give back the (channel, members) of matches that couldn't be started
+
+        Channels go back to the pool (or are deleted) and the members
+        lose the in-game role again.
+        """
+        for channel, _ in opened:
+            if await self.channel_pool.release(None, channel, guild):
+                continue
+            try:
+                await channel.fetch()
+            except (discord.Forbidden, discord.NotFound):
+                pass
+            else:
+                try:
+                    await channel.discord.delete()
+                except discord.Forbidden:
+                    pass
+            await channel.async_delete()
+        guild_setup = await GuildSetup.objects.async_get(guild=guild)
+        ingame_role = await guild_setup.ingame_role
+        await asyncio.gather(*[self.rest.remove_roles(member, ingame_role)
+                               for _, members in opened for member in members], return_exceptions=True)
+
+    async def _start_matches(self, tournament, bracket_matches, open_matches):
+        guild = await tournament.guild
+        await guild.fetch()
+        participants = await self._get_participants(tournament, open_matches)
+        # (bracket match, participant 1, participant 2, member 1, member 2)
+        pairings = []
+        for bracket_match in open_matches:
+            participant_1, member_1 = participants.get(bracket_match.entrant_1, (None, None))
+            participant_2, member_2 = participants.get(bracket_match.entrant_2, (None, None))
+            # participants who have been removed in the meantime have to be handled by the organizers
+            if participant_1 is not None and participant_2 is not None:
+                pairings.append((bracket_match, participant_1, participant_2, member_1, member_2))
+        if not pairings:
+            return []
+
+        async def open_channel(pairing):
+            _, _, _, member_1, member_2 = pairing
+            await asyncio.gather(member_1.fetch(), member_2.fetch())
+            text_channel, _ = await self._open_match_channel(
+                guild, (member_1, member_2), f"{member_1.name}_vs_{member_2.name}",
+                f"{member_1.name} vs {member_2.name}", f"{member_1.display_name} and {member_2.display_name}",
+                create_vc=False
+            )
+            text_channel = await self.db.wrap_text_channel(text_channel)
+            try:
+                await self.set_as_ingame(member_1, member_2)
+            except Exception:
+                await self._release_match_setup(guild, [(text_channel, (member_1, member_2))])
+                raise
+            return text_channel
+
+        channels = await self._open_round_channels(guild, pairings, open_channel,
+                                                   lambda pairing: (pairing[3], pairing[4]))
+        try:
+            matches = await self._save_tournament_matches(tournament, pairings, channels)
+        except Exception:
+            await self._release_match_setup(guild, [(channel, (pairing[3], pairing[4]))
+                                                    for pairing, channel in zip(pairings, channels)])
+            raise
+
+        async def intro(match, pairing, channel):
+            bracket_match, _, _, member_1, member_2 = pairing
+            match_title = self.get_match_title(tournament.format.value, bracket_matches, bracket_match)
+            return await self.send_tournament_match_intro(match, match_title, channel, member_1, member_2)
+
+        management_messages = await self._gather_limited([intro(match, pairing, channel) for match, pairing, channel
+                                                          in zip(matches, pairings, channels)])
+        for match, management_message in zip(matches, management_messages):
+            match.management_message = management_message
+        await self._save_management_messages(matches)
+        return matches
+
+    @async_using_db
+    def _get_participants(self, tournament, bracket_matches):
+        entrants = {entrant for bracket_match in bracket_matches
+                    for entrant in (bracket_match.entrant_1, bracket_match.entrant_2)}
+        participants = Participant.objects.filter(tournament=tournament, pk__in=entrants, signed_out=False)
+        return {participant.pk: (participant, participant.member)
+                for participant in participants.select_related('member')}
+
+    @async_using_db
+    def _save_tournament_matches(self, tournament, pairings, channels):
+        matches = []
+        for (bracket_match, _, _, member_1, member_2), channel in zip(pairings, channels):
+            matches.append(Match(
+                channel=channel, guild_id=tournament.guild_id, tournament=tournament, ranked=tournament.ranked,
+                in_dms=False, player_1_id=member_1.user_id, player_2_id=member_2.user_id,
+                wins_required=self.TOURNAMENT_WINS_REQUIRED, ruleset_id=tournament.ruleset_id,
+                bracket_match=bracket_match, challonge_id=bracket_match.challonge_id
+            ))
+        if tournament.ranked:
+            self._snapshot_ratings(tournament, matches, pairings)
+
+        with transaction.atomic():
+            matches = Match.objects.bulk_create(matches)
+            Game.objects.bulk_create([
+                Game(match=match, number=1, guild_id=match.guild_id,
+                     first_to_strike_id=random.choice((match.player_1_id, match.player_2_id)))
+                for match in matches
+            ])
+            participants = []
+            for match, (_, participant_1, participant_2, _, _) in zip(matches, pairings):
+                participant_1.current_match = match
+                participant_2.current_match = match
+                participants += [participant_1, participant_2]
+            Participant.objects.bulk_update(participants, ['current_match'])
+        return matches
+
+    def _snapshot_ratings(self, tournament, matches, pairings):
+        members = [member for _, _, _, member_1, member_2 in pairings for member in (member_1, member_2)]
+        guild_players = {guild_player.member_id: guild_player
+                         for guild_player in GuildPlayer.objects.filter(member__in=members)}
+        new_guild_players = [GuildPlayer(member=member) for member in members if member.pk not in guild_players]
+        GuildPlayer.objects.bulk_create(new_guild_players, ignore_conflicts=True)
+        guild_players.update({guild_player.member_id: guild_player for guild_player in new_guild_players})
+
+        verified = GuildSetup.objects.filter(guild_id=tournament.guild_id, verified=True).exists()
+        global_players = {}
+        if verified:
+            user_ids = [member.user_id for member in members]
+            global_players = {player.user_id: player for player in Player.objects.filter(user_id__in=user_ids)}
+            new_players = [Player(user_id=user_id) for user_id in user_ids if user_id not in global_players]
+            Player.objects.bulk_create(new_players, ignore_conflicts=True)
+            global_players.update({player.user_id: player for player in new_players})
+
+        for match, (_, _, _, member_1, member_2) in zip(matches, pairings):
+            for number, member in ((1, member_1), (2, member_2)):
+                guild_player = guild_players[member.pk]
+                setattr(match, f'player_{number}_rating', guild_player.rating)
+                setattr(match, f'player_{number}_deviation', guild_player.deviation)
+                setattr(match, f'player_{number}_volatility', guild_player.volatility)
+                if verified:
+                    global_player = global_players[member.user_id]
+                    setattr(match, f'player_{number}_global_rating', global_player.rating)
+                    setattr(match, f'player_{number}_global_deviation', global_player.deviation)
+                    setattr(match, f'player_{number}_global_volatility', global_player.volatility)
+
+    @async_using_db
+    def _save_management_messages(self, matches):
+        Match.objects.bulk_update(matches, ['management_message'])
+
+    async def send_tournament_match_intro(self, match, match_title, channel, member_1, member_2):
+        """Send the management message, intro and blindpick instructions; return the management message"""
+        management_message = await self._send_match_management_message(channel.discord, member_1, member_2,
+                                                                       ranked=True)
+        management_message = await self.db.wrap_message(management_message)
+        player_1 = await match.player_1
+        player_2 = await match.player_2
+        blindpicking_txt = await self.start_blindpicking(match, channel, player_1, player_2)
+        best_of = match.wins_required * 2 - 1
+        intro = strings.match_intro.format(match_title=match_title, player_1=member_1, player_2=member_2,
+                                           best_of_number=best_of)
+        await channel.discord.send(f"{intro}\n{blindpicking_txt}")
+        return management_message
+
+    async def _start_doubles_matches(self, tournament, bracket_matches, open_matches):
+        guild = await tournament.guild
+        await guild.fetch()
+        teams = await self._get_participant_teams(tournament, open_matches)
+        # (bracket match, team 1, team 2, members of team 1 and 2)
+        pairings = []
+        for bracket_match in open_matches:
+            team_1, members_1 = teams.get(bracket_match.entrant_1, (None, None))
+            team_2, members_2 = teams.get(bracket_match.entrant_2, (None, None))
+            if team_1 is not None and team_2 is not None:
+                pairings.append((bracket_match, team_1, team_2, members_1 + members_2))
+        if not pairings:
+            return []
+
+        async def open_channel(pairing):
+            members = pairing[3]
+            await asyncio.gather(*[member.fetch() for member in members])
+            team_1_name = f"{members[0].name}_{members[1].name}"
+            team_2_name = f"{members[2].name}_{members[3].name}"
+            text_channel, _ = await self._open_match_channel(
+                guild, members, f"{team_1_name}_vs_{team_2_name}", f"{team_1_name} vs {team_2_name}",
+                ', '.join(member.display_name for member in members), create_vc=False
+            )
+            text_channel = await self.db.wrap_text_channel(text_channel)
+            try:
+                await self.set_as_ingame(*members)
+            except Exception:
+                await self._release_match_setup(guild, [(text_channel, members)])
+                raise
+            return text_channel
+
+        channels = await self._open_round_channels(guild, pairings, open_channel, lambda pairing: pairing[3])
+        try:
+            matches = await self._save_tournament_doubles_matches(tournament, pairings, channels)
+        except Exception:
+            await self._release_match_setup(guild, [(channel, pairing[3])
+                                                    for pairing, channel in zip(pairings, channels)])
+            raise
+
+        async def intro(match, pairing, channel):
+            bracket_match, _, _, members = pairing
+            match_title = self.get_match_title(tournament.format.value, bracket_matches, bracket_match)
+            best_of = match.wins_required * 2 - 1
+            await channel.discord.send(
+                f"{match_title} between {members[0].mention} & {members[1].mention} and "
+                f"{members[2].mention} & {members[3].mention} (Best of {best_of})\n"
+                f"\n"
+                f"I have determined randomly which team will start striking stages."
+            )
+
+        await self._gather_limited([intro(match, pairing, channel) for match, pairing, channel
+                                    in zip(matches, pairings, channels)])
+        return matches
+
+    @async_using_db
+    def _get_participant_teams(self, tournament, bracket_matches):
+        entrants = {entrant for bracket_match in bracket_matches
+                    for entrant in (bracket_match.entrant_1, bracket_match.entrant_2)}
+        teams = ParticipantTeam.objects.filter(tournament=tournament, pk__in=entrants)
+        return {team.pk: (team, (team.member_1, team.member_2))
+                for team in teams.select_related('member_1', 'member_2')}
+
+    @async_using_db
+    def _save_tournament_doubles_matches(self, tournament, pairings, channels):
+        matches = [
+            DoublesMatch(channel=channel, guild_id=tournament.guild_id, tournament=tournament, in_dms=False,
+                         team_1=team_1, team_2=team_2, wins_required=self.TOURNAMENT_WINS_REQUIRED,
+                         bracket_match=bracket_match, challonge_id=bracket_match.challonge_id)
+            for (bracket_match, team_1, team_2, _), channel in zip(pairings, channels)
+        ]
+        if tournament.ranked:
+            self._snapshot_team_ratings(tournament, matches, pairings)
+
+        with transaction.atomic():
+            matches = DoublesMatch.objects.bulk_create(matches)
+            DoublesGame.objects.bulk_create([
+                DoublesGame(match=match, number=1, guild_id=match.guild_id,
+                            first_to_strike_id=random.choice((match.team_1_id, match.team_2_id)))
+                for match in matches
+            ])
+            teams = []
+            for match, (_, team_1, team_2, _) in zip(matches, pairings):
+                team_1.current_match = match
+                team_2.current_match = match
+                teams += [team_1, team_2]
+            ParticipantTeam.objects.bulk_update(teams, ['current_match'])
+        return matches
+
+    def _snapshot_team_ratings(self, tournament, matches, pairings):
+        teams = self._get_teams(tournament, [team for _, team_1, team_2, _ in pairings for team in (team_1, team_2)])
+        for match, (_, team_1, team_2, _) in zip(matches, pairings):
+            for number, participant_team in ((1, team_1), (2, team_2)):
+                team, guild_team = teams[participant_team.pk]
+                setattr(match, f'team_{number}_rating', guild_team.rating)
+                setattr(match, f'team_{number}_deviation', guild_team.deviation)
+                setattr(match, f'team_{number}_volatility', guild_team.volatility)
+                setattr(match, f'team_{number}_global_rating', team.rating)
+                setattr(match, f'team_{number}_global_deviation', team.deviation)
+                setattr(match, f'team_{number}_global_volatility', team.volatility)
+
+    def _get_teams(self, tournament, participant_teams):
+        """Team and GuildTeam of each participant team, by participant team ID
+
+        A team is identified by the pair of its members' user IDs, lower
+        one first. Teams that are new start with the composite of their
+        members' ratings. Everything is loaded and created in bulk.
+        """
+        pairs = {participant_team.pk: tuple(sorted((participant_team.member_1.user_id,
+                                                    participant_team.member_2.user_id)))
+                 for participant_team in participant_teams}
+        user_ids = {user_id for pair in pairs.values() for user_id in pair}
+
+        def load_teams():
+            candidates = Team.objects.filter(member_1_id__in=user_ids, member_2_id__in=user_ids)
+            return {(team.member_1_id, team.member_2_id): team for team in candidates}
+
+        teams = load_teams()
+        new_pairs = set(pairs.values()) - teams.keys()
+        if new_pairs:
+            players = {player.user_id: player for player in Player.objects.filter(user_id__in=user_ids)}
+            new_players = [Player(user_id=user_id) for user_id in user_ids if user_id not in players]
+            Player.objects.bulk_create(new_players, ignore_conflicts=True)
+            players.update({player.user_id: player for player in new_players})
+            new_teams = []
+            for user_id_1, user_id_2 in new_pairs:
+                rating = self.glicko.composite_rating(*[
+                    self.glicko.create_rating(player.rating, player.deviation, player.volatility)
+                    for player in (players[user_id_1], players[user_id_2])
+                ])
+                new_teams.append(Team(member_1_id=user_id_1, member_2_id=user_id_2, rating=round(rating['mu']),
+                                      deviation=round(rating['phi']), volatility=round(rating['sigma'], 3)))
+            Team.objects.bulk_create(new_teams, ignore_conflicts=True)
+            teams = load_teams()
+
+        def load_guild_teams():
+            return {guild_team.team_id: guild_team for guild_team
+                    in GuildTeam.objects.filter(guild_id=tournament.guild_id, team__in=teams.values())}
+
+        guild_teams = load_guild_teams()
+        new_team_ids = {team.pk for team in teams.values()} - guild_teams.keys()
+        if new_team_ids:
+            member_ids = {participant_team.pk: (participant_team.member_1_id, participant_team.member_2_id)
+                          for participant_team in participant_teams}
+            guild_players = {guild_player.member_id: guild_player for guild_player in GuildPlayer.objects.filter(
+                member_id__in=[member_id for members in member_ids.values() for member_id in members]
+            )}
+            default = GuildPlayer()
+            new_guild_teams = {}
+            for participant_team_id, pair in pairs.items():
+                team = teams[pair]
+                if team.pk not in new_team_ids or team.pk in new_guild_teams:
+                    continue
+                rating = self.glicko.composite_rating(*[
+                    self.glicko.create_rating(guild_player.rating, guild_player.deviation, guild_player.volatility)
+                    for guild_player in (guild_players.get(member_id, default)
+                                         for member_id in member_ids[participant_team_id])
+                ])
+                new_guild_teams[team.pk] = GuildTeam(team=team, guild_id=tournament.guild_id,
+                                                     rating=round(rating['mu']), deviation=round(rating['phi']),
+                                                     volatility=round(rating['sigma'], 3))
+            GuildTeam.objects.bulk_create(new_guild_teams.values(), ignore_conflicts=True)
+            guild_teams = load_guild_teams()
+
+        linked = []
+        for participant_team in participant_teams:
+            team = teams[pairs[participant_team.pk]]
+            if team.current_participant_team_id != participant_team.pk:
+                team.current_participant_team = participant_team
+                team.current_tournament = tournament
+                linked.append(team)
+        Team.objects.bulk_update(linked, ['current_participant_team', 'current_tournament'])
+        return {participant_team_id: (teams[pair], guild_teams[teams[pair].pk])
+                for participant_team_id, pair in pairs.items()}
+
+    @locked(doubles_match_key)
+    async def end_doubles_match(self, match: DoublesMatch, winner: ParticipantTeam):
+        """Set the winner of a doubles match and rate it
+
+        Returns the guild and global (old rating, new rating) pairs of
+        both teams, or None if the match isn't rated.
+        """
+        return await self._end_doubles_match(match, winner)
+
+    @async_using_db
+    def _end_doubles_match(self, match, winner):
+        with transaction.atomic():
+            match.winner = winner
+            match.save(update_fields=['winner'])
+            ParticipantTeam.objects.filter(pk__in=(match.team_1_id, match.team_2_id)).update(current_match=None)
+            if match.team_1_rating is None:
+                # no ratings were snapshotted, so it's an unranked match
+                return None
+            # always lock in the same order to avoid deadlocks
+            teams = {team.current_participant_team_id: team for team in Team.objects.select_for_update().filter(
+                current_participant_team_id__in=(match.team_1_id, match.team_2_id)
+            ).order_by('pk')}
+            team_1 = teams[match.team_1_id]
+            team_2 = teams[match.team_2_id]
+            guild_teams = {guild_team.team_id: guild_team for guild_team in GuildTeam.objects.select_for_update()
+                           .filter(guild_id=match.guild_id, team__in=(team_1, team_2)).order_by('pk')}
+            guild_team_1 = guild_teams[team_1.pk]
+            guild_team_2 = guild_teams[team_2.pk]
+            global_ratings = self._rate_match(team_1, team_2, match.team_1_score, match.team_2_score, None, None)
+            ratings = self._rate_match(guild_team_1, guild_team_2, match.team_1_score, match.team_2_score, None, None)
+            Team.objects.bulk_update([team_1, team_2], ['rating', 'deviation', 'volatility'])
+            GuildTeam.objects.bulk_update([guild_team_1, guild_team_2], ['rating', 'deviation', 'volatility'])
+        return ratings, global_ratings
+
+    @async_using_db
+    def _get_doubles_teams(self, match):
+        """(participant team, (member 1, member 2)) of both teams of a doubles match, by participant team ID"""
+        teams = ParticipantTeam.objects.filter(pk__in=(match.team_1_id, match.team_2_id))
+        return {team.pk: (team, (team.member_1, team.member_2))
+                for team in teams.select_related('member_1', 'member_2')}
+
+    @staticmethod
+    def _team_mention(members):
+        return f"{members[0].mention} & {members[1].mention}"
+
+    async def process_doubles_victory(self, match: DoublesMatch, user):
+        await self._process_doubles_result(match, user, won=True)
+
+    async def process_doubles_loss(self, match: DoublesMatch, user):
+        await self._process_doubles_result(match, user, won=False)
+
+    @locked(doubles_match_key)
+    async def _process_doubles_result(self, match, user, won):
+        # like in singles, one team reports the game and the other one confirms it
+        game = await DoublesGame.objects.async_get(match=match, number=match.current_game)
+        teams = await self._get_doubles_teams(match)
+        team = next((team for team, members in teams.values()
+                     if user.id in (member.user_id for member in members)), None)
+        if team is None:
+            return
+        other_team, other_members = teams[match.team_2_id if team.pk == match.team_1_id else match.team_1_id]
+        winner = team if won else other_team
+        if game.needs_confirmation_by_id == team.pk and game.winner_id == winner.pk:
+            # only the first confirmation ends the game
+            if await self._update_game_if(game, {'needs_confirmation_by_id': team.pk}, needs_confirmation_by_id=None):
+                await self.end_doubles_game(match, game, winner)
+            return
+        game.winner = winner
+        game.needs_confirmation_by = other_team
+        await game.async_save()
+        channel = await match.channel
+        await channel.fetch()
+        await asyncio.gather(*[member.fetch() for member in other_members])
+        await channel.send(f"{other_members[0].mention} or {other_members[1].mention}, please confirm this game's "
+                           f"result with `/{'lost' if won else 'won'}`.")
+
+    @locked(doubles_match_key)
+    async def end_doubles_game(self, match, game, winner):
+        channel = await match.channel
+        await channel.fetch()
+        teams = await self._get_doubles_teams(match)
+        await asyncio.gather(*[member.fetch() for _, members in teams.values() for member in members])
+        win_count = await self._count_doubles_game_win(match, 1 if winner.pk == match.team_1_id else 2)
+        winner_mention = self._team_mention(teams[winner.pk][1])
+        if win_count == match.wins_required:
+            team_1_mention = self._team_mention(teams[match.team_1_id][1])
+            team_2_mention = self._team_mention(teams[match.team_2_id][1])
+            await channel.send(
+                f"{winner_mention} win game {game.number} and with that, {winner_mention} win the match!\n\n"
+                f"Score: {team_1_mention} **{match.team_1_score} – {match.team_2_score}** {team_2_mention}"
+            )
+            await self.gracefully_end_doubles_match(match, winner)
+            return
+
+        await channel.send(f"{winner_mention} win game {game.number}!")
+        # start the next game in 5 seconds
+        scheduler = self.core.get_controller('scheduler')
+        await scheduler.schedule(self.start_next_doubles_game,
+                                 datetime.datetime.now() + datetime.timedelta(seconds=5),
+                                 match_id=match.id, first_to_strike_id=winner.pk, number=game.number + 1)
+
+    @async_using_db
+    def _count_doubles_game_win(self, match, team_number):
+        """Increment a team's score with a single UPDATE and return the new score"""
+        score_field = f'team_{team_number}_score'
+        DoublesMatch.objects.filter(pk=match.pk).update(**{score_field: models.F(score_field) + 1})
+        match.team_1_score, match.team_2_score = DoublesMatch.objects.values_list(
+            'team_1_score', 'team_2_score'
+        ).get(pk=match.pk)
+        return getattr(match, score_field)
+
+    @schedulable
+    async def start_next_doubles_game(self, match_id: int, first_to_strike_id: int, number: int):
+        async with self.locks.doubles_match(match_id):
+            try:
+                match = await DoublesMatch.objects.async_get(id=match_id)
+            except DoublesMatch.DoesNotExist:
+                return
+            if match.winner_id is not None or match.current_game > number:
+                return
+            if not self.owns_guild(match.guild_id):
+                await self.hand_off(match.guild_id, 'start_next_doubles_game', match_id=match_id,
+                                    first_to_strike_id=first_to_strike_id, number=number)
+                return
+            game = await self._create_next_doubles_game(match, number, first_to_strike_id)
+            await self.doubles_game_intro(match, game)
+
+    @async_using_db
+    def _create_next_doubles_game(self, match, number, first_to_strike_id):
+        """Create a doubles match's game with the given number and make it the current one; safe to repeat"""
+        with transaction.atomic():
+            game, _ = DoublesGame.objects.get_or_create(match=match, number=number,
+                                                        defaults={'guild_id': match.guild_id,
+                                                                  'first_to_strike_id': first_to_strike_id})
+            if match.current_game < number:
+                DoublesMatch.objects.filter(pk=match.pk).update(current_game=number)
+                match.current_game = number
+        return game
+
+    async def doubles_game_intro(self, match, game):
+        channel = await match.channel
+        await channel.fetch()
+        teams = await self._get_doubles_teams(match)
+        await asyncio.gather(*[member.fetch() for _, members in teams.values() for member in members])
+        await channel.send(
+            f"**Game {game.number}** of Match between {self._team_mention(teams[match.team_1_id][1])} and "
+            f"{self._team_mention(teams[match.team_2_id][1])}!\n"
+            f"{self._team_mention(teams[game.first_to_strike_id][1])} start striking stages."
+        )
+
+    @locked(doubles_match_key)
+    async def gracefully_end_doubles_match(self, match, winner):
+        channel = await match.channel
+        await channel.fetch()
+        ratings = await self.end_doubles_match(match, winner)
+        if ratings is not None:
+            teams = await self._get_doubles_teams(match)
+            team_1_mention = self._team_mention(teams[match.team_1_id][1])
+            team_2_mention = self._team_mention(teams[match.team_2_id][1])
+            rating_diff_txt = ""
+            for title, (old_rating_1, new_rating_1, old_rating_2, new_rating_2) in zip(
+                    ("Local Rating changes", "Global Rating changes"), ratings):
+                rating_diff_txt += f"{title}:\n\n"
+                for mention, old_rating, new_rating in ((team_1_mention, old_rating_1, new_rating_1),
+                                                        (team_2_mention, old_rating_2, new_rating_2)):
+                    diff = new_rating['mu'] - old_rating['mu']
+                    sign = '+' if diff > 0 else ''
+                    rating_diff_txt += (f"{mention}: **{new_rating['mu']}**±**{new_rating['phi']}** "
+                                        f"(**{sign}{diff}**)\n")
+                rating_diff_txt += "\n"
+            await channel.send(rating_diff_txt.strip())
+        if match.tournament_id is not None:
+            await self.end_tournament_match(match)
+
+        await channel.send("This channel will be closed in 1 minute. Make sure to continue conversations in DMs!")
+        scheduler = self.core.get_controller('scheduler')
+        await scheduler.schedule(self.close_ended_doubles_match,
+                                 datetime.datetime.now() + datetime.timedelta(minutes=1), match_id=match.id)
+
+    @schedulable
+    async def close_ended_doubles_match(self, match_id: int):
+        async with self.locks.doubles_match(match_id):
+            try:
+                match = await DoublesMatch.objects.async_get(id=match_id)
+            except DoublesMatch.DoesNotExist:
+                return
+            if not self.owns_guild(match.guild_id):
+                await self.hand_off(match.guild_id, 'close_ended_doubles_match', match_id=match_id)
+                return
+            channel = await match.channel
+            if channel is None:  # already closed
+                return
+            guild = await match.guild
+            await guild.fetch()
+            teams = await self._get_doubles_teams(match)
+            members = [member for _, team_members in teams.values() for member in team_members]
+            await asyncio.gather(*[member.fetch() for member in members])
+            # pooled channels are reused, so the match must not point to its channel anymore
+            await self._clear_doubles_match_channel(match)
+            self.striking_message_queue.cancel(channel.id)
+            self.last_message_ids.pop(channel.id, None)
+            await self._release_match_setup(guild, [(channel, members)])
+
+    @async_using_db
+    def _clear_doubles_match_channel(self, match):
+        DoublesMatch.objects.filter(pk=match.pk).update(channel=None)
+
+    async def create_bracket(self, tournament: ssbu_models.Tournament,
+                             challonge_tournament: challonge.Tournament = None):
+        """Create the local bracket of a tournament and return its open matches
+
+        Entrants are seeded like on Challonge, so that Challonge's
+        bracket mirrors ours; entrants without a Challonge seed follow,
+        ordered by guild rating.
+        """
+        seeds = {}
+        if challonge_tournament is not None:
+            participants = await challonge_tournament.get_participants(force_update=True)
+            seeds = {participant.id: participant.seed for participant in participants
+                     if getattr(participant, 'seed', None) is not None}
+        entrants = await self._get_seeded_entrants(tournament, seeds)
+        return await self.brackets.create(tournament, entrants)
+
+    @async_using_db
+    def _get_seeded_entrants(self, tournament, seeds):
+        if tournament.doubles:
+            entrants = ParticipantTeam.objects.filter(tournament=tournament)
+        else:
+            entrants = Participant.objects.filter(tournament=tournament, signed_out=False)
+        entrants = entrants.order_by('-starting_guild_elo').values_list('pk', 'challonge_id')
+        # sorted() is stable, so entrants without a seed keep their order by rating
+        entrants = sorted(entrants, key=lambda entrant: (entrant[1] not in seeds, seeds.get(entrant[1], 0)))
+        return [pk for pk, _ in entrants]
+
+    async def report_bracket_result(self, tournament: ssbu_models.Tournament, number: int, winner: int,
+                                    scores_csv=''):
+        """Advance the local bracket and return the matches that opened up
+
+        The result is reported to Challonge in the background.
+        """
+        opened = await self.brackets.report(tournament, number, winner, scores_csv)
+        self.bracket_mirror.request_mirror(tournament.id)
+        return opened
+
+    async def end_tournament_match(self, match):
+        """Report the result of an ended tournament match to the bracket and start the matches it opened"""
+        result = await self._get_bracket_result(match)
+        if result is None:
+            return []
+        tournament, number, winner, scores_csv = result
+        try:
+            await self.report_bracket_result(tournament, number, winner, scores_csv)
+        except ValueError:
+            # already reported, e.g. by an organizer
+            log.warning("Result of match %s in tournament %s was already reported", number, tournament.id)
+        return await self._start_open_matches(tournament)
+
+    @async_using_db
+    def _get_bracket_result(self, match):
+        """(tournament, bracket match number, winning entrant, scores) of an ended tournament match"""
+        if match.bracket_match_id is None or match.winner_id is None:
+            return None
+        bracket_match = BracketMatch.objects.select_related('tournament').get(pk=match.bracket_match_id)
+        if isinstance(match, DoublesMatch):
+            winner = match.winner_id
+            scores = (match.team_1_score, match.team_2_score)
+            entrant_1 = match.team_1_id
+        else:
+            participants = dict(Participant.objects.filter(
+                tournament=bracket_match.tournament, member__user_id__in=(match.player_1_id, match.player_2_id)
+            ).values_list('member__user_id', 'pk'))
+            winner = participants[match.winner_id]
+            scores = (match.player_1_score, match.player_2_score)
+            entrant_1 = participants[match.player_1_id]
+        # Challonge wants the scores in the order of the bracket match's entrants
+        if entrant_1 != bracket_match.entrant_1:
+            scores = scores[::-1]
+        return bracket_match.tournament, bracket_match.number, winner, f'{scores[0]}-{scores[1]}'
+
+    async def end_tournament(self, tournament: ssbu_models.Tournament):
+        """Finalize a tournament and process its final ranking
+
+        Returns the results and the values that the final ranking hooks
+        added for the announcement.
+        """
+        # Challonge can only be finalized once it has every result
+        await self.bracket_mirror.mirror(tournament.id)
+        challonge_tournament = await self.get_challonge_tournament(tournament.id)
+        try:
+            await challonge_tournament.finalize()
+        except challonge.APIException:
+            pass  # already finalized
+        # includes the participants with their final ranks
+        challonge_tournament = await self.get_challonge_tournament(tournament.id, force_update=True)
+        self.challonge_watcher.unwatch(tournament.id)
+        results, summary = await self.final_ranking.run(tournament, challonge_tournament)
+        tournament.ended = True
+        await tournament.async_save()
+        return results, summary
 
     async def get_ranking(self, *args, **kwargs):
         # TODO
@@ -722,15 +2061,7 @@ class SsbuController(hero.Controller):
     async def get_final_ranking(tournament: challonge.Tournament):
         if tournament.state != challonge.TournamentState.complete.value:
             return None
-        ranking = {}
-        for p in tournament.participants:
-            if p.final_rank is not None:  # and not p.removed:
-                if p.final_rank in ranking:
-                    ranking[p.final_rank].append(p)
-                else:
-                    ranking[p.final_rank] = [p]
-
-        return dict(sorted(ranking.items(), key=lambda t: t[0]))
+        return group_by_rank(tournament.participants)
 
     async def setup_matchmaking(self, channel, name, ruleset, ranked=False):
         guild = channel.discord.guild
@@ -873,20 +2204,20 @@ class SsbuController(hero.Controller):
             else:
                 await original_message.discord.edit(content=content)
                 return original_message
-        await new_msg.add_reaction(self.LOOKING_REACTION)  # mag
-        await new_msg.add_reaction(self.AVAILABLE_REACTION)  # bell
-        await new_msg.add_reaction(self.DND_REACTION)  # no_bell
+        self.rest.add_reactions(new_msg, self.LOOKING_REACTION,  # mag
+                                self.AVAILABLE_REACTION,  # bell
+                                self.DND_REACTION)  # no_bell
         return new_msg
 
     async def get_active_matchmaking_match(self, user):
         # get all unfinished matches that are at least 6 hours old
         six_hours_ago = datetime.datetime.now() - datetime.timedelta(hours=6)
-        matches_qs = (
-            Match.objects.filter(tournament=None, player_1__id=user.id, started_at__lte=six_hours_ago, ended_at=None)
-            | Match.objects.filter(tournament=None, player_2__id=user.id, started_at__lte=six_hours_ago, ended_at=None)
-        ).order_by('started_at')
-        matches: list = await matches_qs.async_to_list()
-        # print(matches)
+        matches = []
+        for player_number in (1, 2):
+            matches_qs = Match.open_matches_qs(user, player_number).filter(tournament=None,
+                                                                           started_at__lte=six_hours_ago)
+            matches += await matches_qs.async_to_list()
+        matches.sort(key=lambda _match: _match.started_at)
         if len(matches) == 0:
             return None
         elif len(matches) == 1:
@@ -936,6 +2267,8 @@ class SsbuController(hero.Controller):
             return None
         return active_match
 
+    @traced('search', search_attributes)
+    @locked(member_key)
     async def look_for_opponents(self, matchmaking_setup: MatchmakingSetup, member: models.Member):
         channel = await matchmaking_setup.channel
         if await MatchSearch.objects.filter(setup=matchmaking_setup, looking=member).async_exists():
@@ -992,18 +2325,18 @@ class SsbuController(hero.Controller):
                                    f"{channel_mention}."
                                    f"Would you like to leave that match now?")
                     msg = await channel.send(msg_txt)
-                    do_close_active_match = await self.core.wait_for_confirmation(msg, member.discord)
-                    await msg.delete()
+                    # looking for opponents continues once the member confirms
+                    await self.request_confirmation(msg, user, 'close_active_match', match=active_match,
+                                                    member=member, setup=matchmaking_setup)
+                    return
             if do_close_active_match:
                 try:
                     await self.close_match(active_match, member)
                 except discord.NotFound:  # user probably left it themselves
                     pass
-            else:
-                return
 
-        await member.add_roles(looking_role)
-        await member.remove_roles(available_role)
+        await self.rest.add_roles(member, looking_role)
+        await self.rest.remove_roles(member, available_role)
         message = await self._send_match_search(channel, member, looking_role, available_role,
                                                 ranked=matchmaking_setup.ranked)
         message = await self.db.wrap_message(message)
@@ -1011,6 +2344,20 @@ class SsbuController(hero.Controller):
         match_search = MatchSearch(message=message, looking=member, setup=matchmaking_setup)
         await match_search.async_save()
 
+    async def _on_close_active_match_confirmation(self, pending, confirmed):
+        await self._delete_confirmation_message(pending)
+        if not confirmed:
+            return
+        match = await pending.match
+        member = await pending.member
+        await member.fetch()
+        if match.ended_at is None:
+            try:
+                await self.close_match(match, member)
+            except discord.NotFound:  # user probably left it themselves
+                pass
+        await self.look_for_opponents(await pending.setup, member)
+
     async def _send_match_search(self, channel, member, looking_role, available_role, ranked=False):
         if not channel.is_fetched:
             await channel.fetch()
@@ -1029,7 +2376,7 @@ class SsbuController(hero.Controller):
         message = await channel.send(f"{member.mention} {rating_txt}is looking for a match! "
                                      f"{looking_role.mention} {available_role.mention}\n\n"
                                      f"React with {self.OFFER_REACTION} to challenge {member.mention}!")
-        await message.add_reaction(self.OFFER_REACTION)
+        self.rest.add_reactions(message, self.OFFER_REACTION, priority=CRITICAL)
         return message
 
     async def add_message_to_search(self, match_search: MatchSearch, message: discord.Message):
@@ -1093,6 +2440,7 @@ class SsbuController(hero.Controller):
                 return False
         return True
 
+    @locked(member_key)
     async def set_as_available(self, matchmaking_setup, member):
         # check if there's an active match
         channel = await matchmaking_setup.channel
@@ -1123,13 +2471,14 @@ class SsbuController(hero.Controller):
             match_searches = await MatchSearch.objects.filter(setup=matchmaking_setup, looking=member).async_to_list()
             for match_search in match_searches:
                 await self.delete_match_search(match_search)
-            await _member.remove_roles(looking_role)
+            await self.rest.remove_roles(_member, looking_role)
         else:
             await self.delete_match_search(match_search)
-            await _member.remove_roles(looking_role)
+            await self.rest.remove_roles(_member, looking_role)
         # give potentially available role
-        await _member.add_roles(available_role)
+        await self.rest.add_roles(_member, available_role)
 
+    @locked(member_key)
     async def set_as_dnd(self, matchmaking_setup, member):
         # check if there's an active match
         channel = await matchmaking_setup.channel
@@ -1159,12 +2508,12 @@ class SsbuController(hero.Controller):
                 for _match_search in _match_searches:
                     await self.delete_match_search(_match_search)
             self.core.loop.create_task(_delete_match_searches(*match_searches))
-            await _member.remove_roles(looking_role)
+            await self.rest.remove_roles(_member, looking_role)
         else:
             await self.delete_match_search(match_search)
-            await _member.remove_roles(looking_role)
+            await self.rest.remove_roles(_member, looking_role)
         # remove potentially available role
-        await _member.remove_roles(available_role)
+        await self.rest.remove_roles(_member, available_role)
 
     async def set_as_ingame(self, *members):
         guild = await members[0].guild
@@ -1185,7 +2534,7 @@ class SsbuController(hero.Controller):
             await self._clear_searches(member)
             await self._clear_offers(member)
             # give ingame role
-            await member.add_roles(ingame_role)
+            await self.rest.add_roles(member, ingame_role)
 
     async def _clear_searches(self, member):
         # clear searches
@@ -1193,7 +2542,7 @@ class SsbuController(hero.Controller):
         for search in searches:
             setup = await search.setup
             looking_role = await setup.looking_role
-            await member.remove_roles(looking_role)
+            await self.rest.remove_roles(member, looking_role)
             await self.delete_match_search(search)
         # clear offered to
         offered_to = await MatchOffer.objects.filter(offered_to=member).async_to_list()
@@ -1205,6 +2554,7 @@ class SsbuController(hero.Controller):
         for offer in offers:
             await self.decline_offer(offer)
 
+    @traced('offer', offer_attributes)
     async def offer_match(self, channel, offered_to, offering, allow_decline=True, ranked=False):
         if await MatchOffer.objects.filter(message__channel=channel, offering=offering, offered_to=offered_to).async_exists():
             return
@@ -1268,9 +2618,10 @@ class SsbuController(hero.Controller):
                                      f"offering a {_ranked}match!\n\n"
                                      f"Click the {self.ACCEPT_REACTION} if you want to "
                                      f"accept {offering.mention}'s challenge.")
-        await message.add_reaction(self.ACCEPT_REACTION)  # white_check_mark
+        reactions = [self.ACCEPT_REACTION]  # white_check_mark
         if allow_decline:
-            await message.add_reaction(self.DECLINE_REACTION)  # negative_squared_cross_mark
+            reactions.append(self.DECLINE_REACTION)  # negative_squared_cross_mark
+        self.rest.add_reactions(message, *reactions, priority=CRITICAL)
         message = await self.db.wrap_message(message)
         match_offer = MatchOffer(message=message, offering=offering, offered_to=offered_to, ranked=ranked)
         await match_offer.async_save()
@@ -1290,6 +2641,7 @@ class SsbuController(hero.Controller):
         except discord.NotFound:
             pass
 
+    @traced('match_create', create_match_attributes)
     async def create_match(self, offered_to, offering, origin_channel, ruleset=None, ranked=False, create_vc=True):
         if not offered_to.is_fetched:
             await offered_to.fetch()
@@ -1303,7 +2655,7 @@ class SsbuController(hero.Controller):
         if not in_dms:
             management_message = await self._send_match_management_message(channel, offered_to, offering, ranked=ranked)
             channel = await self.db.wrap_text_channel(channel)
-            voice_channel = await self.db.wrap_voice_channel(voice_channel) if not None else None
+            voice_channel = await self.db.wrap_voice_channel(voice_channel) if voice_channel is not None else None
         guild = await channel.guild
         try:
             matchmaking_setup = await MatchmakingSetup.objects.async_get(channel=origin_channel)
@@ -1345,35 +2697,12 @@ class SsbuController(hero.Controller):
             await self.match_intro(match)
         return match
 
+    async def get_match_category(self, guild, slots=1):
+        return await self.match_categories.get_category(guild, slots)
+
     async def _create_match_channel(self, offered_to, offering, origin_channel, ranked: bool, create_vc=True):
         guild = await offered_to.guild
-        match_categories = await MatchCategory.objects.filter(category__guild=guild).async_to_list()
         await guild.fetch()
-        owner_id = self.core.owner_id
-        try:
-            owner = await guild.fetch_member(owner_id)
-        except discord.NotFound:
-            owner = None
-        selected_category = None
-        if len(match_categories) == 0:
-            selected_category = await self.create_matches_category(guild, 1)
-        else:
-            for i, match_category in enumerate(match_categories, 1):
-                category = await match_category.category
-                try:
-                    discord_category: discord.CategoryChannel = await category.fetch()
-                except discord.NotFound:
-                    number = match_category.number
-                    await category.async_delete()
-                    selected_category = await self.create_matches_category(guild, number)
-                    break
-                if len(discord_category.channels) >= 49:  # next category
-                    if len(match_categories) < i + 1:  # need one more category
-                        selected_category = await self.create_matches_category(guild, i + 1)
-                        break
-                    continue
-                selected_category = category
-                break
 
         name_format_args = []
         if ranked:
@@ -1385,45 +2714,79 @@ class SsbuController(hero.Controller):
         if matchmaking_name:  # if it's not an empty string now
             name_format_args.append(matchmaking_name)
 
-        text_name = '_'.join(name_format_args)
-        if len(text_name) > 100:
-            text_name = text_name[0:100]
+        text_channel, voice_channel = await self._open_match_channel(
+            guild, (offered_to, offering), '_'.join(name_format_args), ' '.join(name_format_args),
+            f"{offered_to.display_name} and {offering.display_name}", create_vc=create_vc
+        )
+        return text_channel, voice_channel, False
+
+    async def _open_match_channel(self, guild, members, text_name, voice_name, players_txt, create_vc=True):
+        """Lease or create the text (and voice) channel of a match between the given members"""
+        owner_id = self.core.owner_id
+        owner = guild.get_member(owner_id)
+        if owner is None:
+            try:
+                owner = await guild.fetch_member(owner_id)
+            except discord.NotFound:
+                owner = None
+
+        text_name = text_name[0:100]
         text_overwrites = {
             guild.default_role: discord.PermissionOverwrite(read_messages=False),
             guild.me: discord.PermissionOverwrite(read_messages=True, manage_messages=True,
-                                                  manage_channels=True),
-            offered_to: discord.PermissionOverwrite(read_messages=True, manage_messages=True),
-            offering: discord.PermissionOverwrite(read_messages=True, manage_messages=True)
+                                                  manage_channels=True)
         }
+        for member in members:
+            text_overwrites[member] = discord.PermissionOverwrite(read_messages=True, manage_messages=True)
         if owner:
             text_overwrites[owner] = discord.PermissionOverwrite(read_messages=True, manage_messages=True,
                                                                  manage_channels=True)
-        text_channel = await guild.create_text_channel(text_name, overwrites=text_overwrites,
-                                                       category=selected_category,
-                                                       reason=f"Creating match channel for "
-                                                              f"{offered_to.display_name} and "
-                                                              f"{offering.display_name}")
-
-        if not create_vc:
-            voice_channel = None
-        else:
-            voice_name = ' '.join(name_format_args)
-            if len(voice_name) > 100:
-                voice_name = voice_name[0:100]
-            voice_overwrites = {
-                guild.default_role: discord.PermissionOverwrite(connect=False),
-                guild.me: discord.PermissionOverwrite(connect=True, manage_channels=True),
-                offered_to: discord.PermissionOverwrite(connect=True),
-                offering: discord.PermissionOverwrite(connect=True)
-            }
-            if owner:
-                voice_overwrites[owner] = discord.PermissionOverwrite(connect=True, manage_channels=True)
-            voice_channel = await guild.create_voice_channel(voice_name, overwrites=voice_overwrites,
-                                                             category=selected_category,
-                                                             reason=f"Creating voice channel for match with "
-                                                                    f"{offered_to.display_name} and "
-                                                                    f"{offering.display_name}")
-        return text_channel, voice_channel, False
+        voice_name = voice_name[0:100]
+        voice_overwrites = {
+            guild.default_role: discord.PermissionOverwrite(connect=False),
+            guild.me: discord.PermissionOverwrite(connect=True, manage_channels=True)
+        }
+        for member in members:
+            voice_overwrites[member] = discord.PermissionOverwrite(connect=True)
+        if owner:
+            voice_overwrites[owner] = discord.PermissionOverwrite(connect=True, manage_channels=True)
+
+        pair = await self.channel_pool.lease(guild)
+        if pair is not None:
+            text_channel, voice_channel = pair
+            await text_channel.edit(name=text_name, overwrites=text_overwrites,
+                                    reason=f"Using pooled match channel for {players_txt}")
+            if not create_vc:
+                # stays parked until the pair is returned to the pool
+                voice_channel = None
+            else:
+                await voice_channel.edit(name=voice_name, overwrites=voice_overwrites,
+                                         reason=f"Using pooled voice channel for match with {players_txt}")
+            return text_channel, voice_channel
+
+        # pool is empty, it's being refilled in the background
+        slots = 2 if create_vc else 1
+        selected_category = await self.get_match_category(guild, slots)
+        try:
+            text_channel = await guild.create_text_channel(text_name, overwrites=text_overwrites,
+                                                           category=selected_category,
+                                                           reason=f"Creating match channel for {players_txt}")
+            self.match_categories.channel_created(text_channel)
+            slots -= 1
+
+            if not create_vc:
+                voice_channel = None
+            else:
+                voice_channel = await guild.create_voice_channel(voice_name, overwrites=voice_overwrites,
+                                                                 category=selected_category,
+                                                                 reason=f"Creating voice channel for match with "
+                                                                        f"{players_txt}")
+                self.match_categories.channel_created(voice_channel)
+                slots -= 1
+        finally:
+            if slots:
+                self.match_categories.release(selected_category, slots)
+        return text_channel, voice_channel
 
     async def _send_match_management_message(self, channel, player_1, player_2, ranked=False):
         leave_forfeit = "Forfeit" if ranked else "Leave"
@@ -1436,10 +2799,10 @@ class SsbuController(hero.Controller):
                                      f"{self.PUBLIC_REACTION} [SOON] **Allow spectators to view the match**\n"
                                      f"{self.LEAVE_REACTION} **{leave_forfeit} the match**\n")
 
-        await message.pin()
-        await message.add_reaction(self.PRIVATE_REACTION)  # lock
-        await message.add_reaction(self.PUBLIC_REACTION)  # no_lock
-        await message.add_reaction(self.LEAVE_REACTION)  # negative_squared_cross_mark
+        self.rest.pin(message)
+        self.rest.add_reactions(message, self.PRIVATE_REACTION,  # lock
+                                self.PUBLIC_REACTION,  # no_lock
+                                self.LEAVE_REACTION)  # negative_squared_cross_mark
 
         return message
 
@@ -1455,7 +2818,7 @@ class SsbuController(hero.Controller):
         first_to_strike = random.choice([player_1, player_2])
         await Game.objects.async_create(match=match, number=1, guild=guild, first_to_strike=first_to_strike)
 
-        blindpicking_txt = await self.start_blindpicking(channel, player_1, player_2)
+        blindpicking_txt = await self.start_blindpicking(match, channel, player_1, player_2)
 
         _ranked = "Ranked " if match.ranked else ""
         best_of = match.wins_required * 2 - 1
@@ -1466,7 +2829,8 @@ class SsbuController(hero.Controller):
             f"{blindpicking_txt}"
         )
 
-    async def start_blindpicking(self, channel, player_1, player_2) -> str:
+    @traced('blindpick', match_attributes)
+    async def start_blindpicking(self, match, channel, player_1, player_2) -> str:
         player_1_success = False
         player_2_success = False
         if not player_1.is_fetched:
@@ -1476,9 +2840,11 @@ class SsbuController(hero.Controller):
         guild = await channel.guild
         guild_setup = await GuildSetup.objects.async_get(guild=guild)
 
+        # the match ID is only needed if a player has to blindpick for more than one match
         ask_for_blindpick_txt = (
-            "Please pick the character you're going to use for game 1 using the "
-            "`/charpick <character>` command (without <>) here."
+            f"Please pick the character you're going to use for game 1 of match **{match.id}** "
+            f"({channel.mention}) using the `/charpick <character>` command (without <>) here.\n"
+            f"If you need to blindpick for more than one match, use `/charpick <character> {match.id}`."
         )
 
         try:
@@ -1495,19 +2861,19 @@ class SsbuController(hero.Controller):
         else:
             player_2_success = True
 
+        # Players who don't accept DMs get access to a shared blindpick channel. Only their own
+        # overwrite is set, so concurrent matches don't replace each other's overwrites.
         if player_1_success:
             instructions_1 = "check your DMs"
         else:
             player_1_bp_channel = await guild_setup.player_1_blindpick_channel
             await player_1_bp_channel.fetch()
-            overwrite_1 = {
-                player_1.discord: discord.PermissionOverwrite(read_messages=True)
-            }
-            await player_1_bp_channel.discord.edit(overwrites=overwrite_1, reason=f"Allowing Player 1 "
-                                                                                  f"({player_1.discord}) "
-                                                                                  f"to blindpick a character for match "
-                                                                                  f"{channel.name}")
-            instructions_1 = f"use the `/charpick <character>` command (without <>) in " \
+            await player_1_bp_channel.discord.set_permissions(player_1.discord, read_messages=True,
+                                                              reason=f"Allowing Player 1 "
+                                                                     f"({player_1.discord}) "
+                                                                     f"to blindpick a character for match "
+                                                                     f"{channel.name}")
+            instructions_1 = f"use the `/charpick <character> {match.id}` command (without <>) in " \
                              f"{player_1_bp_channel.discord.mention}"
 
         if player_2_success:
@@ -1515,15 +2881,13 @@ class SsbuController(hero.Controller):
         else:
             player_2_bp_channel = await guild_setup.player_2_blindpick_channel
             await player_2_bp_channel.fetch()
-            overwrite_2 = {
-                player_2.discord: discord.PermissionOverwrite(read_messages=True)
-            }
-            await player_2_bp_channel.discord.edit(overwrites=overwrite_2, reason=f"Allowing Player 2 "
-                                                                                  f"({player_2.discord}) "
-                                                                                  f"to blindpick a character for match "
-                                                                                  f"{channel.name}")
-            instructions_2 = f"use the `/charpick <character>` command (without <>) in " \
-                             f"{player_2_bp_channel.mention}"
+            await player_2_bp_channel.discord.set_permissions(player_2.discord, read_messages=True,
+                                                              reason=f"Allowing Player 2 "
+                                                                     f"({player_2.discord}) "
+                                                                     f"to blindpick a character for match "
+                                                                     f"{channel.name}")
+            instructions_2 = f"use the `/charpick <character> {match.id}` command (without <>) in " \
+                             f"{player_2_bp_channel.discord.mention}"
 
         blindpick_txt = (
             f"Please blindpick your characters before striking.\n"
@@ -1549,6 +2913,8 @@ class SsbuController(hero.Controller):
             else:
                 await msg.delete()
 
+    @traced('teardown', match_attributes)
+    @locked(match_key)
     async def close_match(self, match, ended_by=None):
         # if ranked match, ended_by forfeited
 
@@ -1576,11 +2942,21 @@ class SsbuController(hero.Controller):
         await self._delete_spectating_message(match)
 
         if not match.ranked:
+            # only friendlies that didn't end gracefully still have to be counted
+            already_recorded = match.ended_at is not None
             me = await self.db.wrap_user(self.core.user)
             match.winner = me
             match.ended_at = datetime.datetime.now()
             await match.async_save()
+            if not already_recorded:
+                await self.record_match_activity(match)
 
+        if channel is not None:
+            self.striking_message_queue.cancel(channel.id)
+            self.last_message_ids.pop(channel.id, None)
+        if channel is not None and await self.channel_pool.release(match, channel, guild):
+            # the pool took care of both channels
+            channel = voice_channel = None
         if channel is not None:
             try:
                 await channel.fetch()
@@ -1604,74 +2980,63 @@ class SsbuController(hero.Controller):
                     pass
             await voice_channel.async_delete()
 
-        await player_1_member.remove_roles(ingame_role)
-        await player_2_member.remove_roles(ingame_role)
+        await asyncio.gather(self.rest.remove_roles(player_1_member, ingame_role),
+                             self.rest.remove_roles(player_2_member, ingame_role))
 
     async def spectate_match(self, match, member):
         pass
 
-    async def pick_character(self, channel, picking, fighter: Fighter):
-        game, player_num, finished_blindpick, regular_pick, last_pick = await self._pick_character(channel,
-                                                                                                   picking,
-                                                                                                   fighter)
+    @traced('charpick')
+    async def pick_character(self, channel, picking, fighter: Fighter, match_id=None):
+        game, player_num = await self._get_game_to_pick_for(channel, picking, match_id)
+        set_attributes(guild=game.guild_id, blindpick=game.number == 1)
 
-        if not any((finished_blindpick, regular_pick, last_pick)):
-            await channel.send("Thanks! Please wait for your opponent to finish their blindpick.")
-            return
+        async with self.locks.match(game.match_id):
+            finished_blindpick, regular_pick, last_pick = await self._pick_character(game, player_num, fighter)
 
-        match = await game.match
+            if not any((finished_blindpick, regular_pick, last_pick)):
+                await channel.send("Thanks! Please wait for your opponent to finish their blindpick.")
+                return
 
-        if finished_blindpick:
-            await self._finish_blindpick(match, game)
-            return
+            match = await game.match
 
-        if regular_pick:
-            await self._report_pick(match, game, player_num)
-            return
+            if finished_blindpick:
+                await self._finish_blindpick(match, game)
+                return
 
-        if last_pick:
-            await self._report_last_pick(match, game, player_num)
+            if regular_pick:
+                await self._report_pick(match, game, player_num)
+                return
 
-    @async_using_db  # to prevent race condition
-    def _pick_character(self, channel, picking, fighter: Fighter):
-        finished_blindpick = False
-        first_pick = False
-        second_pick = False
+            if last_pick:
+                await self._report_last_pick(match, game, player_num)
+
+    @async_using_db
+    def _get_game_to_pick_for(self, channel, picking, match_id=None):
         player_num = None
         game = None
 
         if GuildSetup.objects.filter(player_1_blindpick_channel__id=channel.id).exists():
-            player_num = 1
-            try:
-                # TODO allow for unranked tournament matches
-                game = Game.objects.filter(match__player_1=picking, match__winner=None, number=1,
-                                           player_1_fighter=None).latest('match__id')
-            except Game.DoesNotExist:
-                raise commands.CheckFailure("There doesn't seem to be a match that you "
-                                            "need to blindpick a fighter for.")
+            player_numbers = (1,)
         elif GuildSetup.objects.filter(player_2_blindpick_channel__id=channel.id).exists():
-            player_num = 2
-            try:
-                game = Game.objects.filter(match__player_2=picking, match__winner=None, number=1,
-                                           player_2_fighter=None).latest('match__id')
-            except Game.DoesNotExist:
+            player_numbers = (2,)
+        elif isinstance(channel, discord.DMChannel):  # from DMs
+            player_numbers = (1, 2)
+        else:
+            player_numbers = None
+
+        if player_numbers is not None:
+            # TODO allow for unranked tournament matches
+            pending = Game.get_pending_blindpicks(picking, player_numbers, match_id)
+            if len(pending) == 0:
                 raise commands.CheckFailure("There doesn't seem to be a match that you "
                                             "need to blindpick a fighter for.")
-        elif isinstance(channel, discord.DMChannel):  # from DMs
-            try:
-                game = Game.objects.filter(match__player_1=picking, match__winner=None, number=1,
-                                           player_1_fighter=None).latest('match__id')
-            except Game.DoesNotExist:
-                try:
-                    game = Game.objects.filter(match__player_2=picking, match__winner=None, number=1,
-                                               player_2_fighter=None).latest('match__id')
-                except Game.DoesNotExist:
-                    raise commands.CheckFailure("There doesn't seem to be a match that you "
-                                                "need to blindpick a fighter for.")
-                else:
-                    player_num = 2
-            else:
-                player_num = 1
+            if len(pending) > 1:
+                match_ids = ', '.join(str(_game.match_id) for _game, _ in pending)
+                raise commands.CheckFailure(f"You need to blindpick a fighter for more than one match "
+                                            f"({match_ids}). Please add the ID of the match you're picking for: "
+                                            f"`/charpick <character> <match ID>`")
+            game, player_num = pending[0]
 
         if game is None:  # charpicked from inside the match channel
             try:
@@ -1687,18 +3052,18 @@ class SsbuController(hero.Controller):
                 else:
                     raise commands.CheckFailure("There's a time and place for everything, but not now!")
 
-        if player_num == 1:
-            if game.player_1_fighter is not None:
-                raise commands.CheckFailure("You already picked a character for this game.")
-            else:
-                game.player_1_fighter = fighter.id
-        else:
-            if game.player_2_fighter is not None:
-                raise commands.CheckFailure("You already picked a character for this game.")
-            else:
-                game.player_2_fighter = fighter.id
+        return game, player_num
+
+    @async_using_db
+    def _pick_character(self, game, player_num, fighter: Fighter):
+        finished_blindpick = False
+        first_pick = False
+        second_pick = False
 
-        game.save()
+        fighter_field = f'player_{player_num}_fighter'
+        if not Game.objects.filter(pk=game.pk, **{fighter_field: None}).update(**{fighter_field: fighter.id}):
+            raise commands.CheckFailure("You already picked a character for this game.")
+        game.refresh_from_db()
 
         if game.player_1_fighter is not None and game.player_2_fighter is not None:
             if game.number == 1:
@@ -1709,33 +3074,33 @@ class SsbuController(hero.Controller):
             if game.number != 1:
                 first_pick = True
 
-        return game, player_num, finished_blindpick, first_pick, second_pick
+        return finished_blindpick, first_pick, second_pick
 
     async def _finish_blindpick(self, match, game):
         guild = await match.guild
         await guild.fetch()
         guild_setup = await GuildSetup.objects.async_get(guild=guild)
-        p1_bp_channel: discord.TextChannel = await guild_setup.player_1_blindpick_channel
-        await p1_bp_channel.fetch()
-        p2_bp_channel = await guild_setup.player_2_blindpick_channel
-        await p2_bp_channel.fetch()
 
         fighter_1 = Fighter(game.player_1_fighter)
         player_1 = await match.player_1
-        player_1_member = guild.get_member(player_1.id)
-        if player_1_member is None:
-            player_1_member = await guild.fetch_member(player_1.id)
-        await p1_bp_channel.set_permissions(player_1_member, overwrite=None)
         await player_1.fetch()
 
         fighter_2 = Fighter(game.player_2_fighter)
         player_2 = await match.player_2
-        player_2_member = guild.get_member(player_2.id)
-        if player_2_member is None:
-            player_2_member = await guild.fetch_member(player_2.id)
-        await p2_bp_channel.set_permissions(player_2_member, overwrite=None)
         await player_2.fetch()
 
+        # only players who didn't get a DM have an overwrite in a blindpick channel
+        for bp_channel, player in ((await guild_setup.player_1_blindpick_channel, player_1),
+                                   (await guild_setup.player_2_blindpick_channel, player_2)):
+            if bp_channel is None:
+                continue
+            discord_bp_channel = guild.get_channel(bp_channel.id)
+            member = guild.get_member(player.id)
+            if discord_bp_channel is None or member is None:
+                continue
+            if not discord_bp_channel.overwrites_for(member).is_empty():
+                await discord_bp_channel.set_permissions(member, overwrite=None)
+
         channel = await match.channel
         await channel.fetch()
 
@@ -1783,65 +3148,83 @@ class SsbuController(hero.Controller):
         first_to_strike_member = MockMember(first_to_strike_user.id, guild.id)
         first_to_strike = await self.db.wrap_member(first_to_strike_member)
         await first_to_strike.fetch()
+        channel = await match.channel
 
-        await self._update_striking_message(match, first_to_strike)
+        self.request_striking_message_update(match, channel, first_to_strike)
 
     async def start_charpicking(self, match):
         last_game = await Game.objects.async_get(match=match, number=match.current_game - 1)
         last_winner = await last_game.winner
         await last_winner.fetch()
         player_1 = await match.player_1
-        player_2 = await match.player_2
         channel = await match.channel
         await channel.fetch()
 
         if last_winner.id == player_1.id:
             last_winner_fighter = Fighter(last_game.player_1_fighter)
-            last_loser = player_2
-            last_loser_fighter = Fighter(last_game.player_2_fighter)
         else:
             last_winner_fighter = Fighter(last_game.player_2_fighter)
-            last_loser = player_1
-            last_loser_fighter = Fighter(last_game.player_1_fighter)
-        await last_loser.fetch()
 
-        msg = await channel.send(f"{last_winner.mention}, do you want to switch from "
-                                 f"{last_winner_fighter} after winning the last game?")
-        switch_character = await self.core.wait_for_confirmation(msg, last_winner, force_response=False)
-        if switch_character:
-            await channel.send("Please use `/charpick <character>` to switch to a different character.")
+        current_game = await Game.objects.async_get(match=match, number=match.current_game)
+        await self._ask_to_switch_fighter(match, current_game, channel, last_winner, last_winner_fighter,
+                                          won_last_game=True)
+
+    async def _ask_to_switch_fighter(self, match, game, channel, player, fighter, won_last_game):
+        if won_last_game:
+            msg = await channel.send(f"{player.mention}, do you want to switch from "
+                                     f"{fighter} after winning the last game?")
         else:
-            current_game = await Game.objects.async_get(match=match, number=match.current_game)
-            if player_1.id == last_winner.id:
-                current_game.player_1_fighter = last_winner_fighter.id
-            else:
-                current_game.player_2_fighter = last_winner_fighter.id
-            await current_game.async_save()
+            msg = await channel.send(f"{player.mention}, do you want to switch from "
+                                     f"{fighter} for this game?")
+        await self.request_confirmation(msg, player, 'switch_fighter', match=match, game=game,
+                                        argument=fighter.id)
+
+    async def _on_switch_fighter_confirmation(self, pending, confirmed):
+        match = await pending.match
+        if match.ended_at is not None:
+            return
+        channel = await match.channel
+        await channel.fetch()
+        if confirmed:
+            await channel.send("Please use `/charpick <character>` to switch to a different character.")
+            return
 
-            msg = await channel.send(f"{last_loser.mention}, do you want to switch from "
-                                     f"{last_loser_fighter} for this game?")
-            switch_character = await self.core.wait_for_confirmation(msg, last_loser, force_response=False)
+        # keep the fighter from the last game
+        current_game = await pending.game
+        player_1 = await match.player_1
+        player_2 = await match.player_2
+        if player_1.id == pending.user_id:
+            current_game.player_1_fighter = pending.argument
+        else:
+            current_game.player_2_fighter = pending.argument
+        await current_game.async_save()
 
-            if switch_character:
-                await channel.send("Please use `/charpick <character>` to switch to a different character.")
-            else:
-                if player_1.id == last_loser.id:
-                    current_game.player_1_fighter = last_loser_fighter.id
-                else:
-                    current_game.player_2_fighter = last_loser_fighter.id
-                await current_game.async_save()
+        last_game = await Game.objects.async_get(match=match, number=current_game.number - 1)
+        last_winner = await last_game.winner
+        if last_winner.id != pending.user_id:  # both players answered
+            await self.start_striking(match)
+            return
 
-                await self.start_striking(match)
+        if player_1.id == last_winner.id:
+            last_loser = player_2
+            last_loser_fighter = Fighter(last_game.player_2_fighter)
+        else:
+            last_loser = player_1
+            last_loser_fighter = Fighter(last_game.player_1_fighter)
+        await last_loser.fetch()
+        await self._ask_to_switch_fighter(match, current_game, channel, last_loser, last_loser_fighter,
+                                          won_last_game=False)
 
+    @locked(match_key)
     async def process_victory(self, match, player):
         game = await Game.objects.async_get(match=match, number=match.current_game)
         needs_confirmation_by = await game.needs_confirmation_by
         _winner = await game.winner
         if needs_confirmation_by is not None and player.id == needs_confirmation_by.id and player.id == _winner.id:
             winner = player
-            game.needs_confirmation_by = None
-            await game.async_save()
-            await self.end_game(match, game, winner)
+            # only the first confirmation ends the game
+            if await self._update_game_if(game, {'needs_confirmation_by_id': player.id}, needs_confirmation_by_id=None):
+                await self.end_game(match, game, winner)
         else:
             player_1 = await match.player_1
             player_2 = await match.player_2
@@ -1860,6 +3243,7 @@ class SsbuController(hero.Controller):
             await channel.send(f"{needs_confirmation_by.mention}, please confirm this game's result with "
                                f"`/lost`.")
 
+    @locked(match_key)
     async def process_loss(self, match, player):
         game = await Game.objects.async_get(match=match, number=match.current_game)
         player_1 = await match.player_1
@@ -1873,9 +3257,9 @@ class SsbuController(hero.Controller):
             else:
                 await player_1.fetch()
                 winner = player_1
-            game.needs_confirmation_by = None
-            await game.async_save()
-            await self.end_game(match, game, winner)
+            # only the first confirmation ends the game
+            if await self._update_game_if(game, {'needs_confirmation_by_id': player.id}, needs_confirmation_by_id=None):
+                await self.end_game(match, game, winner)
         else:
             channel = await match.channel
             await channel.fetch()
@@ -1892,18 +3276,14 @@ class SsbuController(hero.Controller):
             await channel.send(f"{needs_confirmation_by.mention}, please confirm this game's result with "
                                f"`/won`.")
 
+    @traced('game_end', match_attributes)
+    @locked(match_key)
     async def end_game(self, match, game, winner):
         channel = await match.channel
         await channel.fetch()
         player_1 = await match.player_1
         player_2 = await match.player_2
-        if winner.id == player_1.id:
-            win_count = match.player_1_score + 1
-            match.player_1_score = win_count
-        else:
-            win_count = match.player_2_score + 1
-            match.player_2_score = win_count
-        await match.async_save()
+        win_count = await self._count_game_win(match, 1 if winner.id == player_1.id else 2)
         # check if winner has won enough games in this match
         if win_count == match.wins_required:
             # if so, announce match winner and gracefully end match
@@ -1920,18 +3300,60 @@ class SsbuController(hero.Controller):
         await channel.send(
             f"{winner.mention} wins game {game.number}!"
         )
-        # wait 5 seconds
-        await asyncio.sleep(5)
-        # create next game
-        match.current_game += 1
-        guild = await match.guild
-        next_game = await Game.objects.async_create(match=match, number=match.current_game,
-                                                    guild=guild, first_to_strike=winner)
-        await match.async_save()
+        # start the next game in 5 seconds
+        scheduler = self.core.get_controller('scheduler')
+        await scheduler.schedule(self.start_next_game, datetime.datetime.now() + datetime.timedelta(seconds=5),
+                                 match_id=match.id, first_to_strike_id=winner.id, number=game.number + 1)
+
+    @schedulable
+    async def start_next_game(self, match_id: int, first_to_strike_id: int, number: int = None):
+        async with self.locks.match(match_id):
+            await self._start_next_game(match_id, first_to_strike_id, number)
+
+    async def _start_next_game(self, match_id, first_to_strike_id, number=None):
+        try:
+            match = await Match.objects.async_get(id=match_id)
+        except Match.DoesNotExist:
+            return
+        if match.ended_at is not None:
+            return
+        if not self.owns_guild(match.guild_id):
+            await self.hand_off(match.guild_id, 'start_next_game', match_id=match_id,
+                                first_to_strike_id=first_to_strike_id, number=number)
+            return
+        if number is None:
+            # scheduled before the game number was passed along
+            number = match.current_game + 1
+        if match.current_game > number:
+            return
+        # if this already ran before a restart, the game is reused and its intro sent again
+        next_game = await self._create_next_game(match, number, first_to_strike_id)
 
         # then start next game
         await self.game_intro(match, next_game)
 
+    @async_using_db
+    def _create_next_game(self, match, number, first_to_strike_id):
+        """Create a match's game with the given number and make it the current one; safe to repeat"""
+        with transaction.atomic():
+            game, _ = Game.objects.get_or_create(match=match, number=number,
+                                                 defaults={'guild_id': match.guild_id,
+                                                           'first_to_strike_id': first_to_strike_id})
+            if match.current_game < number:
+                Match.objects.filter(pk=match.pk).update(current_game=number)
+                match.current_game = number
+        return game
+
+    @async_using_db
+    def _count_game_win(self, match, player_number):
+        """Increment a player's score with a single UPDATE and return the new score"""
+        score_field = f'player_{player_number}_score'
+        Match.objects.filter(pk=match.pk).update(**{score_field: models.F(score_field) + 1})
+        match.player_1_score, match.player_2_score = Match.objects.values_list(
+            'player_1_score', 'player_2_score'
+        ).get(pk=match.pk)
+        return getattr(match, score_field)
+
     async def game_intro(self, match, game):
         # intro message
         channel = await match.channel
@@ -1952,11 +3374,23 @@ class SsbuController(hero.Controller):
         channel = await match.channel
         await channel.fetch()
         msg = await channel.send(f"{player.mention}, are you sure you want to forfeit this match?")
-        confirm_forfeit = await self.core.wait_for_confirmation(msg, player, force_response=False)
-        await msg.delete()
-        if not confirm_forfeit:
+        await self.request_confirmation(msg, player, 'forfeit', match=match)
+
+    async def _on_forfeit_confirmation(self, pending, confirmed):
+        await self._delete_confirmation_message(pending)
+        if not confirmed:
+            return
+        match = await pending.match
+        if match.ended_at is not None:
             return
+        player = await pending.user
+        await player.fetch()
+        await self.forfeit_match(match, player)
 
+    @locked(match_key)
+    async def forfeit_match(self, match, player):
+        channel = await match.channel
+        await channel.fetch()
         await channel.send(f"{player.mention} forfeited!")
 
         player_1 = await match.player_1
@@ -1976,19 +3410,50 @@ class SsbuController(hero.Controller):
             last_game.winner = player_1
         await self.gracefully_end_match(match)
 
+    @traced('rating_update', rating_attributes)
     async def process_match_result(self, player_1, player_2, score_1, score_2, guild=None):
         results_1 = await self.get_all_results(player_1, guild=guild)
         results_2 = await self.get_all_results(player_2, guild=guild)
         if guild is None:
-            player_1: Player = await Player.objects.async_get(user=player_1)
-            player_2: Player = await Player.objects.async_get(user=player_2)
-        else:
-            player_1, _ = await GuildPlayer.objects.async_get_or_create(
-                member__user__id=player_1.id, member__guild__id=guild.id
-            )
-            player_2, _ = await GuildPlayer.objects.async_get_or_create(
-                member__user__id=player_2.id, member__guild__id=guild.id
-            )
+            return await self._process_global_match_result(player_1, player_2, score_1, score_2,
+                                                           results_1, results_2)
+        player_1, _ = await GuildPlayer.objects.async_get_or_create(
+            member__user__id=player_1.id, member__guild__id=guild.id
+        )
+        player_2, _ = await GuildPlayer.objects.async_get_or_create(
+            member__user__id=player_2.id, member__guild__id=guild.id
+        )
+        ratings = self._rate_match(player_1, player_2, score_1, score_2, results_1, results_2)
+        await player_1.async_save()
+        await player_2.async_save()
+        return ratings
+
+    @async_using_db
+    def _process_global_match_result(self, user_1, user_2, score_1, score_2, results_1, results_2):
+        """Rate a match of a verified guild
+
+        Global ratings are shared by all guilds, and with that by all
+        processes. Both players' rows stay locked until their new
+        ratings are saved, so results from other guilds that come in at
+        the same time are applied one after another instead of
+        overwriting each other.
+        """
+        with transaction.atomic():
+            # always lock in the same order to avoid deadlocks
+            players = {
+                player.user_id: player
+                for player in Player.objects.select_for_update().filter(
+                    user_id__in=(user_1.id, user_2.id)
+                ).order_by('user_id')
+            }
+            player_1 = players[user_1.id]
+            player_2 = players[user_2.id]
+            ratings = self._rate_match(player_1, player_2, score_1, score_2, results_1, results_2)
+            player_1.save()
+            player_2.save()
+        return ratings
+
+    def _rate_match(self, player_1, player_2, score_1, score_2, results_1, results_2):
         old_rating_1 = self.glicko.create_rating(
             player_1.rating, player_1.deviation, player_1.volatility
         )
@@ -2006,13 +3471,132 @@ class SsbuController(hero.Controller):
         player_1.rating = rating_1['mu']
         player_1.deviation = rating_1['phi']
         player_1.volatility = rating_1['sigma']
-        await player_1.async_save()
         player_2.rating = rating_2['mu']
         player_2.deviation = rating_2['phi']
         player_2.volatility = rating_2['sigma']
-        await player_2.async_save()
         return old_rating_1, rating_1, old_rating_2, rating_2
 
+    @async_using_db
+    def clear_all_ratings(self):
+        """Delete all matches and ratings with one DELETE per table"""
+        # delete() counts the rows of all cascades together, so each model's own count is taken from the details
+        _, deleted = Match.objects.all().delete()
+        num_matches = deleted.get(Match._meta.label, 0)
+        _, deleted = GuildPlayer.objects.all().delete()
+        num_guild_players = deleted.get(GuildPlayer._meta.label, 0)
+        _, deleted = Player.objects.all().delete()
+        num_players = deleted.get(Player._meta.label, 0)
+        return num_matches, num_guild_players, num_players
+
+    @async_using_db
+    def seed_guild_ratings(self, guild: models.Guild, seeds, volatility=0.06):
+        """Set the local ratings of many members at once
+
+        ``seeds`` is a list of (user ID, rating, deviation) tuples;
+        missing users, members and guild players are created in bulk.
+        """
+        user_ids = [user_id for user_id, _, _ in seeds]
+        models.User.objects.bulk_create([models.User(id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        models.Member.objects.bulk_create([models.Member(user_id=user_id, guild=guild) for user_id in user_ids],
+                                          ignore_conflicts=True)
+        members = {
+            member.user_id: member
+            for member in models.Member.objects.filter(guild=guild, user_id__in=user_ids)
+        }
+        existing = set(
+            GuildPlayer.objects.filter(member__in=list(members.values())).values_list('member_id', flat=True)
+        )
+        new_guild_players = []
+        updated_guild_players = []
+        for user_id, rating, deviation in seeds:
+            member = members[user_id]
+            guild_player = GuildPlayer(member=member, rating=rating, deviation=deviation, volatility=volatility)
+            if member.pk in existing:
+                updated_guild_players.append(guild_player)
+            else:
+                new_guild_players.append(guild_player)
+        GuildPlayer.objects.bulk_create(new_guild_players)
+        GuildPlayer.objects.bulk_update(updated_guild_players, ['rating', 'deviation', 'volatility'])
+        return len(new_guild_players), len(updated_guild_players)
+
+    @staticmethod
+    def activity_date(value: datetime.datetime):
+        """The UTC day a match counts for in the activity rollups
+
+        Naive datetimes are in the local time zone, like the ones of
+        datetime.now() and of auto_now fields without USE_TZ.
+        """
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value.astimezone(datetime.timezone.utc).date()
+
+    @async_using_db
+    def record_match_activity(self, match: Match):
+        """Add an ended match to both players' daily activity rollups"""
+        F = models.F
+        guild = match.guild
+        day = self.activity_date(match.started_at)
+        for user in (match.player_1, match.player_2):
+            member, _ = models.Member.objects.get_or_create(user=user, guild=guild)
+            activity, _ = MemberActivity.objects.get_or_create(member=member, date=day,
+                                                               defaults={'guild': guild, 'user': user})
+            MemberActivity.objects.filter(pk=activity.pk).update(
+                total_matches=F('total_matches') + 1,
+                ranked_matches=F('ranked_matches') + int(match.ranked),
+                wins=F('wins') + int(match.winner_id == user.id)
+            )
+
+    @async_using_db
+    def backfill_member_activity(self, guild: models.Guild):
+        """Rebuild a guild's activity rollups from its match history"""
+        ended_matches = (Match.objects.filter(guild=guild, ended_at__isnull=False)
+                         .values_list('player_1_id', 'player_2_id', 'winner_id', 'ranked', 'started_at'))
+        rollups = {}
+        # days are computed here rather than with TruncDate, so they're the same UTC days as in record_match_activity
+        for player_1_id, player_2_id, winner_id, ranked, started_at in ended_matches.iterator(chunk_size=2000):
+            day = self.activity_date(started_at)
+            for user_id in (player_1_id, player_2_id):
+                total, ranked_total, wins = rollups.get((user_id, day), (0, 0, 0))
+                rollups[user_id, day] = (total + 1, ranked_total + int(ranked), wins + int(winner_id == user_id))
+
+        user_ids = {user_id for user_id, _ in rollups}
+        models.Member.objects.bulk_create([models.Member(user_id=user_id, guild=guild) for user_id in user_ids],
+                                          ignore_conflicts=True)
+        members = {
+            member.user_id: member
+            for member in models.Member.objects.filter(guild=guild, user_id__in=user_ids)
+        }
+        MemberActivity.objects.filter(guild=guild).delete()
+        MemberActivity.objects.bulk_create([
+            MemberActivity(member=members[user_id], guild=guild, user_id=user_id, date=day,
+                           total_matches=total, ranked_matches=ranked, wins=wins)
+            for (user_id, day), (total, ranked, wins) in rollups.items()
+        ], batch_size=1000)
+        return len(rollups)
+
+    @async_using_db
+    def get_activity_stats(self, guild: models.Guild, start: datetime.date, end: datetime.date,
+                           limit=10, inactive_limit=20):
+        """Most active, least active and highest rated users as user ID tuples"""
+        Sum = models.Sum
+        activities = MemberActivity.objects.filter(guild=guild, date__gte=start, date__lt=end)
+        most_active = list(
+            activities.values('user_id').annotate(
+                total=Sum('total_matches'), ranked=Sum('ranked_matches')
+            ).order_by('-total').values_list('user_id', 'total', 'ranked')[:limit]
+        )
+        inactive_qs = models.Member.objects.filter(guild=guild, user__is_active=True).exclude(
+            pk__in=activities.values('member_id')
+        )
+        num_inactive = inactive_qs.count()
+        inactive = list(inactive_qs.order_by('user_id').values_list('user_id', flat=True)[:inactive_limit])
+        highest_rated = list(
+            GuildPlayer.objects.filter(member__guild=guild).order_by('-rating').values_list(
+                'member__user_id', 'rating', 'deviation'
+            )[:limit]
+        )
+        return most_active, inactive, num_inactive, highest_rated
+
     async def get_all_results(self, player, guild=None):
         if guild is None:
             player_1_matches = await (
@@ -2071,6 +3655,7 @@ class SsbuController(hero.Controller):
                 for match in player_2_matches
             ]
 
+    @locked(match_key)
     async def gracefully_end_match(self, match):
         channel = await match.channel
         await channel.fetch()
@@ -2080,6 +3665,9 @@ class SsbuController(hero.Controller):
         match.winner = winner
         match.ended_at = datetime.datetime.now()
         await match.async_save()
+        await self.record_match_activity(match)
+        if match.tournament_id is not None:
+            await self.end_tournament_match(match)
         # remove in-game role
         guild = await match.guild
         guild_setup = await GuildSetup.objects.async_get(guild=guild)
@@ -2097,13 +3685,13 @@ class SsbuController(hero.Controller):
             rating_diff_txt = ""
             if guild_setup.verified:
                 rating_diff_txt += "Global Rating changes:\n\n"
-                global_old_rating_1, global_new_rating_1, global_old_rating_2, global_new_rating_2 = self.process_match_result(
+                global_old_rating_1, global_new_rating_1, global_old_rating_2, global_new_rating_2 = await self.process_match_result(
                     player_1, player_2, match.player_1_score, match.player_2_score
                 )
-                sign_1 = '+' if global_old_rating_1 < global_new_rating_1 else ''
-                sign_2 = '+' if global_old_rating_2 < global_new_rating_2 else ''
-                global_diff_1 = global_new_rating_1 - global_old_rating_1
-                global_diff_2 = global_new_rating_2 - global_old_rating_2
+                sign_1 = '+' if global_old_rating_1['mu'] < global_new_rating_1['mu'] else ''
+                sign_2 = '+' if global_old_rating_2['mu'] < global_new_rating_2['mu'] else ''
+                global_diff_1 = global_new_rating_1['mu'] - global_old_rating_1['mu']
+                global_diff_2 = global_new_rating_2['mu'] - global_old_rating_2['mu']
                 rating_diff_txt += (
                     f"{player_1.mention}: **{global_new_rating_1['mu']}**±**{global_new_rating_1['phi']}** "
                     f"(**{sign_1}{global_diff_1}**)\n"
@@ -2129,7 +3717,21 @@ class SsbuController(hero.Controller):
         # TODO if match.setup, offer members to set their matchmaking status
 
         await channel.send("This channel will be closed in 1 minute. Make sure to continue conversations in DMs!")
-        await asyncio.sleep(60)
+        scheduler = self.core.get_controller('scheduler')
+        await scheduler.schedule(self.close_ended_match, datetime.datetime.now() + datetime.timedelta(minutes=1),
+                                 match_id=match.id)
+
+    @schedulable
+    async def close_ended_match(self, match_id: int):
+        try:
+            match = await Match.objects.async_get(id=match_id)
+        except Match.DoesNotExist:
+            return
+        if not self.owns_guild(match.guild_id):
+            await self.hand_off(match.guild_id, 'close_ended_match', match_id=match_id)
+            return
+        if await match.channel is None:  # already closed
+            return
         await self.close_match(match)
 
     async def create_next_matches_category(self, guild):
@@ -2146,6 +3748,7 @@ class SsbuController(hero.Controller):
         category_name = f"Matches {number}" if number != 1 else "Matches"
         category = await guild.create_category_channel(name=category_name, overwrites=overwrites,
                                                        reason="Creating category necessary for matches")
+        self.match_categories.category_created(category, number)
         category = await self.db.wrap_category_channel(category)
         new_match_category = ssbu_models.MatchCategory(category=category, number=number)
         await new_match_category.async_save()
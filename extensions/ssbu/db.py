@@ -0,0 +1,206 @@
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+
+from .metrics import Histogram
+from .tracing import record_db_call
+
+
+log = logging.getLogger(__name__)
+
+_EXTENSIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+# the DatabaseExecutor async_using_db runs on, see install_executor
+_executor = None
+
+
+class DatabaseOverloaded(RuntimeError):
+    """Raised when too many database calls are waiting for a worker"""
+
+
+class DatabaseTimeout(TimeoutError):
+    """Raised when a database call waited longer than allowed for a worker"""
+
+
+def _describe_function(fn):
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    fn = getattr(fn, '__func__', fn)
+    code = getattr(fn, '__code__', None)
+    if code is None or not os.path.abspath(code.co_filename).startswith(_EXTENSIONS_DIR):
+        return None
+    return getattr(fn, '__qualname__', code.co_name)
+
+
+def _describe_frame(frame):
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', None)  # Python 3.11+
+    if qualname is not None:
+        return qualname
+    _self = frame.f_locals.get('self')
+    if _self is not None:
+        return f"{type(_self).__name__}.{code.co_name}"
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+
+
+def find_call_site(fn=None):
+    """Name the code in our extensions that issued a database call
+
+    If the function that is run in the executor belongs to our
+    extensions (e.g. a method decorated with ``async_using_db``),
+    that function is used; otherwise, the innermost caller from our
+    extensions that is on the stack while the call is submitted.
+    """
+    name = _describe_function(fn) if fn is not None else None
+    if name is not None:
+        return name
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_EXTENSIONS_DIR) and filename != _THIS_FILE:
+            return _describe_frame(frame)
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class QueryStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.wait = Histogram()
+
+
+class DatabaseExecutor(ThreadPoolExecutor):
+    """Bounded, instrumented executor for database work
+
+    Calls made through this module's ``async_using_db`` run on it, and
+    so do hero's async model helpers (``async_get``, ``async_save``
+    etc.) once :class:`DatabaseRoutingExecutor` is the event loop's
+    default executor.
+
+    ``queue_limit`` is the maximum number of calls waiting for a
+    worker; further calls fail with :class:`DatabaseOverloaded`
+    instead of piling up. Calls that waited more than ``timeout``
+    seconds for a worker fail with :class:`DatabaseTimeout` instead of
+    being run after their caller most likely stopped caring. Calls
+    taking longer than ``slow_query_threshold`` seconds are logged
+    together with the call site that issued them.
+    """
+
+    def __init__(self, max_workers=8, queue_limit=256, timeout=30.0, slow_query_threshold=0.25,
+                 slow_query_log_size=50):
+        super().__init__(max_workers=max_workers, thread_name_prefix='purah-db')
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.slow_query_threshold = slow_query_threshold
+        self.stats = collections.defaultdict(QueryStats)
+        self.slow_queries = collections.deque(maxlen=slow_query_log_size)
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._counter_lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return self.queued
+
+    def submit(self, fn, *args, **kwargs):
+        with self._counter_lock:
+            if self.queued >= self.queue_limit:
+                self.rejected += 1
+                raise DatabaseOverloaded(f"{self.queued} database calls are already waiting for a worker")
+            self.queued += 1
+        call_site = find_call_site(fn)
+        record_db_call()
+        submitted_at = time.monotonic()
+
+        def run():
+            started_at = time.monotonic()
+            waited = started_at - submitted_at
+            with self._counter_lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                if self.timeout is not None and waited > self.timeout:
+                    with self._counter_lock:
+                        self.timed_out += 1
+                    raise DatabaseTimeout(f"{call_site} waited {waited:.1f}s for a database worker")
+                return fn(*args, **kwargs)
+            finally:
+                duration = time.monotonic() - started_at
+                with self._counter_lock:
+                    self.running -= 1
+                    stats = self.stats[call_site]
+                stats.wait.observe(waited)
+                stats.latency.observe(duration)
+                if duration >= self.slow_query_threshold:
+                    self.slow_queries.append((time.time(), call_site, duration, waited))
+                    log.warning("Slow database call in %s: %.3fs (waited %.3fs for a worker)",
+                                call_site, duration, waited)
+
+        return super().submit(run)
+
+    def top_call_sites(self, limit=10):
+        """Call sites sorted by the total time they spent in the database"""
+        return sorted(self.stats.items(), key=lambda item: item[1].latency.sum, reverse=True)[:limit]
+
+
+def is_database_call(fn):
+    """Whether a function submitted to the default executor is database work of hero or Django"""
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    fn = getattr(fn, '__func__', fn)
+    module = getattr(fn, '__module__', None) or ''
+    return module.split('.', 1)[0] in DatabaseRoutingExecutor.DATABASE_PACKAGES
+
+
+class DatabaseRoutingExecutor(ThreadPoolExecutor):
+    """Default executor of the event loop that hands database calls to a :class:`DatabaseExecutor`
+
+    hero's async model helpers run their queries on the loop's default
+    executor; they're recognized by the package of the function they
+    submit. Everything else (DNS lookups, discord.py internals etc.)
+    runs on this executor's own threads as before.
+    """
+
+    # asgiref is what Django's sync_to_async submits
+    DATABASE_PACKAGES = ('hero', 'django', 'asgiref')
+
+    def __init__(self, db_executor, max_workers=None):
+        super().__init__(max_workers=max_workers, thread_name_prefix='purah-default')
+        self.db_executor = db_executor
+
+    def submit(self, fn, *args, **kwargs):
+        if is_database_call(fn):
+            return self.db_executor.submit(fn, *args, **kwargs)
+        return super().submit(fn, *args, **kwargs)
+
+
+def install_executor(executor):
+    """Make ``async_using_db`` run on ``executor``; returns the previous one"""
+    global _executor
+    old_executor, _executor = _executor, executor
+    return old_executor
+
+
+def async_using_db(func):
+    """Like hero's ``async_using_db``, but runs on the installed :class:`DatabaseExecutor`
+
+    Falls back to the event loop's default executor as long as none is
+    installed.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+    return wrapper
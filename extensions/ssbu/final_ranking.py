@@ -0,0 +1,130 @@
+import collections
+
+from .db import async_using_db
+from .models import Participant, ParticipantTeam
+from .rest_dispatcher import COSMETIC
+from . import strings
+
+
+def group_by_rank(challonge_participants):
+    """Challonge participants grouped by final rank, best rank first
+
+    Several participants can share a rank (e.g. both losers of the
+    semifinals in double elimination).
+    """
+    ranking = collections.defaultdict(list)
+    for challonge_participant in challonge_participants:
+        if challonge_participant.final_rank is not None:
+            ranking[challonge_participant.final_rank].append(challonge_participant)
+    return collections.OrderedDict(sorted(ranking.items()))
+
+
+class FinalResult:
+    """A participant's (or a team's) result, before it's sent to them"""
+
+    __slots__ = ('pk', 'user_ids', 'rank', 'starting_rating', 'rating', 'lines')
+
+    def __init__(self, pk, user_ids, rank, starting_rating, rating):
+        self.pk = pk
+        self.user_ids = user_ids
+        self.rank = rank
+        self.starting_rating = starting_rating
+        self.rating = rating
+        # additional lines for the message, e.g. from rewards
+        self.lines = []
+
+    @property
+    def rating_change(self):
+        return self.rating - self.starting_rating
+
+
+class FinalRankingPipeline:
+    """Processes the final ranking of a tournament that has ended
+
+    All participants are loaded together with their ratings in a
+    single query and their ranks are saved with a single bulk update,
+    instead of a few reads and writes per participant. Hooks (e.g. of
+    rewards like faction points) get all results at once, so they can
+    compute and save theirs in bulk as well. Result messages go
+    through the controller's REST dispatcher, so they're fanned out
+    within Discord's rate limits and don't hold up anything else.
+    """
+
+    def __init__(self, ctl):
+        self.ctl = ctl
+        # async hook(tournament, results) -> dict of values for the tournament end message, or None
+        self.hooks = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    async def run(self, tournament, challonge_tournament):
+        """Process the final ranking; return the results and the values the hooks added
+
+        A tournament's final ranking is only processed once; if it has
+        ended or its ranks have been saved already, nothing is done.
+        """
+        if tournament.ended or await self._ranks_saved(tournament):
+            return [], {}
+        ranking = group_by_rank(challonge_tournament.participants or [])
+        ranks = {challonge_participant.id: rank for rank, challonge_participants in ranking.items()
+                 for challonge_participant in challonge_participants}
+        if not ranks:
+            return [], {}
+        results = await self._load_results(tournament, ranks)
+        summary = {}
+        for hook in self.hooks:
+            summary.update(await hook(tournament, results) or {})
+        await self._save_ranks(tournament, results)
+        for result in results:
+            self._send_result(tournament, challonge_tournament, result)
+        return results, summary
+
+    @async_using_db
+    def _ranks_saved(self, tournament):
+        model = ParticipantTeam if tournament.doubles else Participant
+        return model.objects.filter(tournament=tournament, final_rank__isnull=False).exists()
+
+    @async_using_db
+    def _load_results(self, tournament, ranks):
+        if tournament.doubles:
+            rows = (ParticipantTeam.objects.filter(tournament=tournament, challonge_id__in=ranks)
+                    .values_list('pk', 'challonge_id', 'member_1__user_id', 'member_2__user_id', 'starting_elo',
+                                 'team__rating'))
+            rows = [(pk, challonge_id, (user_id_1, user_id_2), starting_elo, elo)
+                    for pk, challonge_id, user_id_1, user_id_2, starting_elo, elo in rows]
+        else:
+            rows = (Participant.objects.filter(tournament=tournament, challonge_id__in=ranks)
+                    .values_list('pk', 'challonge_id', 'member__user_id', 'starting_guild_elo',
+                                 'member__guildplayer__rating'))
+            rows = [(pk, challonge_id, (user_id,), starting_elo, elo)
+                    for pk, challonge_id, user_id, starting_elo, elo in rows]
+        results = [FinalResult(pk, user_ids, ranks[challonge_id], starting_elo,
+                               # no rating yet if they never played a rated match
+                               elo if elo is not None else starting_elo)
+                   for pk, challonge_id, user_ids, starting_elo, elo in rows]
+        results.sort(key=lambda result: result.rank)
+        return results
+
+    @async_using_db
+    def _save_ranks(self, tournament, results):
+        model = ParticipantTeam if tournament.doubles else Participant
+        participants = [model(pk=result.pk, final_rank=result.rank) for result in results]
+        model.objects.bulk_update(participants, ['final_rank'], batch_size=500)
+
+    def _send_result(self, tournament, challonge_tournament, result):
+        elo_change = f"+{result.rating_change}" if result.rating_change >= 0 else str(result.rating_change)
+        template = strings.participant_doubles_results if tournament.doubles else strings.participant_results
+        content = template.format(tournament=challonge_tournament, rank=result.rank, elo_change=elo_change,
+                                  new_elo=result.rating)
+        if result.lines:
+            content = '\n'.join([content.rstrip('\n'), *result.lines])
+        for user_id in result.user_ids:
+            self.ctl.rest.send(COSMETIC, self._dm_factory(user_id, content))
+
+    def _dm_factory(self, user_id, content):
+        async def send_dm():
+            user = self.ctl.core.get_user(user_id) or await self.ctl.core.fetch_user(user_id)
+            await user.send(content)
+
+        return send_dm
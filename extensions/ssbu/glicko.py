@@ -43,6 +43,13 @@ class Glicko2:
             sigma = self.sigma
         return _create_rating(mu, phi, sigma)
 
+    def composite_rating(self, *ratings):
+        """Starting rating of a team, derived from the ratings of its members"""
+        mu = sum(rating['mu'] for rating in ratings) / len(ratings)
+        phi = math.sqrt(sum(rating['phi'] ** 2 for rating in ratings) / len(ratings))
+        sigma = sum(rating['sigma'] for rating in ratings) / len(ratings)
+        return self.create_rating(mu, phi, sigma)
+
     def scale_down(self, rating, ratio=173.7178):
         mu = (rating['mu'] - self.mu) / ratio
         phi = rating['phi'] / ratio
@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import functools
+
+
+class KeyedLocks:
+    """asyncio locks that are created on demand for each key
+
+    The locks are reentrant per task, so a controller method that
+    holds a match's lock can call other methods that lock the same
+    match. A key's lock is dropped as soon as nobody holds or waits
+    for it anymore.
+    """
+
+    def __init__(self):
+        # key -> [lock, owning task, number of holders and waiters]
+        self._locks = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        task = asyncio.current_task()
+        entry = self._locks.get(key)
+        if entry is not None and entry[1] is task:
+            yield
+            return
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), None, 0]
+        entry[2] += 1
+        try:
+            async with entry[0]:
+                entry[1] = task
+                try:
+                    yield
+                finally:
+                    entry[1] = None
+        finally:
+            entry[2] -= 1
+            if entry[2] == 0:
+                del self._locks[key]
+
+    def match(self, match_id):
+        return self.hold(('match', match_id))
+
+    def member(self, member_id):
+        return self.hold(('member', member_id))
+
+    def doubles_match(self, match_id):
+        # doubles matches are numbered separately from matches, so they can't share their keys
+        return self.hold(('doubles_match', match_id))
+
+
+def match_key(match, *args, **kwargs):
+    return 'match', match.id
+
+
+def doubles_match_key(match, *args, **kwargs):
+    return 'doubles_match', match.id
+
+
+def member_key(setup, member, *args, **kwargs):
+    return 'member', member.pk
+
+
+def locked(get_key):
+    """Run a controller method while holding the lock of the key that
+    ``get_key`` computes from the method's arguments"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            async with self.locks.hold(get_key(*args, **kwargs)):
+                return await func(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,173 @@
+import bisect
+import threading
+
+from aiohttp import web
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram in the style of Prometheus
+
+    Thread-safe, since database calls are recorded from the
+    executor's worker threads.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return 0.0
+        return self.sum / self.count
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls into"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+    def cumulative_counts(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        cumulative = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_sample(name, labels, value):
+    return f"{name}{format_labels(labels)} {value}"
+
+
+def format_histogram(name, labels, histogram):
+    lines = []
+    for bound, count in histogram.cumulative_counts():
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(format_sample(f'{name}_bucket', {**labels, 'le': le}, count))
+    lines.append(format_sample(f'{name}_sum', labels, histogram.sum))
+    lines.append(format_sample(f'{name}_count', labels, histogram.count))
+    return lines
+
+
+class MetricFamily:
+    """A metric with one child per combination of label values"""
+
+    def __init__(self, name, documentation, kind, labelnames, factory):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, key))
+            if self.kind == 'histogram':
+                lines += format_histogram(self.name, labels, child)
+            else:
+                lines.append(format_sample(self.name, labels, child.value))
+        return lines
+
+
+class Registry:
+    """Collection of metrics that are exposed in the Prometheus text format
+
+    Collectors are callables returning additional exposition lines,
+    for values that are already tracked elsewhere (e.g. by the
+    database executor).
+    """
+
+    def __init__(self):
+        self.families = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        family = MetricFamily(name, documentation, 'counter', labelnames, Counter)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        family = MetricFamily(name, documentation, 'histogram', labelnames, lambda: Histogram(buckets))
+        self.families.append(family)
+        return family
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines += family.render()
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(registry, port, host='127.0.0.1'):
+    """Serve the registry's metrics on http://host:port/metrics"""
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
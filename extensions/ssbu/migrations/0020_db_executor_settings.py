@@ -0,0 +1,33 @@
+# Generated by Django 3.1.4 on 2021-01-05 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0019_auto_20210103_0009'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ssbusettings',
+            name='db_pool_size',
+            field=models.SmallIntegerField(default=8),
+        ),
+        migrations.AddField(
+            model_name='ssbusettings',
+            name='db_queue_limit',
+            field=models.IntegerField(default=256),
+        ),
+        migrations.AddField(
+            model_name='ssbusettings',
+            name='db_timeout',
+            field=models.FloatField(default=30.0),
+        ),
+        migrations.AddField(
+            model_name='ssbusettings',
+            name='slow_query_threshold',
+            field=models.FloatField(default=0.25),
+        ),
+    ]
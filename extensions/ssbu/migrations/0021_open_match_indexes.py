@@ -0,0 +1,33 @@
+# Generated by Django 3.1.4 on 2021-01-05 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0020_db_executor_settings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(ended_at=None), fields=['player_1', 'started_at'], name='ssbu_match_open_p1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(ended_at=None), fields=['player_2', 'started_at'], name='ssbu_match_open_p2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('ranked', True), ('tournament', None)), fields=['player_1', 'player_2', 'started_at'], name='ssbu_match_ranked_pair_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('number', 1), ('player_1_fighter', None)), fields=['match'], name='ssbu_game_blindpick_p1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('number', 1), ('player_2_fighter', None)), fields=['match'], name='ssbu_game_blindpick_p2_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.4 on 2021-01-06 10:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import hero.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hero', '0001_initial'),
+        ('ssbu', '0021_open_match_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_matches', models.IntegerField(default=0)),
+                ('ranked_matches', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('guild', hero.fields.GuildField(on_delete=django.db.models.deletion.CASCADE, to='hero.Guild')),
+                ('member', hero.fields.MemberField(on_delete=django.db.models.deletion.CASCADE, to='hero.Member')),
+                ('user', hero.fields.UserField(on_delete=django.db.models.deletion.CASCADE, to='hero.User')),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+                'unique_together': {('member', 'date')},
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='memberactivity',
+            index=models.Index(fields=['guild', 'date'], name='ssbu_activity_guild_date_idx'),
+        ),
+    ]
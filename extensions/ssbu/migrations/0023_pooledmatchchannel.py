@@ -0,0 +1,39 @@
+# Generated by Django 3.1.4 on 2021-01-07 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import hero.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hero', '0001_initial'),
+        ('ssbu', '0022_memberactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledMatchChannel',
+            fields=[
+                ('channel', hero.fields.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='hero.textchannel')),
+                ('leased', models.BooleanField(default=False)),
+                ('guild', hero.fields.GuildField(on_delete=django.db.models.deletion.CASCADE, to='hero.Guild')),
+                ('voice_channel', hero.fields.VoiceChannelField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='hero.VoiceChannel')),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pooledmatchchannel',
+            index=models.Index(condition=models.Q(leased=False), fields=['guild'], name='ssbu_pool_available_idx'),
+        ),
+    ]
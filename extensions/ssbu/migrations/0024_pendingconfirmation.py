@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2021-01-07 14:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import hero.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hero', '0001_initial'),
+        ('ssbu', '0023_pooledmatchchannel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingConfirmation',
+            fields=[
+                ('message', hero.fields.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='hero.message')),
+                ('action', models.CharField(max_length=32)),
+                ('argument', models.SmallIntegerField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('game', hero.fields.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ssbu.game')),
+                ('match', hero.fields.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ssbu.match')),
+                ('member', hero.fields.MemberField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='hero.Member')),
+                ('setup', hero.fields.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ssbu.matchmakingsetup')),
+                ('user', hero.fields.UserField(on_delete=django.db.models.deletion.CASCADE, to='hero.User')),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2021-01-08 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0024_pendingconfirmation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ssbusettings',
+            name='metrics_port',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
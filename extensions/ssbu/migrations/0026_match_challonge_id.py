@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2021-01-08 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0025_ssbusettings_metrics_port'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='challonge_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+    ]
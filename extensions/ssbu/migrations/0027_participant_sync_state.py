@@ -0,0 +1,33 @@
+# Generated by Django 3.1.4 on 2021-01-09 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0026_match_challonge_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='participant',
+            name='challonge_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='checked_in',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='checkin_synced',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='signed_out',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.1.4 on 2021-01-09 16:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import hero.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0027_participant_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BracketMatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.SmallIntegerField()),
+                ('round', models.SmallIntegerField()),
+                ('entrant_1', models.BigIntegerField(blank=True, null=True)),
+                ('entrant_2', models.BigIntegerField(blank=True, null=True)),
+                ('state', models.CharField(default='pending', max_length=16)),
+                ('winner', models.BigIntegerField(blank=True, null=True)),
+                ('scores_csv', models.CharField(blank=True, default='', max_length=64)),
+                ('winner_to_slot', models.SmallIntegerField(blank=True, null=True)),
+                ('loser_to_slot', models.SmallIntegerField(blank=True, null=True)),
+                ('grand_final', models.BooleanField(default=False)),
+                ('challonge_id', models.BigIntegerField(blank=True, null=True, unique=True)),
+                ('mirrored', models.BooleanField(default=False)),
+                ('loser_to', hero.fields.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ssbu.bracketmatch')),
+                ('tournament', hero.fields.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ssbu.tournament')),
+                ('winner_to', hero.fields.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ssbu.bracketmatch')),
+            ],
+            options={
+                'unique_together': {('tournament', 'number')},
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bracketmatch',
+            index=models.Index(condition=models.Q(state='open'), fields=['tournament'], name='ssbu_bracket_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bracketmatch',
+            index=models.Index(condition=models.Q(('mirrored', False), ('state', 'complete')), fields=['tournament'], name='ssbu_bracket_unmirrored_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.4 on 2021-01-09 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0028_bracketmatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='final_rank',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='participantteam',
+            name='final_rank',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+    ]
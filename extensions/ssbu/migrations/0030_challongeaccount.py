@@ -0,0 +1,31 @@
+# Generated by Django 3.1.4 on 2021-01-10 14:52
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0029_final_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallongeAccount',
+            fields=[
+                ('username', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 3.1.4 on 2021-01-10 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0030_challongeaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='rating',
+            field=models.IntegerField(db_index=True, default=1500),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='deviation',
+            field=models.IntegerField(default=350),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='volatility',
+            field=models.FloatField(default=0.06),
+        ),
+        migrations.AddField(
+            model_name='guildteam',
+            name='rating',
+            field=models.IntegerField(db_index=True, default=1500),
+        ),
+        migrations.AddField(
+            model_name='guildteam',
+            name='deviation',
+            field=models.IntegerField(default=350),
+        ),
+        migrations.AddField(
+            model_name='guildteam',
+            name='volatility',
+            field=models.FloatField(default=0.06),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_rating',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_deviation',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_global_rating',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_global_deviation',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_1_global_volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_rating',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_deviation',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_global_rating',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_global_deviation',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='team_2_global_volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.4 on 2021-01-11 09:40
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0031_team_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard_id', models.SmallIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=64)),
+                ('arguments', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+                'base_manager_name': 'objects',
+                'default_manager_name': 'custom_default_manager',
+            },
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('custom_default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
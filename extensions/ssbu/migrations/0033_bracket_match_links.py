@@ -0,0 +1,42 @@
+# Generated by Django 3.1.4 on 2021-01-11 15:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hero.fields
+
+
+def copy_challonge_ids(apps, schema_editor):
+    # doubles matches used to be saved with their Challonge match ID as primary key
+    DoublesMatch = apps.get_model('ssbu', 'DoublesMatch')
+    DoublesMatch.objects.filter(tournament__isnull=False).update(challonge_id=models.F('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0032_shardtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='challonge_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(copy_challonge_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='doublesmatch',
+            name='id',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AddField(
+            model_name='doublesmatch',
+            name='bracket_match',
+            field=hero.fields.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ssbu.bracketmatch'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='bracket_match',
+            field=hero.fields.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ssbu.bracketmatch'),
+        ),
+    ]
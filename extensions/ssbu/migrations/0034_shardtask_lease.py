@@ -0,0 +1,23 @@
+# Generated by Django 3.1.4 on 2021-01-11 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ssbu', '0033_bracket_match_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shardtask',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shardtask',
+            name='attempts',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
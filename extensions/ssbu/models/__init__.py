@@ -9,6 +9,8 @@ def get_default_emoji():
     return emoji
 
 
+from .bracket_match import BracketMatch
+from .challonge_account import ChallongeAccount
 from .doubles_game import DoublesGame
 from .doubles_match import DoublesMatch
 from .game import Game
@@ -20,11 +22,15 @@ from .match_category import MatchCategory
 from .match_offer import MatchOffer
 from .match_search import MatchSearch
 from .matchmaking_setup import MatchmakingSetup
+from .member_activity import MemberActivity
 from .participant import Participant
 from .participant_team import ParticipantTeam
+from .pending_confirmation import PendingConfirmation
 from .player import Player
+from .pooled_match_channel import PooledMatchChannel
 from .ruleset import Ruleset
 from .settings import SsbuSettings
+from .shard_task import ShardTask
 from .team import Team
 from .tournament import Tournament
 from .tournament_series import TournamentSeries
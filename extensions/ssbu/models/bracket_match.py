@@ -0,0 +1,48 @@
+from hero import fields, models
+
+from .tournament import Tournament
+
+
+# match of the bracket that we keep ourselves; Challonge only mirrors it
+class BracketMatch(models.Model):
+    class Meta:
+        unique_together = (('tournament', 'number'),)
+        indexes = [
+            models.Index(fields=['tournament'], name='ssbu_bracket_open_idx', condition=models.Q(state='open')),
+            # results that still have to be reported to Challonge
+            models.Index(fields=['tournament'], name='ssbu_bracket_unmirrored_idx',
+                         condition=models.Q(state='complete', mirrored=False)),
+        ]
+
+    PENDING = 'pending'  # waiting for the entrants
+    OPEN = 'open'
+    COMPLETE = 'complete'
+    SKIPPED = 'skipped'  # grand finals reset that wasn't needed
+
+    # entrant that stands for "no opponent"
+    BYE = 0
+
+    tournament = fields.ForeignKey(Tournament, on_delete=fields.CASCADE)
+    number = fields.SmallIntegerField()  # suggested order of play
+    round = fields.SmallIntegerField()  # negative in the losers bracket, like on Challonge
+    # member ID of the Participant (singles) or ID of the ParticipantTeam (doubles)
+    entrant_1 = fields.BigIntegerField(null=True, blank=True)
+    entrant_2 = fields.BigIntegerField(null=True, blank=True)
+    state = fields.CharField(max_length=16, default=PENDING)
+    winner = fields.BigIntegerField(null=True, blank=True)
+    scores_csv = fields.CharField(max_length=64, blank=True, default='')
+    # where the winner and the loser go next, and in which slot (1 or 2)
+    winner_to = fields.ForeignKey('self', null=True, blank=True, related_name='+', on_delete=fields.SET_NULL)
+    winner_to_slot = fields.SmallIntegerField(null=True, blank=True)
+    loser_to = fields.ForeignKey('self', null=True, blank=True, related_name='+', on_delete=fields.SET_NULL)
+    loser_to_slot = fields.SmallIntegerField(null=True, blank=True)
+    # in double elimination, the reset is only played if the losers bracket winner wins
+    grand_final = fields.BooleanField(default=False)
+    challonge_id = fields.BigIntegerField(null=True, blank=True, unique=True)
+    mirrored = fields.BooleanField(default=False)
+
+    @property
+    def loser(self):
+        if self.winner is None:
+            return None
+        return self.entrant_2 if self.winner == self.entrant_1 else self.entrant_1
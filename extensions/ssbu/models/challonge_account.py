@@ -0,0 +1,9 @@
+from hero import fields, models
+
+
+# cache of Challonge usernames resolved to user IDs by scraping their profile page
+class ChallongeAccount(models.Model):
+    username = fields.CharField(primary_key=True, max_length=64)  # lowercase
+    # None if there's no Challonge user with that name
+    user_id = fields.BigIntegerField(null=True, blank=True)
+    resolved_at = fields.DateTimeField(db_index=True)
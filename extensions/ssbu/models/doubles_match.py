@@ -1,18 +1,34 @@
 from hero import fields, models
 
+from .bracket_match import BracketMatch
 from .participant_team import ParticipantTeam
 from .tournament import Tournament
 
 
 class DoublesMatch(models.Model):
-    id = fields.BigIntegerField(primary_key=True)
+    id = fields.BigAutoField(primary_key=True)
     channel = fields.TextChannelField(null=True, db_index=True, on_delete=fields.SET_NULL)
     guild = fields.GuildField(on_delete=fields.CASCADE)
     # if tournament is None, it's a matchmaking match
     tournament = fields.ForeignKey(Tournament, null=True, blank=True, on_delete=fields.CASCADE)
+    challonge_id = fields.BigIntegerField(null=True, blank=True, unique=True)  # Challonge match ID
+    bracket_match = fields.OneToOneField(BracketMatch, null=True, blank=True, on_delete=fields.SET_NULL)
     in_dms = fields.BooleanField()
     team_1 = fields.ForeignKey(ParticipantTeam, on_delete=fields.CASCADE)
     team_2 = fields.ForeignKey(ParticipantTeam, on_delete=fields.CASCADE)
+    # ratings of the teams when the match started
+    team_1_rating = fields.IntegerField(null=True, blank=True)
+    team_1_deviation = fields.IntegerField(null=True, blank=True)
+    team_1_volatility = fields.FloatField(null=True, blank=True)
+    team_1_global_rating = fields.IntegerField(null=True, blank=True)
+    team_1_global_deviation = fields.IntegerField(null=True, blank=True)
+    team_1_global_volatility = fields.FloatField(null=True, blank=True)
+    team_2_rating = fields.IntegerField(null=True, blank=True)
+    team_2_deviation = fields.IntegerField(null=True, blank=True)
+    team_2_volatility = fields.FloatField(null=True, blank=True)
+    team_2_global_rating = fields.IntegerField(null=True, blank=True)
+    team_2_global_deviation = fields.IntegerField(null=True, blank=True)
+    team_2_global_volatility = fields.FloatField(null=True, blank=True)
     team_1_score = fields.SmallIntegerField(default=0)
     team_2_score = fields.SmallIntegerField(default=0)
     current_game = fields.SmallIntegerField(default=1)
@@ -5,6 +5,15 @@ from ..stages import Stage
 
 
 class Game(models.Model):
+    class Meta:
+        indexes = [
+            # game 1 blindpicks that are still missing
+            models.Index(fields=['match'], name='ssbu_game_blindpick_p1_idx',
+                         condition=models.Q(number=1, player_1_fighter=None)),
+            models.Index(fields=['match'], name='ssbu_game_blindpick_p2_idx',
+                         condition=models.Q(number=1, player_2_fighter=None)),
+        ]
+
     match = fields.ForeignKey(Match, null=True, on_delete=fields.SET_NULL)
     number = fields.SmallIntegerField()
     guild = fields.GuildField(null=True, db_index=True, on_delete=fields.SET_NULL)
@@ -23,3 +32,22 @@ class Game(models.Model):
 
     def is_striked(self, stage):
         return stage in self.striked_stages
+
+    @classmethod
+    def get_pending_blindpicks(cls, user, player_numbers=(1, 2), match_id=None):
+        """Game 1 of every open match in which the user still has to blindpick
+
+        Returns (game, player number) tuples, latest match first.
+        """
+        pending = []
+        for player_number in player_numbers:
+            open_matches = Match.open_matches_qs(user, player_number)
+            if match_id is not None:
+                open_matches = open_matches.filter(pk=match_id)
+            if player_number == 1:
+                qs = cls.objects.filter(match__in=open_matches, number=1, player_1_fighter=None)
+            else:
+                qs = cls.objects.filter(match__in=open_matches, number=1, player_2_fighter=None)
+            pending += [(game, player_number) for game in qs]
+        pending.sort(key=lambda item: item[0].match_id, reverse=True)
+        return pending
@@ -10,3 +10,6 @@ class GuildTeam(models.Model):
     team = fields.ForeignKey(Team, on_delete=fields.CASCADE)
     guild = fields.GuildField(db_index=True, on_delete=fields.CASCADE)
     guild_elo = fields.IntegerField(db_index=True, default=1000)
+    rating = fields.IntegerField(db_index=True, default=1500)
+    deviation = fields.IntegerField(default=350)
+    volatility = fields.FloatField(default=0.06)
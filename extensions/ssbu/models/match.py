@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 
-from hero import async_using_db, fields, models
+from hero import fields, models
 
+from ..db import async_using_db
+from .bracket_match import BracketMatch
 from .matchmaking_setup import MatchmakingSetup
 from .participant import Participant
 from .ruleset import Ruleset
@@ -11,6 +13,16 @@ from .tournament import Tournament
 class Match(models.Model):
     class Meta:
         get_latest_by = 'started_at'
+        indexes = [
+            # open matches per player
+            models.Index(fields=['player_1', 'started_at'], name='ssbu_match_open_p1_idx',
+                         condition=models.Q(ended_at=None)),
+            models.Index(fields=['player_2', 'started_at'], name='ssbu_match_open_p2_idx',
+                         condition=models.Q(ended_at=None)),
+            # ranked matchmaking matches per pair of players
+            models.Index(fields=['player_1', 'player_2', 'started_at'], name='ssbu_match_ranked_pair_idx',
+                         condition=models.Q(ranked=True, tournament=None)),
+        ]
 
     id = fields.BigAutoField(primary_key=True)
     channel = fields.TextChannelField(null=True, blank=True, db_index=True, unique=True, on_delete=fields.SET_NULL)
@@ -18,6 +30,8 @@ class Match(models.Model):
     voice_channel = fields.VoiceChannelField(null=True, blank=True, on_delete=fields.SET_NULL)
     # if tournament is None, it's a matchmaking match
     tournament = fields.ForeignKey(Tournament, null=True, blank=True, on_delete=fields.CASCADE)
+    challonge_id = fields.BigIntegerField(null=True, blank=True, unique=True)  # Challonge match ID
+    bracket_match = fields.OneToOneField(BracketMatch, null=True, blank=True, on_delete=fields.SET_NULL)
     setup = fields.ForeignKey(MatchmakingSetup, null=True, blank=True, on_delete=fields.SET_NULL)
     management_message = fields.MessageField(null=True, blank=True, on_delete=fields.SET_NULL)
     ranked = fields.BooleanField()
@@ -50,23 +64,27 @@ class Match(models.Model):
     spectating_message = fields.MessageField(null=True, blank=True, on_delete=fields.SET_NULL)
     match_end_message = fields.MessageField(null=True, blank=True, on_delete=fields.SET_NULL)
 
+    @classmethod
+    def open_matches_qs(cls, user, player_number):
+        """Unfinished matches in which the user is player 1 or player 2
+
+        Each player slot has its own partial index, so the two slots
+        are queried separately instead of OR-ing them.
+        """
+        if player_number == 1:
+            return cls.objects.filter(player_1=user, ended_at=None)
+        return cls.objects.filter(player_2=user, ended_at=None)
+
     @classmethod
     def ranked_matches_today_qs(cls, player_1, player_2, guild=None):
         one_day_ago = datetime.now() - timedelta(hours=18)  # let's be generous
-        if guild is None:
-            qs = (
-                cls.objects.filter(started_at__gt=one_day_ago, tournament=None, ranked=True,
-                                   player_1=player_1, player_2=player_2)
-                | cls.objects.filter(started_at__gt=one_day_ago, tournament=None, ranked=True,
-                                     player_1=player_2, player_2=player_1)
-            )
-        else:
-            qs = (
-                cls.objects.filter(guild=guild, started_at__gt=one_day_ago, tournament=None,
-                                   ranked=True, player_1=player_1, player_2=player_2)
-                | cls.objects.filter(guild=guild, started_at__gt=one_day_ago, tournament=None,
-                                     ranked=True, player_1=player_2, player_2=player_1)
-            )
+        # both orders of the pair in a single index scan, since
+        # nobody can play a match against themselves
+        pair = (player_1.id, player_2.id)
+        qs = cls.objects.filter(player_1__in=pair, player_2__in=pair, ranked=True, tournament=None,
+                                started_at__gt=one_day_ago)
+        if guild is not None:
+            qs = qs.filter(guild=guild)
         return qs
 
     @async_using_db
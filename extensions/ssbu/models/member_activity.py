@@ -0,0 +1,20 @@
+from hero import fields, models
+
+
+# daily rollup of a member's matches, updated whenever a match ends
+# so activity stats don't have to aggregate over the whole match history
+class MemberActivity(models.Model):
+    class Meta:
+        unique_together = (('member', 'date'),)
+        indexes = [
+            models.Index(fields=['guild', 'date'], name='ssbu_activity_guild_date_idx'),
+        ]
+
+    member = fields.MemberField(on_delete=fields.CASCADE)
+    # denormalized from member so stats can be read without joins
+    guild = fields.GuildField(on_delete=fields.CASCADE)
+    user = fields.UserField(on_delete=fields.CASCADE)
+    date = fields.DateField()
+    total_matches = fields.IntegerField(default=0)
+    ranked_matches = fields.IntegerField(default=0)
+    wins = fields.IntegerField(default=0)
@@ -5,10 +5,18 @@ from .tournament import Tournament
 
 class Participant(models.Model):
     member = fields.OneToOneField(models.Member, primary_key=True, on_delete=fields.CASCADE)
-    challonge_id = fields.IntegerField(db_index=True)
+    # None until the participant has been added on Challonge
+    challonge_id = fields.IntegerField(null=True, blank=True, db_index=True)
     tournament = fields.ForeignKey(Tournament, db_index=True, on_delete=fields.CASCADE)
     current_match = fields.ForeignKey('Match', null=True, blank=True, on_delete=fields.SET_NULL)
     starting_elo = fields.IntegerField()
     starting_guild_elo = fields.IntegerField()
     match_count = fields.SmallIntegerField(default=0)
     forfeit_count = fields.SmallIntegerField(default=0)
+    checked_in = fields.BooleanField(default=False)
+    # whether checked_in has been pushed to Challonge yet
+    checkin_synced = fields.BooleanField(default=True)
+    # signed out, but not removed from Challonge yet
+    signed_out = fields.BooleanField(default=False)
+    # rank in the tournament's final ranking, set once it has ended
+    final_rank = fields.SmallIntegerField(null=True, blank=True)
@@ -13,3 +13,5 @@ class ParticipantTeam(models.Model):
     starting_guild_elo = fields.IntegerField()
     match_count = fields.SmallIntegerField(default=0)
     forfeit_count = fields.SmallIntegerField(default=0)
+    # rank in the tournament's final ranking, set once it has ended
+    final_rank = fields.SmallIntegerField(null=True, blank=True)
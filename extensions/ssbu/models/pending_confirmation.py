@@ -0,0 +1,21 @@
+from hero import fields, models
+
+from .game import Game
+from .match import Match
+from .matchmaking_setup import MatchmakingSetup
+
+
+# yes/no prompt that is resolved by a reaction to its message or
+# expires, instead of keeping a coroutine waiting for the reaction
+class PendingConfirmation(models.Model):
+    message = fields.OneToOneField(models.Message, primary_key=True, on_delete=fields.CASCADE)
+    # only reactions of this user resolve the prompt
+    user = fields.UserField(on_delete=fields.CASCADE)
+    action = fields.CharField(max_length=32)
+    match = fields.ForeignKey(Match, null=True, blank=True, on_delete=fields.CASCADE)
+    game = fields.ForeignKey(Game, null=True, blank=True, on_delete=fields.CASCADE)
+    member = fields.MemberField(null=True, blank=True, on_delete=fields.CASCADE)
+    setup = fields.ForeignKey(MatchmakingSetup, null=True, blank=True, on_delete=fields.CASCADE)
+    # action specific, e.g. the suggested stage or the fighter to keep
+    argument = fields.SmallIntegerField(null=True, blank=True)
+    expires_at = fields.DateTimeField(db_index=True)
@@ -1,5 +1,6 @@
-from hero import async_using_db, fields, models
+from hero import fields, models
 
+from ..db import async_using_db
 from ..regions import RegionField
 
 
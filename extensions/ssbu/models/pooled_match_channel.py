@@ -0,0 +1,15 @@
+from hero import fields, models
+
+
+# parked text/voice channel pair that is leased by a match instead of
+# creating (and later deleting) new channels for every match
+class PooledMatchChannel(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['guild'], name='ssbu_pool_available_idx', condition=models.Q(leased=False)),
+        ]
+
+    channel = fields.OneToOneField(models.TextChannel, primary_key=True, on_delete=fields.CASCADE)
+    voice_channel = fields.VoiceChannelField(null=True, blank=True, on_delete=fields.SET_NULL)
+    guild = fields.GuildField(on_delete=fields.CASCADE)
+    leased = fields.BooleanField(default=False)
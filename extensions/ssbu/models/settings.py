@@ -4,3 +4,10 @@ from hero import fields, models
 class SsbuSettings(models.Settings):
     challonge_username = fields.CharField(max_length=64)
     challonge_api_key = fields.CharField(max_length=128)
+    # database executor
+    db_pool_size = fields.SmallIntegerField(default=8)
+    db_queue_limit = fields.IntegerField(default=256)
+    db_timeout = fields.FloatField(default=30.0)  # seconds waiting for a worker
+    slow_query_threshold = fields.FloatField(default=0.25)  # seconds
+    # local port for Prometheus metrics (http://127.0.0.1:<port>/metrics), disabled if not set
+    metrics_port = fields.IntegerField(null=True, blank=True)
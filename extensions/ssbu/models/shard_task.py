@@ -0,0 +1,14 @@
+from hero import fields, models
+
+
+# scheduled task that a process picked up for a guild on a shard it doesn't own,
+# left for the process that owns the shard to claim and run
+class ShardTask(models.Model):
+    shard_id = fields.SmallIntegerField(db_index=True)
+    # name of the schedulable controller method
+    name = fields.CharField(max_length=64)
+    arguments = fields.TextField()  # JSON
+    created_at = fields.DateTimeField(auto_now_add=True)
+    # the task is deleted once it ran; if its process dies or it fails, it's claimed again when the lease expired
+    claimed_at = fields.DateTimeField(null=True, blank=True)
+    attempts = fields.SmallIntegerField(default=0)
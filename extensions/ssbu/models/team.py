@@ -17,3 +17,7 @@ class Team(models.Model):
     current_tournament = fields.ForeignKey(Tournament, null=True, blank=True, on_delete=fields.SET_NULL)
     current_participant_team = fields.ForeignKey(ParticipantTeam, null=True, blank=True, on_delete=fields.SET_NULL)
     elo = fields.IntegerField(db_index=True, default=1000)
+    # Glicko-2 rating of the pair; new teams start from the composite of their members' ratings
+    rating = fields.IntegerField(db_index=True, default=1500)
+    deviation = fields.IntegerField(default=350)
+    volatility = fields.FloatField(default=0.06)
@@ -0,0 +1,220 @@
+import asyncio
+import functools
+import logging
+
+import challonge
+
+from .challonge_client import ChallongeValidationError
+from .db import async_using_db
+from .models import Participant, Tournament
+from .rest_dispatcher import COSMETIC, ROLES
+
+
+log = logging.getLogger(__name__)
+
+
+class ParticipantSync:
+    """Pushes local signups and check-ins to Challonge in batches
+
+    Signing up, signing out and checking in only change the local
+    Participant rows, so reactions are handled right away and don't
+    cost an API request each. Every ``interval`` seconds, the
+    tournaments with changes are flushed: new participants are added
+    with a single bulk_add request, check-ins and removals (which
+    Challonge has no bulk endpoints for) are sent ``concurrency`` at a
+    time. A tournament whose flush failed is retried with exponential
+    backoff. Participants that Challonge refuses to add are signed out
+    instead, so they can't hold up the others.
+    """
+
+    def __init__(self, ctl, interval=5.0, max_retry_delay=300.0, concurrency=5):
+        self.ctl = ctl
+        self.interval = interval
+        self.max_retry_delay = max_retry_delay
+        self.concurrency = concurrency
+        self._dirty = set()
+        # tournament ID -> (loop time of the next attempt, current delay)
+        self._retries = {}
+        # tournament ID -> (lock, number of flushes holding or waiting for it)
+        self._locks = {}
+        self._task = None
+
+    def request_flush(self, tournament_id):
+        self._dirty.add(tournament_id)
+        if self._task is None or self._task.done():
+            self._task = self.ctl.core.loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while self._dirty:
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            for tournament_id in list(self._dirty):
+                retry_at, delay = self._retries.get(tournament_id, (now, self.interval))
+                if retry_at > now:
+                    continue
+                self._dirty.discard(tournament_id)
+                try:
+                    await self.flush(tournament_id)
+                except Exception:
+                    delay = min(delay * 2, self.max_retry_delay)
+                    log.exception("Syncing participants of tournament %s with Challonge failed, "
+                                  "retrying in %.0fs", tournament_id, delay)
+                    self._retries[tournament_id] = (loop.time() + delay, delay)
+                    self._dirty.add(tournament_id)
+                else:
+                    self._retries.pop(tournament_id, None)
+
+    async def flush(self, tournament_id):
+        """Push all pending changes of a tournament to Challonge now"""
+        lock, users = self._locks.get(tournament_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[tournament_id] = (lock, users + 1)
+        try:
+            async with lock:
+                await self._flush(tournament_id)
+        finally:
+            lock, users = self._locks[tournament_id]
+            if users > 1:
+                self._locks[tournament_id] = (lock, users - 1)
+            else:
+                del self._locks[tournament_id]
+
+    async def _flush(self, tournament_id):
+        tournament = await Tournament.async_get(pk=tournament_id)
+        if tournament.ended:
+            return
+        challonge_tournament = await self.ctl.get_challonge_tournament(tournament_id)
+        new, signed_out = await self._get_changes(tournament)
+        if new:
+            await self._add(tournament, challonge_tournament, new)
+        if signed_out:
+            await self._remove(tournament, challonge_tournament, signed_out)
+        # after adding, so participants who checked in right after signing up are included
+        checkins = await self._get_pending_checkins(tournament)
+        if checkins:
+            await self._check_in(tournament, challonge_tournament, checkins)
+
+    @async_using_db
+    def _get_changes(self, tournament):
+        participants = Participant.objects.filter(tournament=tournament)
+        new = list(participants.filter(challonge_id=None, signed_out=False)
+                   .values_list('member_id', 'member__user_id'))
+        signed_out = list(participants.filter(signed_out=True).values_list('member_id', 'challonge_id'))
+        return new, signed_out
+
+    @async_using_db
+    def _get_pending_checkins(self, tournament):
+        participants = Participant.objects.filter(tournament=tournament, checkin_synced=False, signed_out=False)
+        return list(participants.exclude(challonge_id=None).values_list('member_id', 'challonge_id', 'checked_in'))
+
+    async def _gather(self, coros):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(coro):
+            async with semaphore:
+                return await coro
+
+        return await asyncio.gather(*[run(coro) for coro in coros])
+
+    async def _add(self, tournament, challonge_tournament, new):
+        guild = self.ctl.core.get_guild(tournament.guild_id)
+        names = []
+        for _, user_id in new:
+            member = guild.get_member(user_id) if guild is not None else None
+            # Challonge refuses duplicate names, and Discord names alone aren't unique
+            names.append(f"{member.name}#{member.discriminator}" if member is not None else str(user_id))
+        try:
+            challonge_participants = await challonge_tournament.add_participants(*names)
+        except ChallongeValidationError:
+            # a single refused name fails the whole batch, so the participants are added one by one
+            await self._add_one_by_one(tournament, challonge_tournament, new, names)
+            return
+        for challonge_participant in challonge_participants:
+            self.ctl.cache_participant(challonge_participant)
+        # bulk_add returns the participants in the order they were given
+        await self._set_challonge_ids([(member_id, challonge_participant.id) for (member_id, _), challonge_participant
+                                       in zip(new, challonge_participants)])
+
+    async def _add_one_by_one(self, tournament, challonge_tournament, new, names):
+        async def add(name):
+            try:
+                data = await challonge_tournament.connection('POST', f'tournaments/{tournament.id}/participants',
+                                                             'participant', name=name)
+            except ChallongeValidationError as ex:
+                log.warning("Challonge refused to add %s to tournament %s: %s", name, tournament.id, ex)
+                return None
+            return data['participant']['id']
+
+        challonge_ids = await self._gather([add(name) for name in names])
+        await self._set_challonge_ids([(member_id, challonge_id) for (member_id, _), challonge_id
+                                       in zip(new, challonge_ids) if challonge_id is not None])
+        refused = [user_id for (_, user_id), challonge_id in zip(new, challonge_ids) if challonge_id is None]
+        if refused:
+            await self._sign_out_refused(tournament, refused)
+
+    async def _sign_out_refused(self, tournament, user_ids):
+        await self._delete_refused(tournament, user_ids)
+        guild = self.ctl.core.get_guild(tournament.guild_id)
+        if guild is None:
+            return
+        participant_role = await tournament.participant_role
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if member is None:
+                continue
+            if participant_role is not None:
+                self.ctl.rest.send(ROLES, functools.partial(member.remove_roles, participant_role))
+            self.ctl.rest.send(COSMETIC, functools.partial(
+                member.send, f"Challonge didn't accept your signup for **{tournament.name}**, "
+                             f"so you aren't signed up. Please contact an organizer."
+            ))
+
+    @async_using_db
+    def _delete_refused(self, tournament, user_ids):
+        Participant.objects.filter(tournament=tournament, member__user_id__in=user_ids, challonge_id=None).delete()
+
+    @async_using_db
+    def _set_challonge_ids(self, challonge_ids):
+        for member_id, challonge_id in challonge_ids:
+            Participant.objects.filter(pk=member_id, challonge_id=None).update(challonge_id=challonge_id)
+
+    async def _remove(self, tournament, challonge_tournament, signed_out):
+        async def remove(challonge_id):
+            try:
+                await challonge_tournament.connection('DELETE', f'tournaments/{tournament.id}/participants/'
+                                                                f'{challonge_id}')
+            except challonge.APIException:
+                pass  # already removed on Challonge
+            self.ctl.cached_participants.pop(challonge_id, None)
+
+        await self._gather([remove(challonge_id) for _, challonge_id in signed_out if challonge_id is not None])
+        await self._delete_signed_out([member_id for member_id, _ in signed_out])
+
+    @async_using_db
+    def _delete_signed_out(self, member_ids):
+        Participant.objects.filter(pk__in=member_ids, signed_out=True).delete()
+        # signed up again while they were being removed on Challonge, so they have to be added again
+        Participant.objects.filter(pk__in=member_ids).update(challonge_id=None)
+        Participant.objects.filter(pk__in=member_ids, checked_in=True).update(checkin_synced=False)
+
+    async def _check_in(self, tournament, challonge_tournament, checkins):
+        async def check_in(challonge_id, checked_in):
+            action = 'check_in' if checked_in else 'undo_check_in'
+            try:
+                await challonge_tournament.connection('POST', f'tournaments/{tournament.id}/participants/'
+                                                              f'{challonge_id}/{action}')
+            except challonge.APIException as ex:
+                # e.g. outside of the check-in period; retrying wouldn't change that
+                log.warning("Challonge refused to %s participant %s: %s", action, challonge_id, ex)
+
+        await self._gather([check_in(challonge_id, checked_in) for _, challonge_id, checked_in in checkins])
+        await self._mark_checkins_synced(checkins)
+
+    @async_using_db
+    def _mark_checkins_synced(self, checkins):
+        for checked_in in (True, False):
+            member_ids = [member_id for member_id, _, _checked_in in checkins if _checked_in == checked_in]
+            # a participant who changed their mind in the meantime stays unsynced
+            Participant.objects.filter(pk__in=member_ids, checked_in=checked_in).update(checkin_synced=True)
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+class RenderQueue:
+    """Coalesces renders that are requested in quick succession
+
+    Every request replaces the pending arguments for its key, so
+    only the most recent state is rendered. The first request for a
+    key opens a window of ``delay`` seconds; everything that comes in
+    during that window results in a single call of ``render``.
+    Requests that arrive while a render is running are picked up by
+    one more render right after it.
+    """
+
+    def __init__(self, render, delay=0.75, loop=None):
+        self.render = render
+        self.delay = delay
+        self.loop = loop
+        self._pending = {}
+        self._tasks = {}
+
+    def request(self, key, *args, **kwargs):
+        self._pending[key] = (args, kwargs)
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            loop = self.loop or asyncio.get_event_loop()
+            self._tasks[key] = loop.create_task(self._run(key))
+
+    def cancel(self, key):
+        self._pending.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    async def _run(self, key):
+        try:
+            while key in self._pending:
+                await asyncio.sleep(self.delay)
+                args, kwargs = self._pending.pop(key)
+                try:
+                    await self.render(*args, **kwargs)
+                except Exception:
+                    # renders that were requested in the meantime still have to happen
+                    log.exception("Rendering %s failed", key)
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import logging
+
+import discord
+
+from .metrics import Counter, format_sample
+
+
+log = logging.getLogger(__name__)
+
+CRITICAL = 0  # messages and edits players are waiting for
+ROLES = 1  # role edits
+COSMETIC = 2  # reactions, pins
+
+PRIORITY_NAMES = {
+    CRITICAL: 'critical',
+    ROLES: 'roles',
+    COSMETIC: 'cosmetic',
+}
+
+
+class _Call:
+    __slots__ = ('priority', 'factory', 'key', 'future', 'superseded', 'taken', 'edit_kwargs')
+
+    def __init__(self, priority, factory, key, future):
+        self.priority = priority
+        self.factory = factory
+        self.key = key
+        self.future = future
+        self.superseded = False
+        # critical calls are in two queues, the first worker to get one takes it
+        self.taken = False
+        self.edit_kwargs = None
+
+
+class RestDispatcher:
+    """Runs outgoing Discord REST calls in order of importance
+
+    Calls are queued by priority and run by ``concurrency`` workers,
+    so a burst of reactions and role edits (e.g. when a bracket
+    starts) can never take all of the rate limit headroom away from
+    the messages players are waiting for. Calls with the same
+    priority run in the order they were submitted. One more worker
+    only runs ``CRITICAL`` calls, so they don't have to wait for
+    cosmetic calls that are already running.
+
+    A call that is submitted with a ``key`` supersedes a call with the
+    same key that is still waiting in the queue (e.g. two edits of the
+    same message); only the newer one is sent, and both callers get
+    its result.
+    """
+
+    def __init__(self, concurrency=2, loop=None):
+        self.concurrency = concurrency
+        self.loop = loop
+        self.queue_depth = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.superseded = Counter()
+        self.failed = Counter()
+        self._queue = None
+        self._critical_queue = None
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._workers = []
+        self._critical_worker = None
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._critical_queue = asyncio.Queue()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        loop = self.loop or asyncio.get_event_loop()
+        while len(self._workers) < self.concurrency:
+            self._workers.append(loop.create_task(self._work(self._queue)))
+        if self._critical_worker is None or self._critical_worker.done():
+            self._critical_worker = loop.create_task(self._work(self._critical_queue))
+
+    def submit(self, priority, factory, key=None):
+        """Queue ``factory()`` and return a future for its result
+
+        ``factory`` is called without arguments once it's the call's
+        turn and has to return the coroutine that does the request.
+        """
+        self._ensure_workers()
+        loop = self.loop or asyncio.get_event_loop()
+        previous = self._pending.get(key) if key is not None else None
+        if previous is not None:
+            previous.superseded = True
+            self.superseded.inc()
+            future = previous.future
+        else:
+            future = loop.create_future()
+        call = _Call(priority, factory, key, future)
+        if key is not None:
+            self._pending[key] = call
+        self.queue_depth[priority] += 1
+        item = (priority, next(self._sequence), call)
+        self._queue.put_nowait(item)
+        if priority == CRITICAL:
+            self._critical_queue.put_nowait(item)
+        return future
+
+    def send(self, priority, factory, key=None):
+        """Queue a call nobody is going to wait for; failures are logged"""
+        future = self.submit(priority, factory, key=key)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def _log_failure(self, future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None and not isinstance(exception, discord.NotFound):
+            log.warning("Queued Discord request failed: %r", exception)
+
+    async def _work(self, queue):
+        while True:
+            priority, _, call = await queue.get()
+            try:
+                if call.taken:
+                    continue
+                call.taken = True
+                self.queue_depth[priority] -= 1
+                if call.superseded:
+                    continue
+                if call.key is not None and self._pending.get(call.key) is call:
+                    del self._pending[call.key]
+                if call.future.done():
+                    continue
+                try:
+                    result = await call.factory()
+                except asyncio.CancelledError:
+                    call.future.cancel()
+                    raise
+                except Exception as ex:
+                    self.failed.inc()
+                    call.future.set_exception(ex)
+                else:
+                    call.future.set_result(result)
+            finally:
+                queue.task_done()
+
+    def edit(self, message, key=None, **kwargs):
+        """Edit a message; pending edits of the same message are merged
+
+        The arguments of a newer edit take precedence, the ones it
+        doesn't pass (e.g. ``content`` when it only changes the
+        ``embed``) are kept from the pending edit.
+        """
+        key = ('edit', message.id) if key is None else key
+        previous = self._pending.get(key)
+        if previous is not None and previous.edit_kwargs is not None:
+            kwargs = {**previous.edit_kwargs, **kwargs}
+        future = self.submit(CRITICAL, lambda: message.edit(**kwargs), key=key)
+        self._pending[key].edit_kwargs = kwargs
+        return future
+
+    def add_reactions(self, message, *emojis, priority=COSMETIC):
+        """Add reactions in the given order, as one call
+
+        Reactions players have to click to go on (e.g. on a match
+        offer) should be added with ``CRITICAL`` priority.
+        """
+        async def add_reactions():
+            for emoji in emojis:
+                await message.add_reaction(emoji)
+
+        return self.send(priority, add_reactions)
+
+    def remove_reaction(self, message, emoji, member):
+        return self.send(COSMETIC, lambda: message.remove_reaction(emoji, member),
+                         key=('remove_reaction', message.id, str(emoji), member.id))
+
+    def pin(self, message):
+        return self.send(COSMETIC, message.pin, key=('pin', message.id))
+
+    def add_roles(self, member, *roles):
+        return self.submit(ROLES, lambda: member.add_roles(*roles))
+
+    def remove_roles(self, member, *roles):
+        return self.submit(ROLES, lambda: member.remove_roles(*roles))
+
+    def collect_metrics(self):
+        lines = ["# TYPE purah_rest_queue_depth gauge"]
+        for priority, name in PRIORITY_NAMES.items():
+            lines.append(format_sample('purah_rest_queue_depth', {'priority': name}, self.queue_depth[priority]))
+        lines += [
+            "# TYPE purah_rest_superseded_total counter",
+            format_sample('purah_rest_superseded_total', {}, self.superseded.value),
+            "# TYPE purah_rest_failed_total counter",
+            format_sample('purah_rest_failed_total', {}, self.failed.value),
+        ]
+        return lines
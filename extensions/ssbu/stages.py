@@ -1,10 +1,10 @@
 from discord import PartialEmoji
 from discord.ext.commands import BadArgument
 
-from hero.utils import async_using_db, async_to_sync
 from hero import models
 
 from . import models as ssbu_models
+from .db import async_using_db
 
 
 ALL_STAGES = {
@@ -266,7 +266,6 @@ class Stage:
         try:
             return cls._parse(argument)
         except ValueError as ex:
-            print(f"Invalid stage: {argument}")
             raise BadArgument(str(ex))
         except TypeError:
             return await cls.get_stage_from_number(ctx, int(argument))
@@ -291,7 +290,6 @@ class Stage:
         starter_stages = match.ruleset.starter_stages
         counterpick_stages = match.ruleset.counterpick_stages
         stages = starter_stages + counterpick_stages
-        print(stages[number - 1])
         return stages[number - 1]
 
     @classmethod
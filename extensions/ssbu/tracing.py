@@ -0,0 +1,153 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import time
+
+
+log = logging.getLogger(__name__)
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed step of the match lifecycle, in the style of OpenTelemetry
+
+    A span that is started while another one is current becomes its
+    child and shares its trace ID. Database calls and Discord REST
+    calls are counted for the current span and all of its ancestors.
+    """
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.started_at = time.time()
+        self.duration = None
+        self.db_calls = 0
+        self.rest_calls = 0
+        self.error = None
+
+
+def set_attributes(**attributes):
+    """Add attributes that only become known while the current span is running"""
+    span = current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def record_db_call():
+    span = current_span.get()
+    while span is not None:
+        span.db_calls += 1
+        span = span.parent
+
+
+def record_rest_call():
+    span = current_span.get()
+    while span is not None:
+        span.rest_calls += 1
+        span = span.parent
+
+
+class Tracer:
+    LABELS = ('step', 'guild', 'ranked')
+
+    def __init__(self, registry, finished_span_log_size=500):
+        self.finished_spans = collections.deque(maxlen=finished_span_log_size)
+        self.step_duration = registry.histogram('purah_step_duration_seconds',
+                                                "Duration of match lifecycle steps", self.LABELS)
+        self.step_db_calls = registry.counter('purah_step_db_calls_total',
+                                              "Database calls made during match lifecycle steps", self.LABELS)
+        self.step_rest_calls = registry.counter('purah_step_rest_calls_total',
+                                                "Discord REST calls made during match lifecycle steps", self.LABELS)
+        self.step_errors = registry.counter('purah_step_errors_total',
+                                            "Match lifecycle steps that raised an exception", self.LABELS)
+        self.rest_calls = registry.counter('purah_discord_rest_calls_total',
+                                           "Discord REST calls", ('method',))
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        span = Span(name, attributes, current_span.get())
+        token = current_span.set(span)
+        start = time.monotonic()
+        try:
+            yield span
+        except Exception as ex:
+            span.error = type(ex).__name__
+            raise
+        finally:
+            span.duration = time.monotonic() - start
+            current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        labels = {
+            'step': span.name,
+            'guild': span.attributes.get('guild', ''),
+            'ranked': str(span.attributes.get('ranked', '')).lower(),
+        }
+        self.step_duration.labels(**labels).observe(span.duration)
+        self.step_db_calls.labels(**labels).inc(span.db_calls)
+        self.step_rest_calls.labels(**labels).inc(span.rest_calls)
+        if span.error is not None:
+            self.step_errors.labels(**labels).inc()
+        self.finished_spans.append(span)
+        log.debug("span %s trace=%s id=%s parent=%s %.3fs db=%d rest=%d error=%s %s",
+                  span.name, span.trace_id, span.span_id, span.parent.span_id if span.parent else None,
+                  span.duration, span.db_calls, span.rest_calls, span.error, span.attributes)
+
+    def instrument_http(self, http):
+        """Count the REST calls of a discord.py HTTP client"""
+        request = http.request
+        if getattr(request, 'is_instrumented', False):
+            return
+
+        @functools.wraps(request)
+        async def instrumented_request(route, **kwargs):
+            record_rest_call()
+            self.rest_calls.labels(method=route.method).inc()
+            return await request(route, **kwargs)
+
+        instrumented_request.is_instrumented = True
+        http.request = instrumented_request
+
+
+def match_attributes(match, *args, **kwargs):
+    return {'guild': match.guild_id, 'ranked': match.ranked}
+
+
+def search_attributes(setup, member, *args, **kwargs):
+    return {'guild': member.guild_id, 'ranked': setup.ranked}
+
+
+def offer_attributes(channel, offered_to, offering, allow_decline=True, ranked=False):
+    return {'guild': offered_to.guild_id, 'ranked': ranked}
+
+
+def create_match_attributes(offered_to, offering, origin_channel, ruleset=None, ranked=False, create_vc=True):
+    return {'guild': offered_to.guild_id, 'ranked': ranked}
+
+
+def tournament_attributes(tournament, *args, **kwargs):
+    return {'guild': tournament.guild_id, 'ranked': tournament.ranked}
+
+
+def rating_attributes(player_1, player_2, score_1, score_2, guild=None):
+    return {'guild': guild.id if guild is not None else 'global', 'ranked': True}
+
+
+def traced(step, get_attributes=None):
+    """Run a controller method in a span of the controller's tracer"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            attributes = get_attributes(*args, **kwargs) if get_attributes is not None else {}
+            with self.tracer.span(step, **attributes):
+                return await func(self, *args, **kwargs)
+        return wrapper
+    return decorator